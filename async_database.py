@@ -0,0 +1,103 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncDatabaseManager:
+    # Async-Fassade über den (thread-sicheren) DatabaseManager: jede Abfrage läuft
+    # in einem Thread-Pool und kann mit await abgewartet werden. Ein Abbrechen der
+    # Aufgabe verwirft nur das Ergebnis; die SQLite-Abfrage selbst läuft zu Ende.
+    def __init__(self, db_manager, max_workers=4):
+        self.db_manager = db_manager
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def run(self, method_name, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(getattr(self.db_manager, method_name), *args, **kwargs)
+        return await loop.run_in_executor(self.executor, call)
+
+    async def get_invoices(self, status_filter="Alle", category_filter="Alle", tax_filter=False):
+        return await self.run("get_invoices", status_filter, category_filter, tax_filter)
+
+    async def get_invoices_page(self, status_filter="Alle", category_filter="Alle", tax_filter=False,
+                                after=None, before=None, limit=50):
+        return await self.run("get_invoices_page", status_filter, category_filter, tax_filter,
+                              after=after, before=before, limit=limit)
+
+    async def search_invoices(self, search_text, status_filter="Alle", category_filter="Alle", tax_filter=False,
+                              limit=50, offset=0):
+        return await self.run("search_invoices", search_text, status_filter, category_filter, tax_filter,
+                              limit=limit, offset=offset)
+
+    async def get_invoices_by_ids(self, invoice_ids):
+        return await self.run("get_invoices_by_ids", list(invoice_ids))
+
+    async def get_categories(self):
+        return await self.run("get_categories")
+
+    async def get_total_amount_by_category(self):
+        return await self.run("get_total_amount_by_category")
+
+    async def add_invoice(self, *args, **kwargs):
+        return await self.run("add_invoice", *args, **kwargs)
+
+    async def update_invoice_status_many(self, invoice_ids, new_status):
+        return await self.run("update_invoice_status_many", list(invoice_ids), new_status)
+
+    async def delete_invoices(self, invoice_ids):
+        return await self.run("delete_invoices", list(invoice_ids))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class TkAsyncioPump:
+    # Lässt eine asyncio-Schleife neben Tks mainloop laufen: per after() wird die
+    # Schleife regelmäßig für einen Durchlauf angestoßen. Solange Aufgaben laufen,
+    # wird häufiger gepumpt als im Leerlauf.
+    def __init__(self, widget, busy_interval=10, idle_interval=100):
+        self.widget = widget
+        self.busy_interval = busy_interval
+        self.idle_interval = idle_interval
+        self.loop = asyncio.new_event_loop()
+        self.latest = {}
+        self._after_id = None
+        self._pump()
+
+    def _pump(self):
+        self._after_id = None
+        # Ein Durchlauf: alle bereiten Callbacks ausführen, dann sofort zurück zu Tk
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        busy = any(not task.done() for task in asyncio.all_tasks(self.loop))
+        self._after_id = self.widget.after(self.busy_interval if busy else self.idle_interval, self._pump)
+
+    def run(self, coro):
+        task = self.loop.create_task(coro)
+        self._wake()
+        return task
+
+    def run_latest(self, key, coro):
+        # Startet coro und bricht eine noch laufende Aufgabe mit demselben Schlüssel ab
+        previous = self.latest.get(key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        task = self.run(coro)
+        self.latest[key] = task
+        return task
+
+    def _wake(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+        self._after_id = self.widget.after(0, self._pump)
+
+    def close(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+        # Abgebrochene Aufgaben noch einmal laufen lassen, damit sie ihr finally ausführen
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self.loop.close()
@@ -0,0 +1,103 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+
+# Reproduzierbare Testdatenbanken für Benchmarks:
+#   python benchmarks/generate_data.py --rows 100000 --seed 1 bench_100k.db
+# Gleicher Seed und gleiche Anzahl ergeben immer denselben Datenbestand.
+
+# (Kategorie, Gewicht, typischer Betrag, monatlich wiederkehrend)
+CATEGORIES = (
+    ("Miete", 8, 850.0, True),
+    ("Strom", 8, 75.0, True),
+    ("Internet", 8, 40.0, True),
+    ("Handy", 10, 25.0, True),
+    ("Versicherung", 6, 120.0, False),
+    ("Lebensmittel", 25, 60.0, False),
+    ("Reparaturen", 5, 300.0, False),
+    ("Software", 10, 15.0, False),
+    ("Reisen", 4, 450.0, False),
+    (None, 16, 50.0, False),
+)
+VENDORS = ("Stadtwerke", "Telekom", "Vodafone", "Allianz", "HUK", "REWE", "Edeka", "Amazon", "Bauhaus", "Adobe",
+           "Deutsche Bahn", "Lufthansa", "Hausverwaltung Meyer", "1&1", "O2")
+YEARS = 6
+# Fester Stichtag statt date.today(), damit die Daten bei gleichem Seed identisch bleiben
+REFERENCE_DATE = date(2025, 6, 30)
+
+
+def generate_invoices(count, seed=1, today=REFERENCE_DATE):
+    # Liefert Tupel für DatabaseManager.add_invoices_bulk. Fälligkeiten verteilen
+    # sich über YEARS Jahre bis 60 Tage in die Zukunft; ältere Rechnungen sind
+    # überwiegend bezahlt, jüngere überwiegend offen.
+    rng = random.Random(seed)
+    span_days = YEARS * 365
+    weights = [weight for _, weight, _, _ in CATEGORIES]
+    for number in range(count):
+        category, _, typical_amount, recurring = rng.choices(CATEGORIES, weights)[0]
+        age_days = int(rng.triangular(-60, span_days, 0))
+        due = today - timedelta(days=age_days)
+        if recurring:
+            due = due.replace(day=1)
+        if age_days > 60:
+            status = "Bezahlt" if rng.random() < 0.96 else rng.choice(("Offen", "Erinnert"))
+        elif age_days > 0:
+            status = rng.choices(("Offen", "Bezahlt", "Erinnert"), (40, 45, 15))[0]
+        else:
+            status = "Offen" if rng.random() < 0.9 else "Bezahlt"
+        amount = round(typical_amount * math.exp(rng.gauss(0, 0.45)), 2) if rng.random() > 0.03 else None
+        reminder = (due - timedelta(days=rng.choice((3, 7, 14, 30)))).isoformat() if rng.random() < 0.15 else None
+        name = f"{rng.choice(VENDORS)} {category or 'Sonstiges'} {due:%m/%Y} #{number + 1}"
+        has_due_date = rng.random() > 0.02
+        yield (name, amount, None, None, status, due.isoformat() if has_due_date else None, reminder, category,
+               "done", None)
+
+
+def create_database(path, count, seed=1, batch_size=5000):
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    with DatabaseManager(path, synchronous="OFF") as db_manager:
+        for name, _, _, _ in CATEGORIES:
+            if name:
+                db_manager.add_category(name)
+        category_ids = dict((name, id) for id, name in db_manager.get_categories())
+
+        batch = []
+        for invoice in generate_invoices(count, seed):
+            batch.append(invoice[:7] + (category_ids.get(invoice[7]),) + invoice[8:])
+            if len(batch) >= batch_size:
+                db_manager.add_invoices_bulk(batch)
+                batch = []
+        if batch:
+            db_manager.add_invoices_bulk(batch)
+
+        # Steuer-Vormerkungen für ~30 % der bezahlten Rechnungen (über die ID, also reproduzierbar)
+        with db_manager.batch():
+            db_manager.cursor.execute("UPDATE invoices SET tax_declaration_year = CAST(substr(due_date, 1, 4) AS INTEGER) "
+                                      "WHERE status = 'Bezahlt' AND due_date IS NOT NULL AND id % 10 < 3")
+        with db_manager.batch():
+            db_manager.cursor.execute("ANALYZE")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Erzeugt eine Testdatenbank mit synthetischen Rechnungen.")
+    parser.add_argument("path", help="Zieldatei (wird überschrieben)")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    create_database(args.path, args.rows, args.seed)
+    print(f"{args.rows} Rechnungen in {time.perf_counter() - started:.1f} s nach {args.path} geschrieben.")
+
+
+if __name__ == '__main__':
+    main()
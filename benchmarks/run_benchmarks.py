@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+from generate_data import REFERENCE_DATE, create_database
+from invoice_list_view import InvoiceListView
+
+# Misst alle Abfragen des DatabaseManager und den Render-Pfad der Rechnungsliste
+# auf synthetischen Datenbanken und schreibt einen JSON-Bericht:
+#   python benchmarks/run_benchmarks.py --sizes 10000 100000 -o bericht.json
+#   python benchmarks/run_benchmarks.py --compare alter_bericht.json -o neuer_bericht.json
+# Die Testdatenbanken werden pro Größe und Seed in --data-dir zwischengespeichert.
+
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "rechnungsapp-benchmarks")
+# Unterschiede unterhalb dieser Schwelle gelten beim Vergleich immer als Rauschen
+NOISE_FLOOR_MS = 0.5
+
+
+def time_call(function, repeat):
+    # Ein Aufwärmlauf (Seiten-Cache, vorbereitete Statements), dann repeat Messungen in ms
+    function()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3),
+            "max_ms": round(max(timings), 3), "runs": repeat}
+
+
+def database_path(data_dir, rows, seed):
+    path = os.path.join(data_dir, f"invoices_{rows}_seed{seed}.db")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Erzeuge {rows} Rechnungen (Seed {seed}) ...", file=sys.stderr)
+        # Erst unter temporärem Namen, damit ein abgebrochener Lauf keine halbe Datenbank hinterlässt
+        create_database(path + ".tmp", rows, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def middle_page_key(db_manager):
+    # (due_date, id) aus der Mitte der Liste, für eine Seite weit hinter dem Anfang
+    count = db_manager.fetch_columns("SELECT COUNT(*) AS n FROM invoices WHERE due_date IS NOT NULL")["n"][0]
+    columns = db_manager.fetch_columns("SELECT due_date, id FROM invoices WHERE due_date IS NOT NULL "
+                                       "ORDER BY due_date DESC, id DESC LIMIT 1 OFFSET ?", (count // 2,))
+    return columns["due_date"][0], columns["id"][0]
+
+
+def query_benchmarks(db_manager):
+    today = REFERENCE_DATE.isoformat()
+    category = db_manager.get_categories()[0][1]
+    middle_key = middle_page_key(db_manager)
+    some_ids = [invoice[0] for invoice in db_manager.get_invoices_page(limit=50)]
+    return {
+        "get_invoices(Alle)": lambda: db_manager.get_invoices(),
+        "get_invoices(Offen)": lambda: db_manager.get_invoices("Offen"),
+        "get_invoices(Kategorie)": lambda: db_manager.get_invoices("Alle", category),
+        "get_invoices(Steuer)": lambda: db_manager.get_invoices("Alle", "Alle", True),
+        "get_invoices_page(erste Seite)": lambda: db_manager.get_invoices_page(limit=31),
+        "get_invoices_page(Mitte)": lambda: db_manager.get_invoices_page(after=middle_key, limit=31),
+        "get_invoices_page(Mitte, rückwärts)": lambda: db_manager.get_invoices_page(before=middle_key, limit=31),
+        "get_invoices_page(Offen, Kategorie)": lambda: db_manager.get_invoices_page("Offen", category, limit=31),
+        "search_invoices(telekom)": lambda: db_manager.search_invoices("telekom", limit=31),
+        "search_invoices(strom 03)": lambda: db_manager.search_invoices("strom 03", limit=31),
+        "get_invoices_by_ids(50)": lambda: db_manager.get_invoices_by_ids(some_ids),
+        "get_categories": db_manager.get_categories,
+        "get_total_amount_by_category": db_manager.get_total_amount_by_category,
+        "get_due_and_reminder_invoices": lambda: db_manager.get_due_and_reminder_invoices(today),
+        "get_reminder_events(±30 Tage)": lambda: db_manager.get_reminder_events(
+            (REFERENCE_DATE - timedelta(days=30)).isoformat(), (REFERENCE_DATE + timedelta(days=30)).isoformat()),
+        "get_monthly_spending_by_category": db_manager.get_monthly_spending_by_category,
+        "get_status_trend": db_manager.get_status_trend,
+        "get_overdue_aging": lambda: db_manager.get_overdue_aging(today),
+        "get_overdue": lambda: db_manager.get_overdue(today),
+        "get_invoices_due_between(30 Tage)": lambda: db_manager.get_invoices_due_between(
+            today, (REFERENCE_DATE + timedelta(days=30)).isoformat()),
+        "get_tax_year_totals": db_manager.get_tax_year_totals,
+        "iter_invoices(alle)": lambda: sum(1 for _ in db_manager.iter_invoices()),
+        "get_state": lambda: db_manager.get_state("reminders_last_checked"),
+    }
+
+
+def create_hidden_textbox():
+    # Echtes Tk-Textfeld in einem nicht angezeigten Fenster; ohne Display
+    # (z.B. auf einem CI-Server) wird der Tk-Teil übersprungen
+    try:
+        import tkinter
+        root = tkinter.Tk()
+    except Exception as e:
+        return None, None, f"Tk nicht verfügbar: {e}"
+    root.withdraw()
+    textbox = tkinter.Text(root, width=120, height=40)
+    textbox.pack()
+    return root, textbox, None
+
+
+def render_benchmarks(db_manager, repeat):
+    results = {}
+    page = db_manager.get_invoices_page(limit=30)
+    results["format_page(30 Zeilen)"] = time_call(
+        lambda: InvoiceListView.format_header() + [InvoiceListView.format_row(invoice) for invoice in page], repeat)
+
+    root, textbox, reason = create_hidden_textbox()
+    if textbox is None:
+        results["tk"] = {"skipped": reason}
+        return results
+    try:
+        view = InvoiceListView(textbox, db_manager, page_size=30)
+        view.reload()
+
+        def reload_uncached():
+            view.cache.clear()
+            view.reload()
+
+        def page_forward_and_back():
+            view.next_page()
+            view.prev_page()
+
+        def scroll_down_and_up():
+            view.scroll(3)
+            view.scroll(-3)
+
+        def filter_change():
+            view.set_filters("Offen", "Alle", False)
+            view.set_filters("Alle", "Alle", False)
+
+        results["reload(ohne Cache)"] = time_call(reload_uncached, repeat)
+        results["reload(Cache)"] = time_call(view.reload, repeat)
+        results["render"] = time_call(view.render, repeat)
+        results["next_page+prev_page"] = time_call(page_forward_and_back, repeat)
+        results["scroll(±3)"] = time_call(scroll_down_and_up, repeat)
+        results["set_filters(Offen/Alle)"] = time_call(filter_change, repeat)
+        # Ausstehende Zeichenvorgänge mitmessen, die Tk erst im Leerlauf ausführt
+        results["render+update_idletasks"] = time_call(lambda: (view.render(), root.update_idletasks()), repeat)
+    finally:
+        root.destroy()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, seed, repeat, data_dir):
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": {},
+    }
+    for rows in sizes:
+        path = database_path(data_dir, rows, seed)
+        print(f"Messe {rows} Rechnungen ...", file=sys.stderr)
+        with DatabaseManager(path) as db_manager:
+            queries = {name: time_call(function, repeat) for name, function in query_benchmarks(db_manager).items()}
+            render = render_benchmarks(db_manager, repeat)
+        report["results"][str(rows)] = {"queries": queries, "render": render}
+    return report
+
+
+def flatten(report):
+    timings = {}
+    for rows, groups in report["results"].items():
+        for group, entries in groups.items():
+            for name, result in entries.items():
+                if "median_ms" in result:
+                    timings[f"{rows}/{group}/{name}"] = result["median_ms"]
+    return timings
+
+
+def compare(old_report, new_report, threshold):
+    # Liefert die Messungen, deren Median um mehr als threshold (relativ) langsamer geworden ist
+    old, new = flatten(old_report), flatten(new_report)
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        if after - before > NOISE_FLOOR_MS and after > before * (1 + threshold):
+            regressions.append((key, before, after))
+    return regressions
+
+
+def print_report(report):
+    for rows, groups in report["results"].items():
+        print(f"\n{rows} Rechnungen")
+        for group, entries in groups.items():
+            for name, result in entries.items():
+                if "median_ms" in result:
+                    print(f"  {group:<8} {name:<40} {result['median_ms']:>10.3f} ms  (min {result['min_ms']:.3f})")
+                else:
+                    print(f"  {group:<8} {name:<40} übersprungen: {result['skipped']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks für DatabaseManager und die Rechnungsliste")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000],
+                        help="Anzahl Rechnungen je Testdatenbank (z.B. 10000 100000 1000000)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="Messungen pro Abfrage (Median wird verglichen)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Ablage der erzeugten Testdatenbanken")
+    parser.add_argument("-o", "--output", help="JSON-Bericht in diese Datei schreiben")
+    parser.add_argument("--compare", help="Früheren JSON-Bericht als Vergleichsbasis verwenden")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative Verlangsamung, ab der eine Regression gemeldet wird (0.2 = 20 %%)")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.seed, args.repeat, args.data_dir)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if not args.compare:
+        return 0
+    with open(args.compare, encoding="utf-8") as f:
+        old_report = json.load(f)
+    regressions = compare(old_report, report, args.threshold)
+    if not regressions:
+        print(f"\nKeine Regressionen gegenüber {args.compare}.")
+        return 0
+    print(f"\n{len(regressions)} Regression(en) gegenüber {args.compare}:")
+    for key, before, after in regressions:
+        print(f"  {key}: {before:.3f} ms -> {after:.3f} ms (+{(after / before - 1) * 100:.0f} %)")
+    return 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from database_manager import DatabaseManager
+from document_store import DocumentStore, file_sha256
+from pdf_converter import convert_image_to_pdf
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+
+def find_image_files(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, file_name)
+
+
+class ImportStats:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        elapsed = max(self.elapsed, 1e-9)
+        return (f"{self.imported} Rechnungen importiert, {self.skipped} übersprungen, {self.failed} Fehler "
+                f"in {self.elapsed:.1f} s ({self.imported / elapsed:.1f} Dateien/s, "
+                f"{self.bytes / elapsed / (1024 * 1024):.1f} MB/s)")
+
+
+def import_directory(db_manager, directory, category_id=None, status="Offen", workers=None, batch_size=200,
+                     progress=None, document_store=None):
+    # Importiert alle Bilder eines Ordners (rekursiv) in den Dokumentenspeicher.
+    # Hashes werden in Threads berechnet, PDFs parallel in Prozessen erzeugt und
+    # jede Charge mit einem einzigen executemany/Commit eingefügt.
+    if document_store is None:
+        document_store = DocumentStore.for_database(db_manager.db_path)
+    stats = ImportStats()
+    seen_hashes = set()
+    paths = list(find_image_files(directory))
+
+    with ThreadPoolExecutor(max_workers=workers) as hash_pool, ProcessPoolExecutor(max_workers=workers) as convert_pool:
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start:start + batch_size]
+            hashes = list(hash_pool.map(file_sha256, batch))
+            known = db_manager.get_existing_content_hashes(set(hashes))
+
+            todo = []
+            for image_path, content_hash in zip(batch, hashes):
+                if content_hash in known or content_hash in seen_hashes:
+                    stats.skipped += 1
+                    continue
+                seen_hashes.add(content_hash)
+                todo.append((image_path, content_hash))
+
+            stored = list(hash_pool.map(lambda item: document_store.put(item[0], sha256=item[1])[1], todo))
+            temp_pdfs = [document_store.temp_path(".pdf") for _ in todo]
+            futures = [convert_pool.submit(convert_image_to_pdf, stored_image, temp_pdf)
+                       for stored_image, temp_pdf in zip(stored, temp_pdfs)]
+            rows = []
+            documents = []
+            for (image_path, content_hash), stored_image, future in zip(todo, stored, futures):
+                try:
+                    temp_pdf = future.result()
+                except Exception as e:
+                    print(f"Fehler bei der PDF-Konvertierung von {image_path}: {e}")
+                    stats.failed += 1
+                    # Noch nicht registriert -> von keiner Rechnung referenziert
+                    document_store.remove(stored_image)
+                    continue
+                pdf_hash, stored_pdf = document_store.put(temp_pdf, move=True)
+                documents.extend(((content_hash, stored_image), (pdf_hash, stored_pdf)))
+                name = os.path.splitext(os.path.basename(image_path))[0]
+                rows.append((name, None, stored_image, stored_pdf, status, None, None, category_id, "done", content_hash))
+                stats.bytes += os.path.getsize(image_path)
+
+            with db_manager.batch():
+                for sha256, path in documents:
+                    db_manager.register_document(sha256, path)
+                stats.imported += db_manager.add_invoices_bulk(rows)
+            if progress:
+                progress(min(start + batch_size, len(paths)), len(paths))
+
+    stats.finished = time.perf_counter()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importiert alle Rechnungsbilder eines Ordners.")
+    parser.add_argument("directory", help="Ordner mit Rechnungsbildern (wird rekursiv durchsucht)")
+    parser.add_argument("--db", default="invoice_data.db", help="Pfad zur Datenbank")
+    parser.add_argument("--category", help="Name der Kategorie für alle importierten Rechnungen")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl paralleler Worker (Standard: CPU-Kerne)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Rechnungen pro Transaktion")
+    args = parser.parse_args(argv)
+
+    with DatabaseManager(args.db) as db_manager:
+        category_id = None
+        if args.category:
+            category_id = dict((name, id) for id, name in db_manager.get_categories()).get(args.category)
+            if category_id is None:
+                parser.error(f"Kategorie '{args.category}' existiert nicht.")
+
+        stats = import_directory(db_manager, args.directory, category_id=category_id, workers=args.workers,
+                                 batch_size=args.batch_size,
+                                 progress=lambda done, total: print(f"{done}/{total} Dateien verarbeitet"))
+    print(stats.summary())
+    return 0 if stats.failed == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,35 +1,214 @@
-import matplotlib.pyplot as plt
+import threading
+from datetime import datetime
+
+import customtkinter as ctk
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
 
 class DataAnalytics:
+    # Dashboard in einem eigenen CTkToplevel. Figure und Diagramm-Elemente werden
+    # beim erneuten Öffnen wiederverwendet und nur mit neuen Daten aktualisiert;
+    # die Abfragen laufen in einem Hintergrund-Thread.
     def __init__(self, db_manager):
         self.db_manager = db_manager
+        self.window = None
+        self.figure = None
+        self.canvas = None
+        self.axes = {}
+        self.artists = {}
+        self._result = None
+        self._loading = False
+
+    def display_all_charts(self, parent):
+        if self.window is None or not self.window.winfo_exists():
+            self._create_window(parent)
+        else:
+            self.window.deiconify()
+            self.window.lift()
+        self.refresh()
+
+    def _create_window(self, parent):
+        self.window = ctk.CTkToplevel(parent)
+        self.window.title("Statistiken")
+        self.window.geometry("1200x800")
+        # Schließen versteckt das Fenster nur, damit Figure und Canvas erhalten bleiben
+        self.window.protocol("WM_DELETE_WINDOW", self.window.withdraw)
+
+        self.status_label = ctk.CTkLabel(self.window, text="", font=("Arial", 12))
+        self.status_label.pack(pady=(10, 0))
+
+        self.figure = Figure(figsize=(14, 9))
+        grid = self.figure.subplots(2, 2)
+        self.axes = {"monthly": grid[0][0], "trend": grid[0][1], "aging": grid[1][0], "tax": grid[1][1]}
+        self.artists = {}
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.window)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True, padx=10, pady=10)
+
+    def refresh(self):
+        if self._loading:
+            return
+        self._loading = True
+        self._result = None
+        self.status_label.configure(text="⏳ Statistiken werden geladen...")
+
+        def fetch():
+            # Die Abfragen laufen über den Lese-Pool des DatabaseManager und blockieren keine Schreibzugriffe
+            try:
+                self._result = ("ok", self.fetch_dashboard_data(self.db_manager))
+            except Exception as e:
+                self._result = ("error", e)
+
+        threading.Thread(target=fetch, daemon=True).start()
+        self.window.after(50, self._poll_result)
+
+    def _poll_result(self):
+        if self._result is None:
+            self.window.after(50, self._poll_result)
+            return
+        self._loading = False
+        state, data = self._result
+        if state == "error":
+            print(f"Fehler beim Laden der Statistiken: {data}")
+            self.status_label.configure(text=f"❌ Fehler beim Laden der Statistiken: {data}")
+            return
+        self.status_label.configure(text=f"Stand: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}")
+        self.update_monthly_spending(data["monthly"])
+        self.update_status_trend(data["trend"])
+        self.update_overdue_aging(data["aging"])
+        self.update_tax_year_totals(data["tax"])
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+    @staticmethod
+    def fetch_dashboard_data(db_manager):
+        # Je Diagramm genau eine gruppierte SQL-Abfrage; die Spalten werden
+        # direkt in NumPy-Arrays umgewandelt, ohne Python-Schleifen über Zeilen.
+        monthly = db_manager.get_monthly_spending_by_category()
+        trend = db_manager.get_status_trend()
+        aging = db_manager.get_overdue_aging(datetime.now().strftime('%Y-%m-%d'))
+        tax_years = db_manager.get_tax_year_totals()
+
+        periods, period_index = np.unique(np.asarray(monthly["period"], dtype=np.int64), return_inverse=True)
+        categories, category_index = np.unique(np.asarray(monthly["category"], dtype=object), return_inverse=True)
+        # Pivot (Kategorie x Monat) in einem Schritt
+        matrix = np.zeros((len(categories), len(periods)))
+        np.add.at(matrix, (category_index, period_index), np.asarray(monthly["total"], dtype=float))
+
+        aging_counts = np.zeros(len(db_manager.OVERDUE_AGING_BUCKETS), dtype=np.int64)
+        aging_counts[np.asarray(aging["bucket"], dtype=np.int64)] = np.asarray(aging["invoice_count"], dtype=np.int64)
+
+        return {
+            "monthly": {"periods": periods, "categories": categories, "matrix": matrix},
+            "trend": {"periods": np.asarray(trend["period"], dtype=np.int64),
+                      "open": np.asarray(trend["open_cumulative"], dtype=float),
+                      "paid": np.asarray(trend["paid_cumulative"], dtype=float)},
+            "aging": {"buckets": db_manager.OVERDUE_AGING_BUCKETS, "counts": aging_counts},
+            "tax": {"years": np.asarray(tax_years["year"], dtype=np.int64),
+                    "totals": np.asarray(tax_years["total"], dtype=float)},
+        }
+
+    @staticmethod
+    def format_periods(periods):
+        periods = np.asarray(periods, dtype=np.int64)
+        return [f"{month:02d}/{year}" for year, month in zip(periods // 100, periods % 100)]
+
+    @staticmethod
+    def _show_no_data(ax, title):
+        ax.clear()
+        ax.set_title(title, fontsize=13)
+        ax.text(0.5, 0.5, "Keine Daten", ha='center', va='center', transform=ax.transAxes)
+
+    def update_monthly_spending(self, data):
+        ax = self.axes["monthly"]
+        periods, categories, matrix = data["periods"], data["categories"], data["matrix"]
+        title = 'Monatliche Ausgaben pro Kategorie'
+        if not len(periods):
+            self.artists.pop("monthly", None)
+            self._show_no_data(ax, title)
+            return
+
+        bottoms = np.vstack([np.zeros(len(periods)), np.cumsum(matrix, axis=0)[:-1]])
+        previous = self.artists.get("monthly")
+        if previous is not None and np.array_equal(previous["periods"], periods) and np.array_equal(previous["categories"], categories):
+            # Gleiche Achsen -> nur Balkenhöhen aktualisieren
+            for container, values, bottom in zip(previous["containers"], matrix, bottoms):
+                for bar, value, y in zip(container.patches, values, bottom):
+                    bar.set_height(value)
+                    bar.set_y(y)
+            ax.relim()
+            ax.autoscale_view()
+            return
+
+        ax.clear()
+        x = np.arange(len(periods))
+        containers = [ax.bar(x, values, bottom=bottom, label=category)
+                      for category, values, bottom in zip(categories, matrix, bottoms)]
+        ax.set_title(title, fontsize=13)
+        ax.set_xticks(x)
+        ax.set_xticklabels(self.format_periods(periods), rotation=45, ha="right")
+        ax.set_ylabel('Ausgaben in €')
+        ax.legend(fontsize=8)
+        self.artists["monthly"] = {"periods": periods, "categories": categories, "containers": containers}
+
+    def update_status_trend(self, data):
+        ax = self.axes["trend"]
+        title = 'Offen vs. bezahlt (kumuliert)'
+        if not len(data["periods"]):
+            self.artists.pop("trend", None)
+            self._show_no_data(ax, title)
+            return
+
+        x = np.arange(len(data["periods"]))
+        lines = self.artists.get("trend")
+        if lines is None:
+            ax.clear()
+            open_line, = ax.plot(x, data["open"], color='#FF5722', marker='o', label='Offen')
+            paid_line, = ax.plot(x, data["paid"], color='#4CAF50', marker='o', label='Bezahlt')
+            ax.set_title(title, fontsize=13)
+            ax.set_ylabel('Summe in €')
+            ax.legend()
+            self.artists["trend"] = lines = {"open": open_line, "paid": paid_line}
+        else:
+            lines["open"].set_data(x, data["open"])
+            lines["paid"].set_data(x, data["paid"])
+        ax.set_xticks(x)
+        ax.set_xticklabels(self.format_periods(data["periods"]), rotation=45, ha="right")
+        ax.relim()
+        ax.autoscale_view()
+
+    def update_overdue_aging(self, data):
+        ax = self.axes["aging"]
+        bars = self.artists.get("aging")
+        if bars is None:
+            ax.clear()
+            bars = ax.bar(data["buckets"], data["counts"], color='#FFC107')
+            ax.set_title('Überfällige Rechnungen nach Alter', fontsize=13)
+            ax.set_ylabel('Anzahl Rechnungen')
+            self.artists["aging"] = bars
+        else:
+            for bar, count in zip(bars.patches, data["counts"]):
+                bar.set_height(count)
+        ax.relim()
+        ax.autoscale_view()
 
-    def display_all_charts(self):
-        self.display_spending_by_category()
-        
-    def display_spending_by_category(self):
-        data = self.db_manager.get_total_amount_by_category()
-        if not data:
-            self.show_no_data_message("Keine Ausgabendaten verfügbar.")
+    def update_tax_year_totals(self, data):
+        ax = self.axes["tax"]
+        title = 'Vorgemerkte Beträge je Steuerjahr'
+        if not len(data["years"]):
+            self.artists.pop("tax", None)
+            self._show_no_data(ax, title)
             return
 
-        categories = [item[0] for item in data]
-        amounts = [item[1] for item in data]
-
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        # Erstelle ein Bar-Chart mit den Ausgaben pro Kategorie
-        ax.bar(categories, amounts, color='#4CAF50')
-
-        ax.set_title('Gesamtausgaben pro Kategorie', fontsize=16)
-        ax.set_xlabel('Kategorie', fontsize=12)
-        ax.set_ylabel('Gesamtausgaben in €', fontsize=12)
-        plt.xticks(rotation=45, ha="right")
-        plt.tight_layout()
-        plt.show()
-
-    def show_no_data_message(self, message):
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.text(0.5, 0.5, message, ha='center', va='center', fontsize=14)
-        ax.axis('off')
-        plt.show()
\ No newline at end of file
+        previous = self.artists.get("tax")
+        if previous is not None and np.array_equal(previous["years"], data["years"]):
+            for bar, total in zip(previous["bars"].patches, data["totals"]):
+                bar.set_height(total)
+        else:
+            ax.clear()
+            bars = ax.bar(data["years"].astype(str), data["totals"], color='#008CBA')
+            ax.set_title(title, fontsize=13)
+            ax.set_ylabel('Summe in €')
+            self.artists["tax"] = {"years": data["years"], "bars": bars}
+        ax.relim()
+        ax.autoscale_view()
@@ -1,11 +1,189 @@
+import os
+import queue
+import random
+import re
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
 
 class DatabaseManager:
-    def __init__(self, db_path="invoice_data.db"):
-        self.conn = sqlite3.connect(db_path)
+    # Versionierte Schema-Migrationen: Index = alte Version (PRAGMA user_version)
+    MIGRATIONS = (
+        "_migration_1_invoice_indexes",
+        "_migration_2_pdf_status",
+        "_migration_3_content_hash",
+        "_migration_4_spending_totals",
+        "_migration_5_dashboard_indexes",
+        "_migration_6_fulltext_search",
+        "_migration_7_documents",
+        "_migration_8_app_state",
+        "_migration_9_normalized_columns",
+        "_migration_10_change_log",
+        "_migration_11_spending_totals_cents",
+    )
+
+    # Ganzzahlige Statuscodes; alles unter STATUS_PAID gilt als offen (0 = unbekannter Status)
+    STATUS_CODES = {"Offen": 1, "Erinnert": 2, "Bezahlt": 3}
+    STATUS_PAID = STATUS_CODES["Bezahlt"]
+    # Codelisten für "IN (...)" in SQL, aus STATUS_CODES abgeleitet
+    ALL_STATUS_CODES = "(" + ", ".join(map(str, [0] + sorted(STATUS_CODES.values()))) + ")"
+    UNPAID_STATUS_CODES = "(" + ", ".join(map(str, [0] + sorted(filter(STATUS_PAID.__gt__, STATUS_CODES.values())))) + ")"
+    NORMALIZED_COLUMNS = ("status_code", "due_day", "reminder_day", "created_at", "amount_cents")
+    # Blockgröße (IDs) beim Nachtragen der normalisierten Spalten in bestehenden Datenbanken
+    NORMALIZE_CHUNK_SIZE = 20000
+    EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+    # Datumsparameter als Tag seit 1970-01-01, siehe day_number()
+    DUE_QUERY = f"SELECT name, due_date FROM invoices WHERE status_code = {STATUS_CODES['Offen']} AND due_day = ?"
+    # "+status_code": ohne ANALYZE würde SQLite sonst den Statusindex statt des Erinnerungsindex wählen
+    REMINDER_QUERY = f"SELECT name, reminder_date FROM invoices WHERE reminder_day = ? AND +status_code IN {UNPAID_STATUS_CODES}"
+    # Zeitraum (nach, bis] für den Erinnerungs-Scheduler
+    DUE_RANGE_QUERY = ("SELECT id, name, due_date FROM invoices "
+                       f"WHERE status_code = {STATUS_CODES['Offen']} AND due_day > ? AND due_day <= ? ORDER BY due_day")
+    REMINDER_RANGE_QUERY = ("SELECT id, name, reminder_date FROM invoices "
+                            f"WHERE reminder_day > ? AND reminder_day <= ? AND +status_code IN {UNPAID_STATUS_CODES} "
+                            "ORDER BY reminder_day")
+
+    # Erster Parameter: höchste archivierte ID, damit archivierte IDs nie neu vergeben werden
+    INSERT_INVOICE_QUERY = '''
+            INSERT INTO invoices (id, name, amount, image_path, pdf_path, status, due_date, reminder_date, creation_date, category_id, pdf_status, content_hash)
+            VALUES ((SELECT MAX(IFNULL(MAX(id), 0), ?) + 1 FROM invoices), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        '''
+
+    # Liest die materialisierten Summen statt über alle Rechnungen zu aggregieren
+    TOTAL_BY_CATEGORY_QUERY = '''
+            SELECT c.name, SUM(t.total_cents) / 100.0
+            FROM {spending_totals} t
+            JOIN categories c ON t.category_id = c.id
+            GROUP BY c.name
+            ORDER BY SUM(t.total_cents) DESC
+        '''
+
+    JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+    # Ab dieser Anzahl an Änderungen in einem batch() wird nur "reload" gemeldet
+    BATCH_NOTIFY_LIMIT = 50
+    # Maximale Anzahl gleichzeitig geöffneter Read-only-Verbindungen
+    READ_POOL_SIZE = 4
+
+    # Mehrere Programminstanzen auf derselben Datei: so lange wartet SQLite selbst
+    # auf die Sperre eines anderen Prozesses, danach wiederholt batch() den Zugriff
+    # bis zu WRITE_RETRIES-mal mit exponentiell wachsender Pause (mit Zufallsanteil).
+    BUSY_TIMEOUT_SECONDS = 2.0
+    WRITE_RETRIES = 5
+    WRITE_RETRY_DELAY = 0.05
+    WRITE_RETRY_MAX_DELAY = 1.0
+    # Änderungsprotokoll für andere Instanzen: so viele Einträge bleiben erhalten;
+    # wer weiter zurückliegt, bekommt "reload"
+    CHANGE_LOG_KEEP = 10000
+    # Spalten, deren Änderung anderen Instanzen gemeldet wird (ohne die von Triggern gepflegten)
+    CHANGE_LOG_COLUMNS = ("name, amount, image_path, pdf_path, status, due_date, reminder_date, tax_declaration_year, "
+                          "category_id, pdf_status, content_hash")
+    CHANGE_LOG_QUERY = "SELECT seq, invoice_id, action FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?"
+
+    # Archiv: bezahlte Rechnungen älterer Jahre liegen in einer eigenen Datei je
+    # Jahr (<datenbank>_archiv/rechnungen_<jahr>.db), die an jede Verbindung per
+    # ATTACH angehängt wird. SQLite erlaubt standardmäßig höchstens 10 angehängte
+    # Dateien: ab ARCHIVE_MAX_FILES Dateien kommt ein weiteres Jahr in die Datei des
+    # nächstälteren Jahres (ältere Jahre in die älteste Datei).
+    ARCHIVE_FILE_PATTERN = re.compile(r"rechnungen_(\d{4})\.db")
+    ARCHIVE_MAX_FILES = 8
+    # Schemastand der Archivdateien (PRAGMA user_version der Archivdatei); bei
+    # Änderungen an Spalten, Indizes oder Summentabelle erhöhen
+    ARCHIVE_SCHEMA_VERSION = 2
+    ARCHIVE_MIN_AGE_DAYS = 730
+    INVOICE_TABLE_COLUMNS = ("id, name, amount, image_path, pdf_path, creation_date, status, due_date, reminder_date, "
+                             "tax_declaration_year, category_id, pdf_status, content_hash, status_code, due_day, "
+                             "reminder_day, created_at, amount_cents")
+    # Wie invoices, aber ohne Fremdschlüssel (der kann nicht auf eine andere Datei zeigen)
+    ARCHIVE_INVOICES_TABLE = '''
+            CREATE TABLE IF NOT EXISTS invoices (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                amount REAL,
+                image_path TEXT,
+                pdf_path TEXT,
+                creation_date TEXT,
+                status TEXT NOT NULL,
+                due_date TEXT,
+                reminder_date TEXT,
+                tax_declaration_year INTEGER,
+                category_id INTEGER,
+                pdf_status TEXT,
+                content_hash TEXT,
+                status_code INTEGER,
+                due_day INTEGER,
+                reminder_day INTEGER,
+                created_at INTEGER,
+                amount_cents INTEGER
+            )
+        '''
+
+    # Thread-sicher: Alle Schreibzugriffe laufen nacheinander (über _write_lock)
+    # auf der einen Schreibverbindung self.conn. Lesezugriffe anderer Threads
+    # und außerhalb von batch() nutzen einen Pool von Read-only-Verbindungen,
+    # im WAL-Modus blockieren sie sich mit dem Schreiber also nicht gegenseitig.
+    # Mehrere Prozesse dürfen dieselbe Datei öffnen: batch() sperrt dann auch
+    # gegenüber den anderen Prozessen, deren Änderungen holt poll_external_changes()
+    # ab. WAL setzt voraus, dass alle Prozesse auf demselben Rechner laufen; auf
+    # Netzlaufwerken journal_mode="DELETE" verwenden.
+    def __init__(self, db_path="invoice_data.db", journal_mode="WAL", synchronous=None, read_pool_size=None):
+        self.db_path = db_path
+        self._change_listeners = []
+        # Benachrichtigungen für Listener anderer Threads, siehe dispatch_pending_changes()
+        self._foreign_changes = queue.Queue()
+        self._batch_depth = 0
+        self._batch_owner = None
+        self._pending_changes = []
+        self._write_lock = threading.RLock()
+        # Wird nach jedem Commit mit Änderungen erhöht; Caches vergleichen damit ihre Einträge
+        self.data_version = 0
+        self._committed_changes = 0
+        # Stand des Änderungsprotokolls (letzte gesehene seq, PRAGMA data_version);
+        # None bis zum Ende von __init__, Migrationen werden nicht gemeldet
+        self._change_seq = None
+        self._sqlite_data_version = None
+        self._batch_start_seq = None
+        self._archives_changed = False
+        in_memory = db_path in (":memory:", "") or str(db_path).startswith("file::memory:")
+        self._read_pool_size = 0 if in_memory else (self.READ_POOL_SIZE if read_pool_size is None else read_pool_size)
+        self._read_pool = queue.LifoQueue()
+        self._read_connections = []
+        self._read_pool_lock = threading.Lock()
+        self._trace_callback = None
+        # Jahr -> Schemaname der angehängten Archivdatei; wird nur als Ganzes ersetzt,
+        # damit andere Threads ohne Sperre darüber iterieren können
+        self._archives = {}
+        self._attached_archives = {}
+        self.archive_dir = None if in_memory else os.path.splitext(os.path.abspath(db_path))[0] + "_archiv"
+        self.conn = sqlite3.connect(db_path, timeout=self.BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._closed = False
         self.cursor = self.conn.cursor()
+        self._configure_connection(journal_mode, synchronous)
         self._create_tables()
+        self._run_migrations()
+        self._backfill_normalized_columns()
+        self._discover_archives()
+        self._attach_archives(self.conn)
+        # Höchste jemals archivierte ID: neue Rechnungen bekommen immer eine größere
+        self._archive_max_id = int(self.get_state("archive_max_id", 0))
+        self._committed_changes = self.conn.total_changes
+        self._start_change_feed()
+
+    def _configure_connection(self, journal_mode, synchronous):
+        # z.B. journal_mode="WAL", synchronous="NORMAL": Commits kosten dann kein fsync
+        # pro Transaktion mehr, sondern nur noch bei Checkpoints
+        if journal_mode is not None:
+            if journal_mode.upper() not in self.JOURNAL_MODES:
+                raise ValueError(f"Unbekannter journal_mode: {journal_mode}")
+            self.cursor.execute(f"PRAGMA journal_mode = {journal_mode.upper()}")
+        if synchronous is not None:
+            if synchronous.upper() not in self.SYNCHRONOUS_LEVELS:
+                raise ValueError(f"Unbekannte synchronous-Stufe: {synchronous}")
+            self.cursor.execute(f"PRAGMA synchronous = {synchronous.upper()}")
 
     def _create_tables(self):
         self.cursor.execute('''
@@ -33,94 +211,1338 @@ class DatabaseManager:
         ''')
         self.conn.commit()
 
+    def get_schema_version(self):
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+
+    def _run_migrations(self):
+        version = self.get_schema_version()
+        while version < len(self.MIGRATIONS):
+            # Jede Migration läuft atomar zusammen mit dem Hochzählen der Version.
+            # Die Version wird unter der Schreibsperre neu gelesen: eine gleichzeitig
+            # gestartete Instanz kann die Migration schon ausgeführt haben.
+            self._retry_busy(lambda: self.conn.execute("BEGIN IMMEDIATE"))
+            try:
+                version = self.get_schema_version()
+                if version < len(self.MIGRATIONS):
+                    getattr(self, self.MIGRATIONS[version])()
+                    version += 1
+                    self.cursor.execute(f"PRAGMA user_version = {version}")
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+
+    def _migration_1_invoice_indexes(self):
+        # Zugriffspfade von get_invoices (Filter + ORDER BY due_date DESC),
+        # get_due_and_reminder_invoices und get_total_amount_by_category
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_due_date ON invoices (due_date)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_status_due ON invoices (status, due_date)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_category_due ON invoices (category_id, due_date)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_category_amount ON invoices (category_id, amount)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_reminder ON invoices (reminder_date)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_tax_due ON invoices (due_date) WHERE tax_declaration_year IS NOT NULL")
+
+    def _migration_2_pdf_status(self):
+        # 'pending' solange die PDF im Hintergrund erzeugt wird, danach 'done',
+        # 'failed' oder 'cancelled'. NULL für Rechnungen ohne Bild.
+        self.cursor.execute("ALTER TABLE invoices ADD COLUMN pdf_status TEXT")
+        self.cursor.execute("UPDATE invoices SET pdf_status = 'done' WHERE pdf_path IS NOT NULL")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_pdf_pending ON invoices (id) WHERE pdf_status = 'pending'")
+
+    def _migration_3_content_hash(self):
+        # SHA-256 der Originaldatei, damit Importe bereits bekannte Scans überspringen
+        self.cursor.execute("ALTER TABLE invoices ADD COLUMN content_hash TEXT")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_content_hash ON invoices (content_hash) WHERE content_hash IS NOT NULL")
+
+    # Zeitraum einer Rechnung für die Ausgabenstatistik: Fälligkeit, sonst Erstellung
+    @staticmethod
+    def _period_sql(row):
+        period_date = f"COALESCE({row}.due_date, {row}.creation_date)"
+        return (f"IFNULL(CAST(substr({period_date}, 1, 4) AS INTEGER), 0)",
+                f"IFNULL(CAST(substr({period_date}, 6, 2) AS INTEGER), 0)")
+
+    SPENDING_TOTALS_TRIGGERS = ("trg_spending_totals_insert", "trg_spending_totals_delete",
+                                "trg_spending_totals_update_old", "trg_spending_totals_update_new")
+    SPENDING_TOTALS_INDEX = ("CREATE INDEX IF NOT EXISTS idx_spending_totals_period "
+                             "ON invoice_spending_totals (year, month, category_id, status, total_cents)")
+
+    @classmethod
+    def _spending_totals_schema(cls):
+        # Materialisierte Summen je (Kategorie, Jahr, Monat, Status), per Trigger
+        # bei jedem INSERT/UPDATE/DELETE auf invoices aktuell gehalten. Summiert
+        # wird in Cent, damit sich keine Rundungsfehler ansammeln.
+        # category_id 0 steht für "keine Kategorie". Auch für die Archivdateien.
+        statements = ['''
+            CREATE TABLE IF NOT EXISTS invoice_spending_totals (
+                category_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                total_cents INTEGER NOT NULL,
+                invoice_count INTEGER NOT NULL,
+                PRIMARY KEY (category_id, year, month, status)
+            ) WITHOUT ROWID
+        ''']
+        new_year, new_month = cls._period_sql("new")
+        old_year, old_month = cls._period_sql("old")
+        # Aus amount statt amount_cents: der Trigger dafür läuft womöglich erst danach
+        new_cents = cls._normalized_values_sql("new.")["amount_cents"]
+        old_cents = cls._normalized_values_sql("old.")["amount_cents"]
+        add_new = f'''
+                INSERT INTO invoice_spending_totals (category_id, year, month, status, total_cents, invoice_count)
+                VALUES (IFNULL(new.category_id, 0), {new_year}, {new_month}, new.status, {new_cents}, 1)
+                ON CONFLICT (category_id, year, month, status)
+                DO UPDATE SET total_cents = total_cents + excluded.total_cents, invoice_count = invoice_count + 1;
+        '''
+        remove_old = f'''
+                UPDATE invoice_spending_totals SET total_cents = total_cents - {old_cents}, invoice_count = invoice_count - 1
+                WHERE category_id = IFNULL(old.category_id, 0) AND year = {old_year} AND month = {old_month} AND status = old.status;
+                DELETE FROM invoice_spending_totals
+                WHERE category_id = IFNULL(old.category_id, 0) AND year = {old_year} AND month = {old_month} AND status = old.status
+                  AND invoice_count <= 0;
+        '''
+        tracked_columns = "amount, status, category_id, due_date, creation_date"
+        events = (
+            ("AFTER INSERT ON invoices", "new.amount IS NOT NULL", add_new),
+            ("AFTER DELETE ON invoices", "old.amount IS NOT NULL", remove_old),
+            (f"AFTER UPDATE OF {tracked_columns} ON invoices", "old.amount IS NOT NULL", remove_old),
+            (f"AFTER UPDATE OF {tracked_columns} ON invoices", "new.amount IS NOT NULL", add_new),
+        )
+        for name, (event, condition, body) in zip(cls.SPENDING_TOTALS_TRIGGERS, events):
+            statements.append(f"CREATE TRIGGER IF NOT EXISTS {name} {event} WHEN {condition} BEGIN {body} END")
+        return statements
+
+    @classmethod
+    def _spending_totals_rebuild(cls):
+        # Legt Tabelle, Trigger und Index neu an und füllt die Summen aus invoices
+        statements = [f"DROP TRIGGER IF EXISTS {name}" for name in cls.SPENDING_TOTALS_TRIGGERS]
+        statements.append("DROP TABLE IF EXISTS invoice_spending_totals")
+        statements.extend(cls._spending_totals_schema())
+        year, month = cls._period_sql("i")
+        statements.append(f'''
+            INSERT INTO invoice_spending_totals (category_id, year, month, status, total_cents, invoice_count)
+            SELECT IFNULL(i.category_id, 0), {year}, {month}, i.status,
+                   SUM({cls._normalized_values_sql("i.")["amount_cents"]}), COUNT(*)
+            FROM invoices i
+            WHERE i.amount IS NOT NULL
+            GROUP BY 1, 2, 3, 4
+        ''')
+        statements.append(cls.SPENDING_TOTALS_INDEX)
+        return statements
+
+    def _migration_4_spending_totals(self):
+        for statement in self._spending_totals_rebuild():
+            self.cursor.execute(statement)
+        # Der Covering-Index für die alte Live-Aggregation wird nicht mehr gebraucht
+        self.cursor.execute("DROP INDEX IF EXISTS idx_invoices_category_amount")
+
+    def _migration_5_dashboard_indexes(self):
+        # Covering-Indizes für die Dashboard-Abfragen (zeitliche Reihenfolge der
+        # Summen, Summen je Steuerjahr)
+        self.cursor.execute(self.SPENDING_TOTALS_INDEX)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoices_tax_year ON invoices (tax_declaration_year, amount) WHERE tax_declaration_year IS NOT NULL")
+
+    # FTS5-Index über den Rechnungsnamen (External Content auf invoices),
+    # per Trigger synchron gehalten. Auch für die Archivdateien.
+    FULLTEXT_SCHEMA = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS invoices_fts USING fts5(name, content='invoices', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_invoices_fts_insert AFTER INSERT ON invoices BEGIN
+                INSERT INTO invoices_fts (rowid, name) VALUES (new.id, new.name);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_invoices_fts_delete AFTER DELETE ON invoices BEGIN
+                INSERT INTO invoices_fts (invoices_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_invoices_fts_update AFTER UPDATE OF name ON invoices BEGIN
+                INSERT INTO invoices_fts (invoices_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO invoices_fts (rowid, name) VALUES (new.id, new.name);
+            END
+        ''',
+        "INSERT INTO invoices_fts (invoices_fts) VALUES ('rebuild')",
+    )
+
+    def _migration_6_fulltext_search(self):
+        for statement in self.FULLTEXT_SCHEMA:
+            self.cursor.execute(statement)
+
+    def _migration_7_documents(self):
+        # Referenzzähler für Dateien im DocumentStore; die Trigger zählen jede
+        # Verwendung als image_path oder pdf_path einer Rechnung
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                sha256 TEXT PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        increment = "UPDATE documents SET refcount = refcount + 1 WHERE path IN (new.image_path, new.pdf_path);"
+        decrement = "UPDATE documents SET refcount = refcount - 1 WHERE path IN (old.image_path, old.pdf_path);"
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_documents_insert AFTER INSERT ON invoices BEGIN {increment} END")
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_documents_delete AFTER DELETE ON invoices BEGIN {decrement} END")
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_documents_update AFTER UPDATE OF image_path, pdf_path ON invoices BEGIN {decrement} {increment} END")
+
+    def _migration_8_app_state(self):
+        # Schlüssel/Wert-Ablage für Programmzustand, z.B. den zuletzt geprüften Erinnerungstag
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS app_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            ) WITHOUT ROWID
+        ''')
+
+    @classmethod
+    def _normalized_values_sql(cls, row=""):
+        # SQL-Ausdrücke für die normalisierten Spalten aus den Textspalten (row = "new." im Trigger)
+        cases = " ".join(f"WHEN '{status}' THEN {code}" for status, code in cls.STATUS_CODES.items())
+        return {
+            "status_code": f"CASE {row}status {cases} ELSE 0 END",
+            "due_day": f"CAST(julianday({row}due_date) - 2440587.5 AS INTEGER)",
+            "reminder_day": f"CAST(julianday({row}reminder_date) - 2440587.5 AS INTEGER)",
+            "created_at": f"CAST(strftime('%s', {row}creation_date) AS INTEGER)",
+            "amount_cents": f"CAST(ROUND({row}amount * 100) AS INTEGER)",
+        }
+
+    NORMALIZED_INDEXES = (
+        "CREATE INDEX IF NOT EXISTS idx_invoices_status_due_day ON invoices (status_code, due_day, amount_cents)",
+        "CREATE INDEX IF NOT EXISTS idx_invoices_reminder_day ON invoices (reminder_day, status_code)",
+        "CREATE INDEX IF NOT EXISTS idx_invoices_tax_year_cents ON invoices (tax_declaration_year, amount_cents) "
+        "WHERE tax_declaration_year IS NOT NULL",
+    )
+
+    def _migration_9_normalized_columns(self):
+        # Ganzzahlige Spalten für Bereichsabfragen und exakte Summen: status_code,
+        # due_day/reminder_day (Tage seit 1970-01-01), created_at (Unix-Sekunden)
+        # und amount_cents. Die Textspalten bleiben für Anzeige und Schreibzugriffe
+        # führend, Trigger halten die Zahlen aktuell. Bestehende Zeilen werden
+        # danach blockweise von _backfill_normalized_columns() gefüllt.
+        for column in self.NORMALIZED_COLUMNS:
+            self.cursor.execute(f"ALTER TABLE invoices ADD COLUMN {column} INTEGER")
+        assignments = ", ".join(f"{column} = {value}" for column, value in self._normalized_values_sql("new.").items())
+        body = f"UPDATE invoices SET {assignments} WHERE id = new.id;"
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_invoices_normalize_insert AFTER INSERT ON invoices BEGIN {body} END")
+        self.cursor.execute("CREATE TRIGGER IF NOT EXISTS trg_invoices_normalize_update "
+                            f"AFTER UPDATE OF status, due_date, reminder_date, creation_date, amount ON invoices BEGIN {body} END")
+        self.cursor.execute("INSERT OR REPLACE INTO app_state (key, value) VALUES ('normalize_backfill_id', '0')")
+
+    def _backfill_normalized_columns(self):
+        # Jeder Block ist eine eigene Transaktion und merkt sich die erreichte ID:
+        # ein abgebrochener Lauf macht beim nächsten Öffnen dort weiter.
+        # Die Indizes entstehen erst am Ende in einem Durchgang.
+        progress = self.get_state("normalize_backfill_id")
+        if progress is None or progress == "fertig":
+            return
+        last_id = int(progress)
+        self.cursor.execute("SELECT IFNULL(MAX(id), 0) FROM invoices")
+        max_id = self.cursor.fetchone()[0]
+        assignments = ", ".join(f"{column} = {value}" for column, value in self._normalized_values_sql().items())
+        while last_id < max_id:
+            upper_id = last_id + self.NORMALIZE_CHUNK_SIZE
+            with self.batch():
+                self.cursor.execute(f"UPDATE invoices SET {assignments} WHERE id > ? AND id <= ?", (last_id, upper_id))
+                self.set_state("normalize_backfill_id", str(upper_id))
+            last_id = upper_id
+        with self.batch():
+            for statement in self.NORMALIZED_INDEXES:
+                self.cursor.execute(statement)
+            # Durch die Indizes auf den Zahlenspalten ersetzt
+            self.cursor.execute("DROP INDEX IF EXISTS idx_invoices_reminder")
+            self.cursor.execute("DROP INDEX IF EXISTS idx_invoices_tax_year")
+            self.set_state("normalize_backfill_id", "fertig")
+
+    def _migration_10_change_log(self):
+        # Änderungsprotokoll für andere Instanzen auf derselben Datei, siehe
+        # poll_external_changes(). Die Trigger erfassen jeden Schreiber, auch die
+        # Kommandozeile; AUTOINCREMENT vergibt seq auch nach dem Aufräumen nie erneut.
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                invoice_id INTEGER NOT NULL,
+                action TEXT NOT NULL
+            )
+        ''')
+        self.cursor.execute("CREATE TRIGGER IF NOT EXISTS trg_change_log_insert AFTER INSERT ON invoices "
+                            "BEGIN INSERT INTO change_log (invoice_id, action) VALUES (new.id, 'insert'); END")
+        self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_change_log_update AFTER UPDATE OF {self.CHANGE_LOG_COLUMNS} "
+                            "ON invoices BEGIN INSERT INTO change_log (invoice_id, action) VALUES (new.id, 'update'); END")
+        self.cursor.execute("CREATE TRIGGER IF NOT EXISTS trg_change_log_delete AFTER DELETE ON invoices "
+                            "BEGIN INSERT INTO change_log (invoice_id, action) VALUES (old.id, 'delete'); END")
+
+    def _migration_11_spending_totals_cents(self):
+        # Summen in Cent statt als REAL, das bei vielen Additionen/Subtraktionen driftet
+        for statement in self._spending_totals_rebuild():
+            self.cursor.execute(statement)
+
+    @classmethod
+    def day_number(cls, value):
+        # ISO-Datum (oder date) -> Tage seit 1970-01-01, wie due_day/reminder_day
+        if isinstance(value, str):
+            value = date.fromisoformat(value[:10])
+        return value.toordinal() - cls.EPOCH_ORDINAL
+
+    def get_state(self, key, default=None):
+        with self._read() as cursor:
+            cursor.execute("SELECT value FROM app_state WHERE key = ?", (key,))
+            row = cursor.fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self.batch():
+            self.cursor.execute("INSERT INTO app_state (key, value) VALUES (?, ?) "
+                                "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    # --- Archiv ------------------------------------------------------------
+
+    def _archive_path(self, year):
+        return os.path.join(self.archive_dir, f"rechnungen_{year}.db")
+
+    def _discover_archives(self):
+        if self.archive_dir is None or not os.path.isdir(self.archive_dir):
+            return
+        years = []
+        for file_name in sorted(os.listdir(self.archive_dir)):
+            match = self.ARCHIVE_FILE_PATTERN.fullmatch(file_name)
+            if match:
+                year = int(match.group(1))
+                # Archive aus älteren Versionen auf das aktuelle Schema bringen; aktuelle bleiben unverändert
+                self._prepare_archive(year)
+                years.append(year)
+        # Zu viele Dateien (ältere Versionen kannten kein Limit): die ältesten zusammenlegen
+        surplus = len(years) - self.ARCHIVE_MAX_FILES
+        if surplus > 0:
+            for year in years[:surplus]:
+                self._merge_archive(year, years[surplus])
+            years = years[surplus:]
+        self._archives = {year: f"archiv_{year}" for year in years}
+
+    def _archive_file_year(self, year, archives):
+        # Datei (Schlüssel in archives), in die Rechnungen des Jahres kommen
+        if year in archives or len(archives) < self.ARCHIVE_MAX_FILES:
+            return year
+        older = [file_year for file_year in archives if file_year < year]
+        return max(older) if older else min(archives)
+
+    def _merge_archive(self, source_year, target_year):
+        # Verschiebt den Inhalt einer Archivdatei in eine andere und löscht sie danach;
+        # INSERT OR IGNORE macht einen abgebrochenen Lauf wiederholbar
+        conn = sqlite3.connect(self._archive_path(target_year), timeout=self.BUSY_TIMEOUT_SECONDS)
+        try:
+            conn.execute("ATTACH DATABASE ? AS quelle", (self._archive_path(source_year),))
+            conn.execute(f"INSERT OR IGNORE INTO main.invoices ({self.INVOICE_TABLE_COLUMNS}) "
+                         f"SELECT {self.INVOICE_TABLE_COLUMNS} FROM quelle.invoices")
+            conn.commit()
+            conn.execute("DETACH DATABASE quelle")
+        finally:
+            conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self._archive_path(source_year) + suffix):
+                os.remove(self._archive_path(source_year) + suffix)
+
+    def _attach_archives(self, conn, archives=None):
+        # Hängt fehlende Archive an und nicht mehr vorhandene ab; darf nicht
+        # innerhalb einer Transaktion laufen
+        archives = self._archives if archives is None else archives
+        attached = self._attached_archives.setdefault(conn, set())
+        for schema in attached - set(archives.values()):
+            conn.execute(f"DETACH DATABASE {schema}")
+            attached.discard(schema)
+        for year, schema in list(archives.items()):
+            if schema not in attached:
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (self._archive_path(year),))
+                attached.add(schema)
+
+    def _prepare_archive(self, year):
+        # Legt die Archivdatei an bzw. ergänzt fehlende Spalten und Indizes, wenn
+        # ihr Schemastand älter als ARCHIVE_SCHEMA_VERSION ist
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn = sqlite3.connect(self._archive_path(year), timeout=self.BUSY_TIMEOUT_SECONDS)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= self.ARCHIVE_SCHEMA_VERSION:
+                return
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(self.ARCHIVE_INVOICES_TABLE)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(invoices)")}
+            missing = [column for column in self.NORMALIZED_COLUMNS if column not in existing]
+            for column in missing:
+                conn.execute(f"ALTER TABLE invoices ADD COLUMN {column} INTEGER")
+            if missing:
+                # Archive sind klein genug für eine einzige Anweisung
+                values = self._normalized_values_sql()
+                conn.execute("UPDATE invoices SET " + ", ".join(f"{column} = {values[column]}" for column in missing))
+            totals_columns = {row[1] for row in conn.execute("PRAGMA table_info(invoice_spending_totals)")}
+            if "total_cents" not in totals_columns:
+                for statement in self._spending_totals_rebuild():
+                    conn.execute(statement)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_due_date ON invoices (due_date)")
+            for statement in self.NORMALIZED_INDEXES:
+                conn.execute(statement)
+            conn.execute("DROP INDEX IF EXISTS idx_invoices_tax_year")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_content_hash ON invoices (content_hash) "
+                         "WHERE content_hash IS NOT NULL")
+            conn.execute(self.SPENDING_TOTALS_INDEX)
+            # Volltextsuche auch in archivierten Rechnungen (Steueransicht); 'rebuild' liest den Bestand ein
+            for statement in self.FULLTEXT_SCHEMA:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {self.ARCHIVE_SCHEMA_VERSION}")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_archive_years(self):
+        # Jahre mit archivierten Rechnungen (eine Datei kann mehrere Jahre enthalten)
+        if not self._archives:
+            return []
+        parts = " UNION ".join(f"SELECT year FROM {schema}.invoice_spending_totals" for schema in self._archives.values())
+        with self._read() as cursor:
+            cursor.execute(f"SELECT year FROM ({parts}) WHERE year > 0 ORDER BY year")
+            return [row[0] for row in cursor.fetchall()]
+
+    def _invoice_source(self, include_archive):
+        # Tabellenausdruck für invoices; mit Archiven als UNION ALL über alle Dateien
+        archives = self._archives
+        if not include_archive or not archives:
+            return "invoices"
+        parts = [f"SELECT {self.INVOICE_TABLE_COLUMNS} FROM main.invoices"]
+        parts.extend(f"SELECT {self.INVOICE_TABLE_COLUMNS} FROM {schema}.invoices" for schema in archives.values())
+        return "(" + " UNION ALL ".join(parts) + ")"
+
+    def _spending_totals_source(self):
+        archives = self._archives
+        if not archives:
+            return "invoice_spending_totals"
+        columns = "category_id, year, month, status, total_cents, invoice_count"
+        parts = [f"SELECT {columns} FROM main.invoice_spending_totals"]
+        parts.extend(f"SELECT {columns} FROM {schema}.invoice_spending_totals" for schema in archives.values())
+        return "(" + " UNION ALL ".join(parts) + ")"
+
+    def _history_query(self, query):
+        # Auswertungen über die gesamte Historie: Platzhalter durch Haupttabelle plus Archive ersetzen
+        return query.format(invoices=self._invoice_source(True), spending_totals=self._spending_totals_source())
+
+    def archive_paid_invoices(self, min_age_days=ARCHIVE_MIN_AGE_DAYS, today=None):
+        # Verschiebt bezahlte Rechnungen, deren Fälligkeit (sonst Erstellung) mehr
+        # als min_age_days zurückliegt, in die Archivdatei ihres Jahres (siehe
+        # ARCHIVE_MAX_FILES). Gibt die Anzahl verschobener Rechnungen zurück.
+        # Transaktionen über mehrere Dateien sind im WAL-Modus nicht gemeinsam
+        # atomar: deshalb erst kopieren, dann in einer zweiten Transaktion alle
+        # Rechnungen löschen, die bereits in einem Archiv stehen. Ein abgebrochener
+        # Lauf wird so beim nächsten Mal vervollständigt.
+        if self.archive_dir is None:
+            return 0
+        cutoff = ((today or date.today()) - timedelta(days=min_age_days)).isoformat()
+        period = "COALESCE(due_date, creation_date)"
+        condition = f"status = 'Bezahlt' AND {period} < ?"
+        with self._write_lock:
+            self.cursor.execute(f"SELECT DISTINCT CAST(substr({period}, 1, 4) AS INTEGER) FROM invoices WHERE {condition}",
+                                (cutoff,))
+            years = [row[0] for row in self.cursor.fetchall() if row[0]]
+            archives = dict(self._archives)
+            targets = {}
+            for year in years:
+                file_year = self._archive_file_year(year, archives)
+                if file_year not in archives:
+                    self._prepare_archive(file_year)
+                    archives[file_year] = f"archiv_{file_year}"
+                targets[year] = archives[file_year]
+            # Erst nach erfolgreichem ATTACH übernehmen, sonst gälte ein fehlgeschlagenes Archiv als angehängt
+            self._attach_archives(self.conn, archives)
+            self._archives = archives
+
+            with self.batch():
+                for year in years:
+                    self.cursor.execute(f"INSERT OR IGNORE INTO {targets[year]}.invoices ({self.INVOICE_TABLE_COLUMNS}) "
+                                        f"SELECT {self.INVOICE_TABLE_COLUMNS} FROM main.invoices "
+                                        f"WHERE {condition} AND CAST(substr({period}, 1, 4) AS INTEGER) = ?", (cutoff, year))
+
+            moved = 0
+            with self.batch():
+                for schema in self._archives.values():
+                    # Rest einer abgebrochenen Rückholung (_unarchive, nicht über beide Dateien
+                    # atomar): steht die Rechnung unbezahlt in der Haupttabelle, gilt diese
+                    self.cursor.execute(f"SELECT id FROM {schema}.invoices "
+                                        "WHERE id IN (SELECT id FROM main.invoices WHERE status != 'Bezahlt')")
+                    self._delete_archived([row[0] for row in self.cursor.fetchall()])
+                    archived = f"id IN (SELECT id FROM {schema}.invoices)"
+                    self.cursor.execute(f"SELECT id, image_path, pdf_path FROM main.invoices WHERE {archived}")
+                    rows = self.cursor.fetchall()
+                    if not rows:
+                        continue
+                    # Der Lösch-Trigger zählt die Dokumente herunter, sie werden aber weiter vom Archiv verwendet
+                    self.cursor.executemany("UPDATE documents SET refcount = refcount + 1 WHERE path IN (?, ?)",
+                                            [(image_path, pdf_path) for _, image_path, pdf_path in rows])
+                    self.cursor.execute(f"DELETE FROM main.invoices WHERE {archived}")
+                    moved += len(rows)
+                    self._archive_max_id = max(self._archive_max_id, max(row[0] for row in rows))
+                if moved:
+                    self.set_state("archive_max_id", str(self._archive_max_id))
+                    self._notify_invoice_change("reload", [])
+        return moved
+
+    def _archived_ids(self, invoice_ids):
+        archived = set()
+        for schema in self._archives.values():
+            for start in range(0, len(invoice_ids), 500):
+                chunk = invoice_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                self.cursor.execute(f"SELECT id FROM {schema}.invoices WHERE id IN ({placeholders})", chunk)
+                archived.update(row[0] for row in self.cursor.fetchall())
+        return archived
+
+    def _unarchive(self, invoice_ids):
+        # Holt archivierte Rechnungen zurück in die Haupttabelle (innerhalb von batch()).
+        # Der Einfüge-Trigger zählt die Dokumente hoch, _delete_archived wieder herunter.
+        archived = list(self._archived_ids(invoice_ids))
+        for schema in self._archives.values():
+            for start in range(0, len(archived), 500):
+                chunk = archived[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                self.cursor.execute(f"INSERT OR IGNORE INTO main.invoices ({self.INVOICE_TABLE_COLUMNS}) "
+                                    f"SELECT {self.INVOICE_TABLE_COLUMNS} FROM {schema}.invoices WHERE id IN ({placeholders})",
+                                    chunk)
+        self._delete_archived(archived)
+
+    def _archive_execute(self, query, params_seq):
+        # Änderung zusätzlich in allen Archiven ausführen; query enthält {schema}
+        for schema in self._archives.values():
+            self.cursor.executemany(query.format(schema=schema), params_seq)
+
+    def add_change_listener(self, listener):
+        # listener(action, invoice_ids, rows) mit action in "insert", "update", "delete";
+        # rows enthält die betroffenen Zeilen im Format von get_invoices (leer bei "delete").
+        # Bei Massenänderungen wird einmalig "reload" ohne IDs gemeldet.
+        # Der Listener wird immer im Thread aufgerufen, der ihn registriert hat.
+        self._change_listeners.append((listener, threading.get_ident()))
+
+    def remove_change_listener(self, listener):
+        self._change_listeners = [entry for entry in self._change_listeners if entry[0] != listener]
+
+    def dispatch_pending_changes(self):
+        # Führt Benachrichtigungen aus, die andere Threads für Listener dieses
+        # Threads hinterlegt haben (die GUI ruft das regelmäßig per after() auf)
+        current = threading.get_ident()
+        foreign = []
+        while True:
+            try:
+                thread_id, listener, action, invoice_ids, rows = self._foreign_changes.get_nowait()
+            except queue.Empty:
+                break
+            if thread_id == current:
+                listener(action, invoice_ids, rows)
+            else:
+                foreign.append((thread_id, listener, action, invoice_ids, rows))
+        for item in foreign:
+            self._foreign_changes.put(item)
+
+    @contextmanager
+    def batch(self):
+        # Fasst alle Änderungen im with-Block zu einer Transaktion mit einem Commit
+        # zusammen. Verschachtelte batch()-Blöcke committen erst ganz außen.
+        # Solange ein Thread im batch() ist, warten Schreibzugriffe anderer Threads.
+        with self._write_lock:
+            if self._batch_depth == 0:
+                external_changes = self._begin_write()
+            else:
+                external_changes = []
+            self._batch_depth += 1
+            self._batch_owner = threading.get_ident()
+            if self._change_listeners:
+                self._pending_changes.extend(external_changes)
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._batch_owner = None
+                    self._rollback_batch()
+                raise
+            self._batch_depth -= 1
+            if self._batch_depth > 0:
+                return
+            self._batch_owner = None
+            try:
+                if self.conn.total_changes != self._committed_changes:
+                    self._advance_change_log()
+                self._retry_busy(self.conn.commit)
+            except BaseException:
+                self._rollback_batch()
+                raise
+            if self.conn.total_changes != self._committed_changes:
+                self._committed_changes = self.conn.total_changes
+                self.data_version += 1
+            changes, self._pending_changes = self._pending_changes, []
+        # Benachrichtigt wird nach Freigabe der Sperre; die Zeilen kommen dann aus dem Lese-Pool
+        self._flush_pending_changes(changes)
+
+    def in_batch(self):
+        return self._batch_owner == threading.get_ident()
+
+    def _retry_busy(self, operation):
+        # Wiederholt operation, solange ein anderer Prozess die Datei gesperrt hält
+        delay = self.WRITE_RETRY_DELAY
+        for attempt in range(self.WRITE_RETRIES + 1):
+            try:
+                return operation()
+            except sqlite3.OperationalError as e:
+                message = str(e)
+                if attempt == self.WRITE_RETRIES or not ("locked" in message or "busy" in message):
+                    raise
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, self.WRITE_RETRY_MAX_DELAY)
+
+    def _begin_write(self):
+        # BEGIN IMMEDIATE holt die Schreibsperre sofort statt beim ersten Schreibzugriff:
+        # der ganze batch() sieht einen festen Stand, auch gegenüber anderen Prozessen,
+        # und eine Sperre fällt hier auf, wo der Zugriff noch gefahrlos wiederholbar ist.
+        # Liefert die bis dahin von anderen Prozessen committeten Änderungen.
+        if not self.conn.in_transaction:
+            self._retry_busy(lambda: self.conn.execute("BEGIN IMMEDIATE"))
+        self._batch_start_seq = self._change_seq
+        try:
+            return self._fetch_external_changes()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def _rollback_batch(self):
+        self.conn.rollback()
+        self._pending_changes = []
+        # Die beim Beginn abgeholten fremden Änderungen beim nächsten Abruf erneut melden
+        if self._change_seq is not None:
+            self._change_seq = self._batch_start_seq
+            self._sqlite_data_version = None
+
+    # --- Änderungen anderer Prozesse -----------------------------------------
+
+    def _start_change_feed(self):
+        # Erst data_version, dann seq lesen: ein Commit dazwischen wird beim nächsten Abruf erkannt
+        self.cursor.execute("PRAGMA data_version")
+        self._sqlite_data_version = self.cursor.fetchone()[0]
+        self.cursor.execute("SELECT IFNULL(MAX(seq), 0) FROM change_log")
+        self._change_seq = self.cursor.fetchone()[0]
+
+    def _fetch_external_changes(self):
+        # [(aktion, ids), ...] aller seit dem letzten Abruf von anderen Verbindungen
+        # committeten Änderungen. Ohne fremden Commit kostet das nur ein PRAGMA.
+        # Läuft unter _write_lock, innerhalb oder außerhalb einer Transaktion.
+        if self._change_seq is None:
+            return []
+        self.cursor.execute("PRAGMA data_version")
+        version = self.cursor.fetchone()[0]
+        if version == self._sqlite_data_version:
+            return []
+        self._sqlite_data_version = version
+        # Auch Kategorien oder Zustand können sich geändert haben -> Caches verwerfen
+        self.data_version += 1
+        self.cursor.execute("SELECT value FROM app_state WHERE key = 'archive_max_id'")
+        row = self.cursor.fetchone()
+        if row and int(row[0]) > self._archive_max_id:
+            # Eine andere Instanz hat archiviert; neue Archivdateien hängt poll_external_changes() an
+            self._archive_max_id = int(row[0])
+            self._archives_changed = True
+        self.cursor.execute(self.CHANGE_LOG_QUERY, (self._change_seq, self.BATCH_NOTIFY_LIMIT + 1))
+        rows = self.cursor.fetchall()
+        if not rows:
+            return []
+        if len(rows) > self.BATCH_NOTIFY_LIMIT or rows[0][0] != self._change_seq + 1:
+            # Zu viele Änderungen, oder die ältesten sind schon aus dem Protokoll entfernt
+            self.cursor.execute("SELECT MAX(seq) FROM change_log")
+            self._change_seq = self.cursor.fetchone()[0]
+            return [("reload", [])]
+        self._change_seq = rows[-1][0]
+        changes = []
+        for _, invoice_id, action in rows:
+            if changes and changes[-1][0] == action:
+                if invoice_id not in changes[-1][1]:
+                    changes[-1][1].append(invoice_id)
+            else:
+                changes.append((action, [invoice_id]))
+        return changes
+
+    def _advance_change_log(self):
+        # Vor dem Commit: alle Einträge seit dem Beginn stammen von diesem batch()
+        # (BEGIN IMMEDIATE sperrt andere Schreiber aus) und werden nicht erneut gemeldet.
+        # Dabei die ältesten Einträge entfernen.
+        if self._change_seq is None:
+            return
+        self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        row = self.cursor.fetchone()
+        if row is None or row[0] <= self._change_seq:
+            return
+        self._change_seq = row[0]
+        self.cursor.execute("DELETE FROM change_log WHERE seq <= ?", (row[0] - self.CHANGE_LOG_KEEP,))
+
+    def poll_external_changes(self):
+        # Übernimmt Änderungen anderer Prozesse an derselben Datenbank: erhöht
+        # data_version und meldet den Listenern nur die betroffenen Rechnungen.
+        # Für regelmäßigen Aufruf gedacht (GUI per after(), Daemon); gibt True
+        # zurück, wenn sich etwas geändert hat.
+        if self._closed or self.in_batch():
+            return False
+        # Nicht auf den batch() eines anderen Threads warten; der holt die Änderungen selbst ab
+        if not self._write_lock.acquire(blocking=False):
+            return False
+        try:
+            version = self.data_version
+            changes = self._fetch_external_changes()
+            if self._archives_changed:
+                self._archives_changed = False
+                self._discover_archives()
+                self._attach_archives(self.conn)
+        finally:
+            self._write_lock.release()
+        if self._change_listeners:
+            self._flush_pending_changes(changes)
+        return self.data_version != version
+
+    @contextmanager
+    def _read(self):
+        # Innerhalb des eigenen batch() wird über die Schreibverbindung gelesen,
+        # damit noch nicht committete Änderungen sichtbar sind
+        if self.in_batch() or self._read_pool_size == 0:
+            with self._write_lock:
+                cursor = self.conn.cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+            return
+        conn = self._acquire_reader()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self._read_pool.put(conn)
+
+    def _acquire_reader(self):
+        try:
+            conn = self._read_pool.get_nowait()
+            # Seit der letzten Verwendung können neue Archive entstanden sein
+            self._attach_archives(conn)
+            return conn
+        except queue.Empty:
+            pass
+        with self._read_pool_lock:
+            if len(self._read_connections) < self._read_pool_size:
+                uri = Path(os.path.abspath(self.db_path)).as_uri() + "?mode=ro"
+                conn = sqlite3.connect(uri, uri=True, timeout=self.BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+                conn.set_trace_callback(self._trace_callback)
+                self._read_connections.append(conn)
+                self._attach_archives(conn)
+                return conn
+        # Pool ausgeschöpft -> auf die nächste freie Verbindung warten
+        conn = self._read_pool.get()
+        self._attach_archives(conn)
+        return conn
+
+    def set_trace_callback(self, callback):
+        # callback(sql) wird für jede ausgeführte Anweisung aufgerufen, mit
+        # eingesetzten Parametern und im Thread, der die Anweisung ausführt
+        with self._write_lock:
+            with self._read_pool_lock:
+                self._trace_callback = callback
+                self.conn.set_trace_callback(callback)
+                for conn in self._read_connections:
+                    conn.set_trace_callback(callback)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._write_lock:
+            with self._read_pool_lock:
+                for conn in self._read_connections:
+                    conn.close()
+                self._read_connections = []
+            self._attached_archives = {}
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _flush_pending_changes(self, changes):
+        if not changes:
+            return
+        changed_count = sum(len(invoice_ids) for _, invoice_ids in changes)
+        if changed_count > self.BATCH_NOTIFY_LIMIT or any(action == "reload" for action, _ in changes):
+            self._notify_invoice_change("reload", [])
+            return
+        for action, invoice_ids in changes:
+            self._notify_invoice_change(action, invoice_ids)
+
+    def _notify_invoice_change(self, action, invoice_ids):
+        if not self._change_listeners:
+            return
+        if self.in_batch():
+            # Benachrichtigung erst nach dem Commit des äußersten batch()
+            self._pending_changes.append((action, list(invoice_ids)))
+            return
+        rows = self.get_invoices_by_ids(invoice_ids) if action in ("insert", "update") else []
+        current = threading.get_ident()
+        for listener, thread_id in list(self._change_listeners):
+            if thread_id == current:
+                listener(action, invoice_ids, rows)
+            else:
+                self._foreign_changes.put((thread_id, listener, action, invoice_ids, rows))
+
     def add_category(self, name):
         try:
-            self.cursor.execute("INSERT INTO categories (name) VALUES (?)", (name,))
-            self.conn.commit()
+            with self.batch():
+                self.cursor.execute("INSERT INTO categories (name) VALUES (?)", (name,))
             return True
         except sqlite3.IntegrityError:
             return False
 
     def get_categories(self):
-        self.cursor.execute("SELECT id, name FROM categories ORDER BY name")
-        return self.cursor.fetchall()
+        with self._read() as cursor:
+            cursor.execute("SELECT id, name FROM categories ORDER BY name")
+            return cursor.fetchall()
     
     def delete_category(self, category_id):
         try:
-            self.cursor.execute("UPDATE invoices SET category_id = NULL WHERE category_id = ?", (category_id,))
-            self.cursor.execute("DELETE FROM categories WHERE id = ?", (category_id,))
-            self.conn.commit()
+            with self.batch():
+                self.cursor.execute("UPDATE invoices SET category_id = NULL WHERE category_id = ?", (category_id,))
+                self._archive_execute("UPDATE {schema}.invoices SET category_id = NULL WHERE category_id = ?", [(category_id,)])
+                self.cursor.execute("DELETE FROM categories WHERE id = ?", (category_id,))
             return True
         except sqlite3.Error as e:
             print(f"Fehler beim Löschen der Kategorie: {e}")
             return False
 
-    # HINWEIS: Die Funktion erwartet jetzt 8 Argumente (plus 'self')
-    def add_invoice(self, name, amount, image_path, pdf_path, status, due_date, reminder_date, category_id):
-        self.cursor.execute('''
-            INSERT INTO invoices (name, amount, image_path, pdf_path, status, due_date, reminder_date, creation_date, category_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (name, amount, image_path, pdf_path, status, due_date, reminder_date, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), category_id))
-        self.conn.commit()
+    # HINWEIS: Die Funktion erwartet 8 Argumente (plus 'self'), pdf_status und content_hash sind optional.
+    # Gibt die ID der neuen Rechnung zurück
+    def add_invoice(self, name, amount, image_path, pdf_path, status, due_date, reminder_date, category_id, pdf_status=None, content_hash=None):
+        if pdf_status is None and pdf_path:
+            pdf_status = "done"
+        with self.batch():
+            self.cursor.execute(self.INSERT_INVOICE_QUERY, (self._archive_max_id, name, amount, image_path, pdf_path, status, due_date, reminder_date,
+                                                            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), category_id, pdf_status, content_hash))
+            invoice_id = self.cursor.lastrowid
+            self._notify_invoice_change("insert", [invoice_id])
+        return invoice_id
+
+    def add_invoices_bulk(self, invoices):
+        # invoices: Tupel (name, amount, image_path, pdf_path, status, due_date, reminder_date,
+        # category_id, pdf_status, content_hash). Alle Zeilen in einer Transaktion.
+        invoices = list(invoices)
+        if not invoices:
+            return 0
+        creation_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.batch():
+            # Erst im batch(): dessen Beginn übernimmt archive_max_id anderer Instanzen
+            rows = [(self._archive_max_id,) + tuple(invoice[:7]) + (creation_date,) + tuple(invoice[7:]) for invoice in invoices]
+            self.cursor.executemany(self.INSERT_INVOICE_QUERY, rows)
+            self._notify_invoice_change("reload", [])
+        return len(rows)
+
+    def get_existing_content_hashes(self, content_hashes):
+        content_hashes = list(content_hashes)
+        existing = set()
+        # Auch archivierte Scans gelten als bekannt
+        source = self._invoice_source(True)
+        with self._read() as cursor:
+            for start in range(0, len(content_hashes), 500):
+                chunk = content_hashes[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor.execute(f"SELECT content_hash FROM {source} WHERE content_hash IN ({placeholders})", chunk)
+                existing.update(row[0] for row in cursor.fetchall())
+        return existing
+
+    def set_invoice_pdf_status(self, invoice_id, pdf_path, pdf_status):
+        # False, wenn die Rechnung inzwischen gelöscht wurde
+        with self.batch():
+            self.cursor.execute("UPDATE invoices SET pdf_path = ?, pdf_status = ? WHERE id = ?", (pdf_path, pdf_status, invoice_id))
+            if self.cursor.rowcount == 0:
+                return False
+            self._notify_invoice_change("update", [invoice_id])
         return True
 
-    def get_invoices(self, status_filter="Alle", category_filter="Alle", tax_filter=False):
-        query = "SELECT i.id, i.name, i.amount, i.image_path, i.pdf_path, i.creation_date, i.status, i.due_date, i.reminder_date, i.tax_declaration_year, c.name FROM invoices i LEFT JOIN categories c ON i.category_id = c.id WHERE 1=1"
+    def get_pending_pdf_conversions(self):
+        with self._read() as cursor:
+            cursor.execute("SELECT id, image_path, pdf_path FROM invoices WHERE pdf_status = 'pending' ORDER BY id")
+            return cursor.fetchall()
+
+    INVOICE_COLUMNS = "i.id, i.name, i.amount, i.image_path, i.pdf_path, i.creation_date, i.status, i.due_date, i.reminder_date, i.tax_declaration_year, c.name"
+    # {} = Tabellenausdruck, siehe _invoice_source
+    INVOICE_SELECT_FROM = f"SELECT {INVOICE_COLUMNS} FROM {{}} i LEFT JOIN categories c ON i.category_id = c.id"
+    INVOICE_SELECT = INVOICE_SELECT_FROM.format("invoices")
+    SEARCH_ARCHIVE_COLUMNS = ", ".join(f"s.{column.strip()}" for column in INVOICE_TABLE_COLUMNS.split(","))
+    SEARCH_SELECT = f"SELECT {INVOICE_COLUMNS} FROM invoices_fts f JOIN invoices i ON i.id = f.rowid LEFT JOIN categories c ON i.category_id = c.id"
+
+    def _build_invoice_query(self, status_filter="Alle", category_filter="Alle", tax_filter=False,
+                             extra_condition=None, extra_params=(), order_by="i.due_date DESC", limit=None,
+                             select=None, offset=None, include_archive=None):
+        # Der Steuerfilter braucht die ganze Historie, alle anderen Ansichten nur die aktuelle Tabelle
+        if include_archive is None:
+            include_archive = bool(tax_filter)
+        if select is None:
+            select = self.INVOICE_SELECT_FROM.format(self._invoice_source(include_archive))
+        query = select + " WHERE 1=1"
         params = []
         if status_filter != "Alle":
             query += " AND i.status = ?"
             params.append(status_filter)
-        if category_filter != "Alle":
+        # "Keine" = Rechnungen ohne Kategorie (so zeigt sie auch die Liste an)
+        if category_filter == "Keine":
+            query += " AND i.category_id IS NULL"
+        elif category_filter != "Alle":
             query += " AND c.name = ?"
             params.append(category_filter)
         if tax_filter:
             query += " AND i.tax_declaration_year IS NOT NULL"
+        if extra_condition:
+            query += " AND " + extra_condition
+            params.extend(extra_params)
         
-        query += " ORDER BY i.due_date DESC"
-        
-        self.cursor.execute(query, params)
-        return self.cursor.fetchall()
+        query += " ORDER BY " + order_by
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+            if offset:
+                query += " OFFSET ?"
+                params.append(offset)
+        return query, params
+
+    def get_invoices(self, status_filter="Alle", category_filter="Alle", tax_filter=False):
+        query, params = self._build_invoice_query(status_filter, category_filter, tax_filter)
+        with self._read() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def iter_invoices(self, status_filter="Alle", category_filter="Alle", tax_filter=False, tax_year=None,
+                      chunk_size=1000, period_year=None):
+        # Liefert die Zeilen in Blöcken per fetchmany über einen eigenen Cursor,
+        # damit auch sehr große Exporte nicht komplett im Speicher liegen.
+        # period_year: nur Rechnungen mit Fälligkeit (sonst Erstellung) in diesem Jahr
+        conditions, extra_params = [], []
+        if tax_year is not None:
+            conditions.append("i.tax_declaration_year = ?")
+            extra_params.append(tax_year)
+        if period_year is not None:
+            conditions.append("COALESCE(i.due_date, i.creation_date) >= ? AND COALESCE(i.due_date, i.creation_date) < ?")
+            extra_params.extend((f"{period_year:04d}-01-01", f"{period_year + 1:04d}-01-01"))
+        query, params = self._build_invoice_query(status_filter, category_filter, tax_filter,
+                                                  extra_condition=" AND ".join(conditions) or None,
+                                                  extra_params=extra_params, order_by="i.due_date, i.id",
+                                                  include_archive=bool(tax_filter) or tax_year is not None
+                                                  or period_year is not None)
+        # Die Lese-Verbindung bleibt belegt, bis der Iterator erschöpft oder geschlossen ist
+        with self._read() as cursor:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+
+    def get_invoices_by_ids(self, invoice_ids):
+        invoice_ids = list(invoice_ids)
+        rows = []
+        # Zugriff per ID findet auch archivierte Rechnungen
+        select = self.INVOICE_SELECT_FROM.format(self._invoice_source(True))
+        with self._read() as cursor:
+            for start in range(0, len(invoice_ids), 500):
+                chunk = invoice_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor.execute(f"{select} WHERE i.id IN ({placeholders})", chunk)
+                rows.extend(cursor.fetchall())
+        return rows
+
+    # Keyset-Pagination in der Listenreihenfolge (due_date DESC, id DESC).
+    # Rechnungen ohne Fälligkeitsdatum (NULL) stehen am Ende; sie werden in
+    # einer eigenen Teilabfrage gelesen, damit beide Teile per Index laufen.
+    PAGE_ORDER_DESC = "i.due_date DESC, i.id DESC"
+    PAGE_ORDER_ASC = "i.due_date ASC, i.id ASC"
+
+    def _fetch_page_part(self, filters, condition, params, order_by, limit):
+        query, query_params = self._build_invoice_query(*filters, extra_condition=condition, extra_params=params,
+                                                        order_by=order_by, limit=limit)
+        with self._read() as cursor:
+            cursor.execute(query, query_params)
+            return cursor.fetchall()
+
+    def get_invoices_page(self, status_filter="Alle", category_filter="Alle", tax_filter=False,
+                          after=None, before=None, limit=50):
+        # after/before: (due_date, id) der letzten bzw. ersten Zeile der aktuellen Seite
+        filters = (status_filter, category_filter, tax_filter)
+        if before is not None:
+            due_date, invoice_id = before
+            rows = []
+            if due_date is None:
+                rows = self._fetch_page_part(filters, "i.due_date IS NULL AND i.id > ?", [invoice_id],
+                                             "i.id ASC", limit)
+                condition, params = "i.due_date IS NOT NULL", []
+            else:
+                condition, params = "(i.due_date, i.id) > (?, ?)", [due_date, invoice_id]
+            if len(rows) < limit:
+                rows += self._fetch_page_part(filters, condition, params, self.PAGE_ORDER_ASC, limit - len(rows))
+            rows.reverse()
+            return rows
+
+        if after is not None and after[0] is None:
+            return self._fetch_page_part(filters, "i.due_date IS NULL AND i.id < ?", [after[1]], "i.id DESC", limit)
+
+        if after is None:
+            condition, params = "i.due_date IS NOT NULL", []
+        else:
+            condition, params = "(i.due_date, i.id) < (?, ?)", list(after)
+        rows = self._fetch_page_part(filters, condition, params, self.PAGE_ORDER_DESC, limit)
+        if len(rows) < limit:
+            rows += self._fetch_page_part(filters, "i.due_date IS NULL", [], "i.id DESC", limit - len(rows))
+        return rows
+    
+    @staticmethod
+    def _fts_prefix_query(search_text):
+        # Jedes Wort als Präfixsuche, alle Wörter müssen vorkommen: "strom"* AND "abr"*.
+        # Wörter ohne Buchstaben/Ziffern (z.B. "-") ergeben keinen Token und würden
+        # mit AND die ganze Suche leer machen -> weglassen
+        terms = [term.replace('"', '') for term in search_text.split()]
+        return " AND ".join(f'"{term}"*' for term in terms if any(char.isalnum() for char in term))
+
+    def search_invoices(self, search_text, status_filter="Alle", category_filter="Alle", tax_filter=False,
+                        limit=50, offset=0):
+        # Volltextsuche über den Namen, nach Relevanz (bm25) sortiert und seitenweise.
+        # Wie get_invoices durchsucht der Steuerfilter auch die Archive (jedes hat
+        # einen eigenen FTS-Index; bm25 wird je Datei berechnet).
+        match = self._fts_prefix_query(search_text)
+        if not match:
+            return []
+        archives = self._archives
+        if tax_filter and archives:
+            schemas = ("main",) + tuple(archives.values())
+            parts = [f"SELECT {self.SEARCH_ARCHIVE_COLUMNS}, f.rank AS rank FROM {schema}.invoices_fts f "
+                     f"JOIN {schema}.invoices s ON s.id = f.rowid WHERE f.invoices_fts MATCH ?" for schema in schemas]
+            select = self.INVOICE_SELECT_FROM.format("(" + " UNION ALL ".join(parts) + ")")
+            query, params = self._build_invoice_query(status_filter, category_filter, tax_filter,
+                                                      order_by="i.rank, i.id DESC", limit=limit,
+                                                      select=select, offset=offset)
+            params = [match] * len(schemas) + params
+        else:
+            query, params = self._build_invoice_query(status_filter, category_filter, tax_filter,
+                                                      extra_condition="invoices_fts MATCH ?", extra_params=[match],
+                                                      order_by="f.rank, i.id DESC", limit=limit,
+                                                      select=self.SEARCH_SELECT, offset=offset,
+                                                      include_archive=False)
+        with self._read() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
     
     def update_invoice_status(self, invoice_id, new_status):
-        self.cursor.execute("UPDATE invoices SET status = ? WHERE id = ?", (new_status, invoice_id))
-        self.conn.commit()
-        return True
+        # False, wenn es die Rechnung nicht (mehr) gibt
+        return self.update_invoice_status_many([invoice_id], new_status) == 1
+    
+    def update_invoice_status_many(self, invoice_ids, new_status):
+        # Gibt die Anzahl geänderter Rechnungen zurück. Archivierte Rechnungen sind
+        # bezahlt; bekommen sie einen anderen Status, kommen sie zurück in die Haupttabelle.
+        invoice_ids = list(invoice_ids)
+        with self.batch():
+            if new_status == "Bezahlt":
+                archived = self._archived_ids(invoice_ids)
+            else:
+                archived = set()
+                self._unarchive(invoice_ids)
+            self.cursor.executemany("UPDATE invoices SET status = ? WHERE id = ?",
+                                    [(new_status, invoice_id) for invoice_id in invoice_ids if invoice_id not in archived])
+            updated = self.cursor.rowcount + len(archived)
+            if updated:
+                self._notify_invoice_change("update", invoice_ids)
+        return updated
     
     def get_due_and_reminder_invoices(self, today):
-        due_query = "SELECT name, due_date FROM invoices WHERE due_date = ? AND status = 'Offen'"
-        self.cursor.execute(due_query, (today,))
-        due_invoices = self.cursor.fetchall()
-        
-        reminder_query = "SELECT name, reminder_date FROM invoices WHERE reminder_date = ? AND status != 'Bezahlt'"
-        self.cursor.execute(reminder_query, (today,))
-        reminder_invoices = self.cursor.fetchall()
+        today = self.day_number(today)
+        with self._read() as cursor:
+            cursor.execute(self.DUE_QUERY, (today,))
+            due_invoices = cursor.fetchall()
+
+            cursor.execute(self.REMINDER_QUERY, (today,))
+            reminder_invoices = cursor.fetchall()
         
         return due_invoices, reminder_invoices
+
+    def get_reminder_events(self, after, until="9999-12-31"):
+        # Alle Fälligkeiten und Erinnerungen mit Datum in (after, until] als
+        # (datum, art, id, name) mit art in "due", "reminder"; after="" = ohne Untergrenze
+        after = self.day_number(after) if after else -1_000_000
+        until = self.day_number(until)
+        with self._read() as cursor:
+            cursor.execute(self.DUE_RANGE_QUERY, (after, until))
+            events = [(due_date, "due", invoice_id, name) for invoice_id, name, due_date in cursor.fetchall()]
+            cursor.execute(self.REMINDER_RANGE_QUERY, (after, until))
+            events.extend((reminder_date, "reminder", invoice_id, name) for invoice_id, name, reminder_date in cursor.fetchall())
+        return events
+
+    def get_invoices_due_between(self, start, end, include_paid=False):
+        # Rechnungen mit Fälligkeit im Zeitraum [start, end] (ISO-Datum), nach
+        # Fälligkeit sortiert; ohne include_paid nur offene. Bezahlte schließen die Archive ein.
+        codes = self.ALL_STATUS_CODES if include_paid else self.UNPAID_STATUS_CODES
+        query, params = self._build_invoice_query(extra_condition=f"i.status_code IN {codes} AND i.due_day BETWEEN ? AND ?",
+                                                  extra_params=[self.day_number(start), self.day_number(end)],
+                                                  order_by="i.due_day, i.id", include_archive=include_paid)
+        with self._read() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def get_overdue(self, today, min_days=1):
+        # Offene Rechnungen, die seit mindestens min_days Tagen fällig sind, die ältesten zuerst
+        query, params = self._build_invoice_query(extra_condition=f"i.status_code IN {self.UNPAID_STATUS_CODES} AND i.due_day <= ?",
+                                                  extra_params=[self.day_number(today) - min_days],
+                                                  order_by="i.due_day, i.id")
+        with self._read() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
     
     def delete_invoice(self, invoice_id):
-        self.cursor.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
-        self.conn.commit()
+        with self.batch():
+            self.cursor.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
+            self._delete_archived([invoice_id])
+            self._notify_invoice_change("delete", [invoice_id])
         return True
     
+    def delete_invoices(self, invoice_ids):
+        invoice_ids = list(invoice_ids)
+        with self.batch():
+            self.cursor.executemany("DELETE FROM invoices WHERE id = ?", [(invoice_id,) for invoice_id in invoice_ids])
+            self._delete_archived(invoice_ids)
+            self._notify_invoice_change("delete", invoice_ids)
+        return True
+
+    def _delete_archived(self, invoice_ids):
+        # Archive haben keine Dokument-Trigger -> Referenzen hier herunterzählen
+        for schema in self._archives.values():
+            for start in range(0, len(invoice_ids), 500):
+                chunk = invoice_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                self.cursor.execute(f"SELECT image_path, pdf_path FROM {schema}.invoices WHERE id IN ({placeholders})", chunk)
+                paths = self.cursor.fetchall()
+                if paths:
+                    self.cursor.executemany("UPDATE documents SET refcount = refcount - 1 WHERE path IN (?, ?)", paths)
+                    self.cursor.execute(f"DELETE FROM {schema}.invoices WHERE id IN ({placeholders})", chunk)
+    
     def get_invoice_paths(self, invoice_id):
-        self.cursor.execute("SELECT image_path, pdf_path FROM invoices WHERE id = ?", (invoice_id,))
-        return self.cursor.fetchone()
+        with self._read() as cursor:
+            cursor.execute(f"SELECT image_path, pdf_path FROM {self._invoice_source(True)} WHERE id = ?", (invoice_id,))
+            return cursor.fetchone()
+    
+    def register_document(self, sha256, path):
+        # Muss vor dem Eintragen der Rechnung aufgerufen werden, damit die Trigger zählen
+        with self.batch():
+            self.cursor.execute("INSERT OR IGNORE INTO documents (sha256, path) VALUES (?, ?)", (sha256, path))
+
+    def release_unreferenced_documents(self, paths):
+        # Entfernt Dokumente ohne Referenz aus der Tabelle und gibt ihre Pfade zurück;
+        # die Dateien selbst löscht der Aufrufer
+        paths = [path for path in set(paths) if path]
+        released = []
+        with self.batch():
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                self.cursor.execute(f"SELECT path FROM documents WHERE path IN ({placeholders}) AND refcount <= 0", chunk)
+                chunk_released = [row[0] for row in self.cursor.fetchall()]
+                self.cursor.executemany("DELETE FROM documents WHERE path = ?", [(path,) for path in chunk_released])
+                released.extend(chunk_released)
+        return released
+
+    def get_invoice_paths_many(self, invoice_ids):
+        invoice_ids = list(invoice_ids)
+        paths = []
+        with self._read() as cursor:
+            for start in range(0, len(invoice_ids), 500):
+                chunk = invoice_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor.execute(f"SELECT image_path, pdf_path FROM {self._invoice_source(True)} WHERE id IN ({placeholders})",
+                               chunk)
+                paths.extend(cursor.fetchall())
+        return paths
     
     def set_invoice_for_tax_declaration(self, invoice_id, year):
-        self.cursor.execute("UPDATE invoices SET tax_declaration_year = ? WHERE id = ?", (year, invoice_id))
-        self.conn.commit()
+        with self.batch():
+            self.cursor.execute("UPDATE invoices SET tax_declaration_year = ? WHERE id = ?", (year, invoice_id))
+            # Die Steuer-Vormerkung ist die einzige Änderung, die auch archivierte Rechnungen betrifft
+            self._archive_execute("UPDATE {schema}.invoices SET tax_declaration_year = ? WHERE id = ?", [(year, invoice_id)])
+            self._notify_invoice_change("update", [invoice_id])
+        return True
+        
+    def set_invoices_for_tax_declaration(self, invoice_ids, year):
+        invoice_ids = list(invoice_ids)
+        with self.batch():
+            self.cursor.executemany("UPDATE invoices SET tax_declaration_year = ? WHERE id = ?",
+                                    [(year, invoice_id) for invoice_id in invoice_ids])
+            self._archive_execute("UPDATE {schema}.invoices SET tax_declaration_year = ? WHERE id = ?",
+                                  [(year, invoice_id) for invoice_id in invoice_ids])
+            self._notify_invoice_change("update", invoice_ids)
         return True
         
     def get_total_amount_by_category(self):
-        self.cursor.execute('''
-            SELECT c.name, SUM(i.amount)
-            FROM invoices i
-            JOIN categories c ON i.category_id = c.id
-            WHERE i.amount IS NOT NULL
-            GROUP BY c.name
-            ORDER BY SUM(i.amount) DESC
-        ''')
-        return self.cursor.fetchall()
+        with self._read() as cursor:
+            cursor.execute(self._history_query(self.TOTAL_BY_CATEGORY_QUERY))
+            return cursor.fetchall()
+
+    # --- Dashboard-Abfragen: je Diagramm eine gruppierte Abfrage, spaltenweise zurückgegeben ---
+
+    MONTHLY_SPENDING_QUERY = '''
+            SELECT t.year * 100 + t.month AS period, IFNULL(c.name, 'Keine') AS category, SUM(t.total_cents) / 100.0 AS total
+            FROM {spending_totals} t
+            LEFT JOIN categories c ON t.category_id = c.id
+            WHERE t.year > 0
+            GROUP BY t.year, t.month, t.category_id
+            ORDER BY t.year, t.month
+        '''
+
+    STATUS_TREND_QUERY = '''
+            SELECT t.year * 100 + t.month AS period,
+                   SUM(CASE WHEN t.status = 'Bezahlt' THEN t.total_cents ELSE 0 END) / 100.0 AS paid,
+                   SUM(CASE WHEN t.status != 'Bezahlt' THEN t.total_cents ELSE 0 END) / 100.0 AS open,
+                   SUM(SUM(CASE WHEN t.status = 'Bezahlt' THEN t.total_cents ELSE 0 END)) OVER (ORDER BY t.year, t.month) / 100.0 AS paid_cumulative,
+                   SUM(SUM(CASE WHEN t.status != 'Bezahlt' THEN t.total_cents ELSE 0 END)) OVER (ORDER BY t.year, t.month) / 100.0 AS open_cumulative
+            FROM {spending_totals} t
+            WHERE t.year > 0
+            GROUP BY t.year, t.month
+            ORDER BY t.year, t.month
+        '''
+
+    OVERDUE_AGING_QUERY = f'''
+            SELECT CASE
+                       WHEN ? - due_day <= 30 THEN 0
+                       WHEN ? - due_day <= 60 THEN 1
+                       WHEN ? - due_day <= 90 THEN 2
+                       ELSE 3
+                   END AS bucket,
+                   COUNT(*) AS invoice_count,
+                   IFNULL(SUM(amount_cents), 0) / 100.0 AS total
+            FROM invoices
+            WHERE status_code IN {UNPAID_STATUS_CODES} AND due_day < ?
+            GROUP BY bucket
+            ORDER BY bucket
+        '''
+    OVERDUE_AGING_BUCKETS = ("1-30 Tage", "31-60 Tage", "61-90 Tage", "> 90 Tage")
+
+    TAX_YEAR_TOTALS_QUERY = '''
+            SELECT tax_declaration_year AS year, COUNT(*) AS invoice_count, IFNULL(SUM(amount_cents), 0) / 100.0 AS total
+            FROM {invoices}
+            WHERE tax_declaration_year IS NOT NULL
+            GROUP BY tax_declaration_year
+            ORDER BY tax_declaration_year
+        '''
+
+    def fetch_columns(self, query, params=()):
+        # Liefert das Ergebnis spaltenweise als {spaltenname: [werte]}
+        with self._read() as cursor:
+            cursor.execute(query, params)
+            names = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        return {name: list(values) for name, values in zip(names, columns)}
+
+    def get_monthly_spending_by_category(self):
+        return self.fetch_columns(self._history_query(self.MONTHLY_SPENDING_QUERY))
+
+    def get_status_trend(self):
+        return self.fetch_columns(self._history_query(self.STATUS_TREND_QUERY))
+
+    def get_overdue_aging(self, today):
+        today = self.day_number(today)
+        return self.fetch_columns(self.OVERDUE_AGING_QUERY, (today, today, today, today))
+
+    def get_tax_year_totals(self):
+        return self.fetch_columns(self._history_query(self.TAX_YEAR_TOTALS_QUERY))
+
+    def _app_queries(self):
+        # Alle Abfragen, die die App absetzt, mit Beispielparametern.
+        # Drittes Element: ob eine Sortierung per temporärem B-Tree erlaubt ist
+        # (nur bei Aggregaten, deren Ergebnis pro Kategorie klein ist).
+        queries = []
+        for status_filter in ("Alle", "Offen"):
+            for category_filter in ("Alle", "Kategorie"):
+                for tax_filter in (False, True):
+                    query, params = self._build_invoice_query(status_filter, category_filter, tax_filter)
+                    label = f"get_invoices({status_filter}, {category_filter}, {tax_filter})"
+                    queries.append((label, query, params, False))
+                    filters = (status_filter, category_filter, tax_filter)
+                    for suffix, condition, params, order_by in (
+                        ("erste Seite", "i.due_date IS NOT NULL", [], self.PAGE_ORDER_DESC),
+                        ("nach", "(i.due_date, i.id) < (?, ?)", ["2000-01-01", 1], self.PAGE_ORDER_DESC),
+                        ("vor", "(i.due_date, i.id) > (?, ?)", ["2000-01-01", 1], self.PAGE_ORDER_ASC),
+                        ("ohne Datum", "i.due_date IS NULL AND i.id < ?", [1], "i.id DESC"),
+                    ):
+                        query, query_params = self._build_invoice_query(*filters, extra_condition=condition, extra_params=params,
+                                                                         order_by=order_by, limit=50)
+                        queries.append((f"get_invoices_page({status_filter}, {category_filter}, {tax_filter}, {suffix})",
+                                        query, query_params, False))
+        queries.append(("get_due_invoices", self.DUE_QUERY, [10957], False))
+        queries.append(("get_reminder_invoices", self.REMINDER_QUERY, [10957], False))
+        queries.append(("get_reminder_events (fällig)", self.DUE_RANGE_QUERY, [10957, 11322], False))
+        queries.append(("get_reminder_events (Erinnerung)", self.REMINDER_RANGE_QUERY, [10957, 11322], False))
+        queries.append(("poll_external_changes", self.CHANGE_LOG_QUERY, [0, self.BATCH_NOTIFY_LIMIT + 1], False))
+        # Mehrere Statuscodes per IN -> je Code ein Indexbereich, danach Sortierung der (offenen) Treffer
+        for label, condition in (("get_invoices_due_between", f"i.status_code IN {self.UNPAID_STATUS_CODES} AND i.due_day BETWEEN ? AND ?"),
+                                 ("get_overdue", f"i.status_code IN {self.UNPAID_STATUS_CODES} AND i.due_day <= ?")):
+            query, params = self._build_invoice_query(extra_condition=condition, extra_params=[10957, 11322][:condition.count("?")],
+                                                      order_by="i.due_day, i.id")
+            queries.append((label, query, params, True))
+        queries.append(("get_state", "SELECT value FROM app_state WHERE key = ?", ["x"], False))
+        queries.append(("get_categories", "SELECT id, name FROM categories ORDER BY name", [], False))
+        query, params = self._build_invoice_query("Offen", "Kategorie", True, extra_condition="invoices_fts MATCH ?",
+                                                  extra_params=['"strom"*'], order_by="f.rank, i.id DESC", limit=50,
+                                                  select=self.SEARCH_SELECT, offset=50)
+        # Sortierung nach Relevanz erfordert immer einen Sortierschritt über die Treffer
+        queries.append(("search_invoices", query, params, True))
+        queries.append(("get_invoices_by_ids", f"{self.INVOICE_SELECT_FROM.format(self._invoice_source(True))} WHERE i.id IN (?, ?)",
+                        [1, 2], False))
+        queries.append(("get_invoice_paths", f"SELECT image_path, pdf_path FROM {self._invoice_source(True)} WHERE id = ?", [1], False))
+        queries.append(("get_existing_content_hashes",
+                        f"SELECT content_hash FROM {self._invoice_source(True)} WHERE content_hash IN (?, ?)", ["a", "b"], False))
+        queries.append(("get_pending_pdf_conversions", "SELECT id, image_path, pdf_path FROM invoices WHERE pdf_status = 'pending' ORDER BY id", [], False))
+        queries.append(("get_total_amount_by_category", self._history_query(self.TOTAL_BY_CATEGORY_QUERY), [], True))
+        queries.append(("get_monthly_spending_by_category", self._history_query(self.MONTHLY_SPENDING_QUERY), [], True))
+        queries.append(("get_status_trend", self._history_query(self.STATUS_TREND_QUERY), [], True))
+        queries.append(("get_overdue_aging", self.OVERDUE_AGING_QUERY, [10957] * 4, True))
+        queries.append(("get_tax_year_totals", self._history_query(self.TAX_YEAR_TOTALS_QUERY), [], True))
+        return queries
+
+    def explain_query_plan(self, query, params=()):
+        with self._read() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+            return [row[3] for row in cursor.fetchall()]
+
+    def check_query_plans(self):
+        # Liefert alle Abfragen, deren Plan einen Full Table Scan oder eine
+        # nachträgliche Sortierung enthält: [(label, [plan-zeilen]), ...]
+        # Mit Archiven: das Durchlaufen des UNION-ALL-Ergebnisses (SCAN t) und der
+        # vorab summierten Tabellen (wenige Zeilen je Monat und Kategorie) ist erlaubt
+        violations = []
+        for label, query, params, allow_sort in self._app_queries():
+            plan = self.explain_query_plan(query, params)
+            subqueries = {line.split(" ", 1)[1] for line in plan if line.startswith(("MATERIALIZE ", "CO-ROUTINE "))}
+            bad = [line for line in plan
+                   if (line.startswith("SCAN ") and " USING " not in line and not line.startswith("SCAN (subquery")
+                       and " VIRTUAL TABLE INDEX " not in line and line[5:] not in subqueries
+                       and not line.endswith(".invoice_spending_totals"))
+                   or (not allow_sort and line.startswith("USE TEMP B-TREE"))]
+            if bad:
+                violations.append((label, plan))
+        return violations
+
+    def assert_query_plans_use_indexes(self):
+        violations = self.check_query_plans()
+        if violations:
+            details = "\n".join(f"{label}: {' | '.join(plan)}" for label, plan in violations)
+            raise AssertionError(f"Abfragen ohne Index:\n{details}")
 
     def __del__(self):
-        self.conn.close()
\ No newline at end of file
+        if not getattr(self, "_closed", True):
+            self.close()
+
+if __name__ == '__main__':
+    # Entwicklerprüfung: python database_manager.py [pfad/zur/datenbank.db]
+    import sys
+    with DatabaseManager(sys.argv[1] if len(sys.argv) > 1 else "invoice_data.db") as db:
+        db.assert_query_plans_use_indexes()
+    print("Alle Abfragen verwenden einen Index.")
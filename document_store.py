@@ -0,0 +1,121 @@
+import hashlib
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentStore:
+    # Inhaltsadressierte Ablage: jede Datei liegt genau einmal unter
+    # objects/<ab>/<cd>/<sha256><endung>. Welche Dateien noch von Rechnungen
+    # referenziert werden, zählt die Tabelle documents in der Datenbank.
+    def __init__(self, root, max_thumbnails=500):
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        self.thumbs_dir = os.path.join(self.root, "thumbs")
+        self.max_thumbnails = max_thumbnails
+        self._thumb_index = None
+        for directory in (self.objects_dir, self.tmp_dir, self.thumbs_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def for_database(cls, db_path, **kwargs):
+        return cls(os.path.join(os.path.dirname(os.path.abspath(db_path)), "documents"), **kwargs)
+
+    def path_for(self, sha256, extension):
+        return os.path.join(self.objects_dir, sha256[:2], sha256[2:4], sha256 + extension.lower())
+
+    def is_managed(self, path):
+        return bool(path) and os.path.abspath(path).startswith(self.objects_dir + os.sep)
+
+    def find(self, sha256):
+        # Pfad einer bereits abgelegten Datei mit diesem Inhalt (unabhängig von der Endung) oder None
+        directory = os.path.dirname(self.path_for(sha256, ""))
+        if not os.path.isdir(directory):
+            return None
+        for file_name in os.listdir(directory):
+            if os.path.splitext(file_name)[0] == sha256:
+                return os.path.join(directory, file_name)
+        return None
+
+    def put(self, source_path, sha256=None, move=False):
+        # Gibt (sha256, pfad_im_store) zurück; identische Inhalte werden nur einmal
+        # abgelegt, auch bei anderer Endung (documents kennt je Inhalt nur einen Pfad)
+        if sha256 is None:
+            sha256 = file_sha256(source_path)
+        target = self.find(sha256) or self.path_for(sha256, os.path.splitext(source_path)[1])
+        if os.path.exists(target):
+            if move:
+                os.remove(source_path)
+            return sha256, target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if move:
+            os.replace(source_path, target)
+        else:
+            tmp_target = self.temp_path(os.path.splitext(source_path)[1])
+            shutil.copyfile(source_path, tmp_target)
+            os.replace(tmp_target, target)
+        return sha256, target
+
+    def temp_path(self, extension):
+        return os.path.join(self.tmp_dir, uuid.uuid4().hex + extension)
+
+    def clear_temp(self):
+        for file_name in os.listdir(self.tmp_dir):
+            try:
+                os.remove(os.path.join(self.tmp_dir, file_name))
+            except OSError as e:
+                print(f"Fehler beim Aufräumen von {file_name}: {e}")
+
+    def remove(self, path):
+        if self.is_managed(path) and os.path.exists(path):
+            os.remove(path)
+
+    # --- Vorschaubilder (LRU-Cache auf der Platte) ------------------------
+
+    def _load_thumb_index(self):
+        if self._thumb_index is None:
+            entries = []
+            for file_name in os.listdir(self.thumbs_dir):
+                path = os.path.join(self.thumbs_dir, file_name)
+                entries.append((os.path.getmtime(path), path))
+            self._thumb_index = OrderedDict((path, None) for _, path in sorted(entries))
+        return self._thumb_index
+
+    def thumbnail(self, image_path, size=(160, 160)):
+        # Erzeugt das Vorschaubild beim ersten Zugriff; danach kommt es aus dem Cache
+        stat = os.stat(image_path)
+        key = hashlib.sha1(f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}".encode()).hexdigest()
+        thumb_path = os.path.join(self.thumbs_dir, f"{key}_{size[0]}x{size[1]}.png")
+        index = self._load_thumb_index()
+
+        if os.path.exists(thumb_path):
+            os.utime(thumb_path)
+            index[thumb_path] = None
+            index.move_to_end(thumb_path)
+            return thumb_path
+
+        from PIL import Image
+        with Image.open(image_path) as img:
+            # draft() lässt JPEGs direkt in reduzierter Auflösung dekodieren
+            img.draft("RGB", size)
+            img = img.convert("RGB")
+            img.thumbnail(size)
+            img.save(thumb_path, "PNG")
+        index[thumb_path] = None
+        while len(index) > self.max_thumbnails:
+            oldest, _ = index.popitem(last=False)
+            try:
+                os.remove(oldest)
+            except OSError:
+                pass
+        return thumb_path
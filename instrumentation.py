@@ -0,0 +1,245 @@
+import bisect
+import functools
+import inspect
+import logging
+import math
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+
+class LatencyHistogram:
+    # Logarithmische Buckets, jede Grenze 25 % über der vorigen (0,01 ms bis ~9 min).
+    # Perzentile sind dadurch auf ±12,5 % genau, der Speicher bleibt konstant.
+    BOUNDS_MS = [0.01 * 1.25 ** i for i in range(80)]
+    __slots__ = ("counts", "count", "total_ms", "max_ms", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+
+    def record(self, elapsed_ms):
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+        target = math.ceil(self.count * percent / 100)
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                # Obere Grenze des Buckets, aber nie mehr als der größte gemessene Wert
+                return min(self.BOUNDS_MS[index] if index < len(self.BOUNDS_MS) else self.max_ms, self.max_ms)
+        return self.max_ms
+
+
+class Instrumentation:
+    # Sammelt Laufzeiten pro Operation (z.B. "db.get_invoices_page", "ui.render")
+    # in Histogrammen. Datenbankaufrufe über dem Schwellwert werden mit ihren
+    # SQL-Anweisungen und deren EXPLAIN QUERY PLAN in eine rotierende Logdatei geschrieben.
+    LOGGER_NAME = "rechnungsapp.slow_queries"
+    # Pro langsamen Aufruf höchstens so viele Anweisungen protokollieren (executemany!)
+    MAX_LOGGED_STATEMENTS = 20
+    # Verwaltungsmethoden, deren Messung nichts aussagt oder die selbst Teil der Messung sind
+    DATABASE_EXCLUDE = {"batch", "in_batch", "close", "add_change_listener", "remove_change_listener",
+                        "dispatch_pending_changes", "poll_external_changes", "set_trace_callback", "explain_query_plan",
+                        "check_query_plans", "assert_query_plans_use_indexes"}
+
+    def __init__(self, slow_threshold_ms=200, log_path=None, max_bytes=1_000_000, backup_count=3):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.histograms = {}
+        self.db_manager = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.logger = logging.getLogger(self.LOGGER_NAME)
+        self._handler = None
+        if log_path:
+            # delay=True: die Datei entsteht erst beim ersten langsamen Aufruf
+            self._handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding="utf-8", delay=True)
+            self._handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            self.logger.addHandler(self._handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    def record(self, name, elapsed_ms, error=False):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(elapsed_ms)
+            if error:
+                histogram.errors += 1
+
+    @contextmanager
+    def measure(self, name):
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000, error)
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.measure(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def instrument_methods(self, obj, method_names, prefix):
+        # Ersetzt die Methoden nur auf dieser Instanz; die Klasse bleibt unverändert
+        for method_name in method_names:
+            setattr(obj, method_name, self.wrap(f"{prefix}.{method_name}", getattr(obj, method_name)))
+
+    # --- Datenbank -----------------------------------------------------------
+
+    def instrument_database(self, db_manager):
+        # Misst alle öffentlichen Methoden des DatabaseManager. Generatoren
+        # (iter_invoices) bleiben außen vor: ihre Laufzeit hängt vom Verbraucher ab.
+        self.db_manager = db_manager
+        for method_name, method in inspect.getmembers(type(db_manager), inspect.isfunction):
+            if method_name.startswith("_") or method_name in self.DATABASE_EXCLUDE:
+                continue
+            if inspect.isgeneratorfunction(method):
+                continue
+            setattr(db_manager, method_name, self._wrap_database_call(method_name, getattr(db_manager, method_name)))
+        db_manager.set_trace_callback(self._trace_statement)
+
+    def _trace_statement(self, sql):
+        # Läuft im Thread der Abfrage; gesammelt wird nur innerhalb eines gemessenen Aufrufs
+        local = self._local
+        if getattr(local, "depth", 0) and not getattr(local, "explaining", False):
+            local.statement_count += 1
+            if len(local.statements) < self.MAX_LOGGED_STATEMENTS:
+                local.statements.append(sql)
+
+    def _wrap_database_call(self, method_name, function):
+        name = f"db.{method_name}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            local = self._local
+            depth = getattr(local, "depth", 0)
+            if depth == 0:
+                local.statements = []
+                local.statement_count = 0
+            local.depth = depth + 1
+            started = time.perf_counter()
+            error = None
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                local.depth = depth
+                self.record(name, elapsed_ms, error is not None)
+                # Nur der äußerste Aufruf protokolliert, sonst stünden verschachtelte Aufrufe doppelt im Log
+                if depth == 0:
+                    if error is not None:
+                        self.logger.warning("%s fehlgeschlagen nach %.1f ms: %r", name, elapsed_ms, error)
+                    elif elapsed_ms >= self.slow_threshold_ms:
+                        self._log_slow_call(name, elapsed_ms, local.statements, local.statement_count)
+                    local.statements = []
+        return wrapper
+
+    def _log_slow_call(self, name, elapsed_ms, statements, statement_count):
+        lines = [f"Langsam: {name} {elapsed_ms:.1f} ms, {statement_count} Anweisung(en)"]
+        for sql in statements:
+            lines.append(f"  SQL: {' '.join(sql.split())}")
+            for plan_line in self._explain(sql):
+                lines.append(f"    {plan_line}")
+        if statement_count > len(statements):
+            lines.append(f"  ... {statement_count - len(statements)} weitere Anweisung(en)")
+        self.logger.info("\n".join(lines))
+
+    def _explain(self, sql):
+        if self.db_manager is None or sql.lstrip().split(None, 1)[0].upper() not in ("SELECT", "WITH", "INSERT",
+                                                                                     "UPDATE", "DELETE"):
+            return []
+        self._local.explaining = True
+        try:
+            return self.db_manager.explain_query_plan(sql)
+        except sqlite3.Error as e:
+            return [f"(EXPLAIN nicht möglich: {e})"]
+        finally:
+            self._local.explaining = False
+
+    # --- Auswertung ------------------------------------------------------------
+
+    def snapshot(self):
+        # [(name, anzahl, p50, p95, p99, max, fehler), ...] sortiert nach Gesamtzeit
+        with self._lock:
+            items = sorted(self.histograms.items(), key=lambda item: item[1].total_ms, reverse=True)
+            return [(name, histogram.count, histogram.percentile(50), histogram.percentile(95),
+                     histogram.percentile(99), histogram.max_ms, histogram.errors) for name, histogram in items]
+
+    def format_report(self):
+        lines = [f"{'Operation':<42} {'Anzahl':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'Fehler':>6}",
+                 "-" * 97]
+        for name, count, p50, p95, p99, max_ms, errors in self.snapshot():
+            lines.append(f"{name[:42]:<42} {count:>7} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} {max_ms:>9.2f} {errors:>6}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def close(self):
+        if self.db_manager is not None:
+            self.db_manager.set_trace_callback(None)
+        if self._handler is not None:
+            self.logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+
+class TkStallMonitor:
+    # Misst, wie verspätet ein regelmäßiger after()-Callback läuft. Die
+    # Verspätung ist die Zeit, in der die Tk-Ereignisschleife blockiert war.
+    def __init__(self, widget, instrumentation, interval=50, stall_threshold_ms=50, name="tk.verspätung"):
+        self.widget = widget
+        self.instrumentation = instrumentation
+        self.interval = interval
+        self.stall_threshold_ms = stall_threshold_ms
+        self.name = name
+        # Summe und Anzahl der Blockaden über stall_threshold_ms seit dem Start
+        self.stalled_ms = 0.0
+        self.stalls = 0
+        self._expected = None
+        self._after_id = None
+
+    def start(self):
+        if self._after_id is None:
+            self._schedule()
+
+    def _schedule(self):
+        self._expected = time.perf_counter() + self.interval / 1000
+        self._after_id = self.widget.after(self.interval, self._tick)
+
+    def _tick(self):
+        lateness_ms = max(0.0, (time.perf_counter() - self._expected) * 1000)
+        self.instrumentation.record(self.name, lateness_ms)
+        if lateness_ms >= self.stall_threshold_ms:
+            self.stalled_ms += lateness_ms
+            self.stalls += 1
+        self._schedule()
+
+    def stop(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
@@ -1,13 +1,32 @@
+import time
+# Referenzpunkt für den Startzeit-Bericht (vor allen weiteren Importen)
+STARTUP_T0 = time.perf_counter()
+
+import asyncio
+import json
 import os
+import sqlite3
 import customtkinter as ctk
 from tkinter import filedialog, messagebox, simpledialog
-from PIL import Image, ImageTk
+# PIL lädt customtkinter ohnehin (CTkImage), ein späterer Import spart beim Start nichts
+from PIL import Image
 from tkcalendar import DateEntry
 from datetime import datetime
 import subprocess
+import threading
+import tkinter.font as tkfont
 
 from database_manager import DatabaseManager
-from data_analytics import DataAnalytics
+from invoice_list_view import InvoiceListView
+from pdf_converter import PdfConversionExecutor
+from bulk_import import import_directory
+from document_store import DocumentStore, file_sha256
+from reminder_scheduler import ReminderScheduler
+from async_database import AsyncDatabaseManager, TkAsyncioPump
+from instrumentation import Instrumentation, TkStallMonitor
+
+# matplotlib/numpy (DataAnalytics) werden erst beim ersten Öffnen der Statistik geladen
+IMPORTS_DONE = time.perf_counter()
 
 class InvoiceApp(ctk.CTk):
     def __init__(self):
@@ -20,17 +39,108 @@ class InvoiceApp(ctk.CTk):
         ctk.set_default_color_theme("green")
 
         self.image_path = None
-        self.pdf_path = None
         self.categories_map = {} 
         self.selected_invoice_id = None 
+        # Mehrfachauswahl (Strg/Shift-Klick); selected_invoice_id ist der zuletzt angeklickte Eintrag
+        self.selected_invoice_ids = []
 
         self.db_manager = DatabaseManager() 
-        self.data_analytics = DataAnalytics(self.db_manager) 
+        # Laufzeiten aller Datenbankaufrufe; langsame Abfragen landen mit Plan in slow_queries.log
+        self.instrumentation = Instrumentation(
+            slow_threshold_ms=float(self.db_manager.get_state("slow_query_threshold_ms", 200)),
+            log_path=os.path.join(os.path.dirname(os.path.abspath(self.db_manager.db_path)), "slow_queries.log"))
+        self.instrumentation.instrument_database(self.db_manager)
+        self.stall_monitor = TkStallMonitor(self, self.instrumentation)
+        self.diagnostics_window = None
+        self.async_db = AsyncDatabaseManager(self.db_manager)
+        self.async_pump = TkAsyncioPump(self)
+        self.loading_after_id = None
+        self.filter_after_id = None
+        self.data_analytics = None
+        self.document_store = DocumentStore.for_database(self.db_manager.db_path)
+        self.pdf_converter = PdfConversionExecutor(self, on_done=self.on_pdf_conversion_done,
+                                                   on_progress=self.on_pdf_conversion_progress,
+                                                   instrumentation=self.instrumentation)
+
+        self.reminder_scheduler = ReminderScheduler(self.db_manager, self.show_reminders, widget=self)
+
+        self.startup_timing = {"imports": IMPORTS_DONE - STARTUP_T0}
 
         self.create_widgets() 
         self.load_categories() 
-        self.check_reminders_on_start() 
-        self.load_invoices_to_listbox() 
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Versteckte Diagnoseansicht: Strg+Umschalt+D
+        self.bind("<Control-D>", self.open_diagnostics)
+        # Liste, Erinnerungen und offene Konvertierungen erst nach dem ersten Zeichnen laden.
+        # Expose kommt erst, wenn das Fenster tatsächlich auf dem Bildschirm ist; die Bindung
+        # am Hauptfenster gilt für alle Widgets (bindtags), reagiert wird nur auf das erste.
+        self.first_paint_binding = self.bind("<Expose>", self.on_first_paint, add="+")
+        self.poll_database_changes()
+
+    def poll_database_changes(self):
+        # Änderungen anderer Programminstanzen auf derselben Datenbank abholen; Änderungen
+        # aus Hintergrund-Threads (Import, Export) erreichen die Listener im Tk-Thread
+        self.db_manager.poll_external_changes()
+        self.db_manager.dispatch_pending_changes()
+        self.after(200, self.poll_database_changes)
+
+    def on_first_paint(self, event):
+        if self.first_paint_binding is None:
+            return
+        self.unbind("<Expose>", self.first_paint_binding)
+        self.first_paint_binding = None
+        self.startup_timing["first_paint"] = time.perf_counter() - STARTUP_T0
+        filters = (self.status_filter_combobox.get(), self.category_combobox.get(), self.tax_filter_var.get())
+        self.invoice_list_view.set_filters(*filters, reload=False)
+        self.async_pump.run_latest("invoice_list", self.load_first_invoice_page())
+
+    async def load_first_invoice_page(self):
+        # Wie load_invoice_list_async; wird das Laden von einem Filterwechsel abgelöst,
+        # startet der Rest trotzdem
+        try:
+            await self._load_invoice_list()
+        finally:
+            self.startup_timing["first_data"] = time.perf_counter() - STARTUP_T0
+            self.report_startup_timing()
+            # Der Erinnerungsdialog blockiert -> erst nachdem die Liste sichtbar ist
+            self.after(50, self.finish_startup)
+
+    def finish_startup(self):
+        self.resume_pending_pdf_conversions()
+        self.reminder_scheduler.start()
+        # Automatisches Archivieren ist aktiv, sobald archive_min_age_days gesetzt ist
+        archive_min_age_days = self.db_manager.get_state("archive_min_age_days")
+        if archive_min_age_days is not None:
+            self.async_pump.run(self.archive_paid_invoices(int(archive_min_age_days)))
+        # Erst nach dem Start, sonst zählt das Laden der ersten Seite als Blockade
+        self.stall_monitor.start()
+
+    async def archive_paid_invoices(self, min_age_days):
+        try:
+            moved = await self.async_db.run("archive_paid_invoices", min_age_days)
+        except Exception as e:
+            print(f"Fehler beim Archivieren: {e}")
+            return
+        if moved:
+            self.status_label.configure(text=f"📦 {moved} bezahlte Rechnung(en) archiviert.", text_color="gray")
+
+    def report_startup_timing(self):
+        timing_ms = {key: round(value * 1000, 1) for key, value in self.startup_timing.items()}
+        print(f"Startzeit: Importe {timing_ms['imports']} ms, erstes Zeichnen {timing_ms['first_paint']} ms, "
+              f"erste Daten {timing_ms['first_data']} ms")
+        # Letzte Messung in der Datenbank, um Verschlechterungen über Versionen hinweg zu erkennen
+        self.db_manager.set_state("startup_timing", json.dumps(timing_ms))
+
+    def on_close(self):
+        self.stall_monitor.stop()
+        self.async_pump.close()
+        self.async_db.shutdown()
+        self.reminder_scheduler.stop()
+        self.pdf_converter.shutdown()
+        self.destroy()
+        self.db_manager.close()
+        self.instrumentation.close()
 
     def load_categories(self):
         categories = self.db_manager.get_categories()
@@ -99,7 +209,11 @@ class InvoiceApp(ctk.CTk):
 
         self.save_btn = ctk.CTkButton(input_filter_frame, text="➕ Rechnung hinzufügen", font=("Arial", 12, "bold"), fg_color="#4CAF50", hover_color="#45a049",
                                command=self.save_invoice, corner_radius=8)
-        self.save_btn.grid(row=row_counter, column=0, pady=10, padx=10, columnspan=4, sticky="ew")
+        self.save_btn.grid(row=row_counter, column=0, pady=10, padx=10, columnspan=3, sticky="ew")
+
+        self.bulk_import_btn = ctk.CTkButton(input_filter_frame, text="📥 Ordner importieren", font=("Arial", 12, "bold"),
+                                             command=self.start_bulk_import, corner_radius=8)
+        self.bulk_import_btn.grid(row=row_counter, column=3, pady=10, padx=10, sticky="ew")
         row_counter += 1
 
         filter_frame = ctk.CTkFrame(self, corner_radius=15, fg_color="white")
@@ -129,19 +243,48 @@ class InvoiceApp(ctk.CTk):
         ctk.CTkButton(filter_frame, text="⚙️ Kategorien verwalten", font=("Arial", 11), fg_color="#A9A9A9", hover_color="#8c8c8c",
                command=self.open_category_management, corner_radius=8).grid(row=1, column=2, columnspan=2, padx=10, pady=10, sticky="ew")
         
+        ctk.CTkLabel(filter_frame, text="Suche:", font=("Arial", 11, "bold")).grid(row=2, column=0, padx=20, pady=10, sticky="w")
+        self.search_entry = ctk.CTkEntry(filter_frame, placeholder_text="Rechnungsname durchsuchen", font=("Arial", 11), corner_radius=8)
+        self.search_entry.grid(row=2, column=1, columnspan=3, padx=10, pady=10, sticky="ew")
+        self.search_entry.bind('<KeyRelease>', self.on_search_input)
+        self.search_after_id = None
+
         ctk.CTkButton(filter_frame, text="📊 Statistiken anzeigen", font=("Arial", 11), fg_color="#A9A9A9", hover_color="#8c8c8c",
-               command=self.show_analytics_charts, corner_radius=8).grid(row=2, column=0, columnspan=4, padx=10, pady=10, sticky="ew")
+               command=self.show_analytics_charts, corner_radius=8).grid(row=3, column=0, columnspan=2, padx=10, pady=10, sticky="ew")
+        self.export_btn = ctk.CTkButton(filter_frame, text="📤 Exportieren", font=("Arial", 11), fg_color="#A9A9A9", hover_color="#8c8c8c",
+                                        command=self.start_export, corner_radius=8)
+        self.export_btn.grid(row=3, column=2, columnspan=2, padx=10, pady=10, sticky="ew")
 
         list_frame = ctk.CTkFrame(self, corner_radius=15, fg_color="white")
         list_frame.pack(pady=10, padx=20, fill="both", expand=True)
 
         ctk.CTkLabel(list_frame, text="Deine Rechnungen:", font=("Arial", 15, "bold")).pack(pady=15)
 
+        page_nav_frame = ctk.CTkFrame(list_frame, fg_color="transparent")
+        page_nav_frame.pack(side="bottom", fill="x", padx=15, pady=(0, 10))
+        self.prev_page_btn = ctk.CTkButton(page_nav_frame, text="◀ Vorherige Seite", font=("Arial", 11), width=140,
+                                           command=self.show_previous_page, corner_radius=8)
+        self.prev_page_btn.pack(side="left")
+        self.next_page_btn = ctk.CTkButton(page_nav_frame, text="Nächste Seite ▶", font=("Arial", 11), width=140,
+                                           command=self.show_next_page, corner_radius=8)
+        self.next_page_btn.pack(side="left", padx=10)
+
         self.invoice_listbox = ctk.CTkTextbox(list_frame, font=("Consolas", 11), height=15, width=950, wrap="none", corner_radius=8)
         self.invoice_listbox.pack(side="left", fill="both", expand=True, padx=(15, 10), pady=15)
         self.invoice_listbox.bind('<Double-Button-1>', self.on_invoice_double_click)
         self.invoice_listbox.bind('<Button-1>', self.on_invoice_single_click) 
+        self.invoice_listbox.bind('<Control-Button-1>', self.on_invoice_ctrl_click)
+        self.invoice_listbox.bind('<Shift-Button-1>', self.on_invoice_shift_click)
+        self.invoice_listbox.bind('<MouseWheel>', self.on_invoice_list_scroll)
+        self.invoice_listbox.bind('<Button-4>', self.on_invoice_list_scroll)
+        self.invoice_listbox.bind('<Button-5>', self.on_invoice_list_scroll)
+        self.invoice_listbox.bind('<Configure>', self.on_invoice_list_resize)
         self.invoice_listbox.configure(state="disabled")
+        self.invoice_line_height = tkfont.Font(font=("Consolas", 11)).metrics("linespace")
+        self.invoice_list_view = InvoiceListView(self.invoice_listbox, self.db_manager, on_render=self.on_invoice_list_rendered)
+        self.instrumentation.instrument_methods(self.invoice_list_view, ("reload", "render", "apply_change"), "ui.list")
+        # Einzeländerungen werden direkt in der sichtbaren Liste nachgezogen
+        self.db_manager.add_change_listener(self.invoice_list_view.apply_change)
 
         action_button_frame = ctk.CTkFrame(list_frame, fg_color="transparent")
         action_button_frame.pack(side="right", fill="y", padx=(5, 15), pady=15)
@@ -160,6 +303,12 @@ class InvoiceApp(ctk.CTk):
 
         ctk.CTkButton(action_button_frame, text="🗑️ Rechnung löschen", font=("Arial", 11), fg_color="#F44336", hover_color="#e53935",
                command=self.delete_selected_invoice, corner_radius=8).pack(pady=15, fill="x")
+
+        self.preview_label = ctk.CTkLabel(action_button_frame, text="", width=160, height=160)
+        self.preview_label.pack(pady=10)
+
+        ctk.CTkButton(action_button_frame, text="⛔ PDF-Erstellung abbrechen", font=("Arial", 11), fg_color="#A9A9A9", hover_color="#8c8c8c",
+               command=self.cancel_pdf_conversions, corner_radius=8).pack(pady=5, fill="x")
         
         self.status_label = ctk.CTkLabel(self, text="Bereit", font=("Arial", 12), text_color="green")
         self.status_label.pack(pady=10, padx=20, fill="x")
@@ -172,8 +321,6 @@ class InvoiceApp(ctk.CTk):
         if file_path:
             self.image_path = file_path
             base_name = os.path.splitext(os.path.basename(file_path))[0]
-            dir_name = os.path.dirname(file_path)
-            self.pdf_path = os.path.join(dir_name, base_name + ".pdf")
             
             self.status_label.configure(text=f"✅ Datei ausgewählt: {os.path.basename(file_path)}", text_color="green")
             
@@ -182,7 +329,6 @@ class InvoiceApp(ctk.CTk):
         else:
             self.status_label.configure(text="Auswahl abgebrochen.", text_color="gray")
             self.image_path = None
-            self.pdf_path = None
             self.name_input.delete(0, 'end')
 
     def save_invoice(self):
@@ -204,10 +350,7 @@ class InvoiceApp(ctk.CTk):
                 return
             
             self.image_path = None
-            self.pdf_path = None
             self.status_label.configure(text="Kein Bild ausgewählt. Rechnung wird ohne Bild gespeichert.", text_color="orange")
-        else:
-            self.convert_image_to_pdf(self.image_path, self.pdf_path)
 
         try:
             due_date_str = self.due_date_entry.get_date().strftime('%Y-%m-%d')
@@ -223,8 +366,40 @@ class InvoiceApp(ctk.CTk):
         category_id = self.categories_map.get(selected_category_name) 
 
         status = "Offen" 
-        
-        if self.db_manager.add_invoice(invoice_name, amount, self.image_path, self.pdf_path, status, due_date_str, reminder_date_str, category_id):
+        # Die Rechnung wird sofort gespeichert; die PDF folgt aus dem Hintergrund
+        pdf_status = "pending" if self.image_path else None
+        stored_image_path = None
+        content_hash = None
+        already_stored = False
+
+        if self.image_path:
+            # Das Bild wird inhaltsadressiert im Dokumentenspeicher abgelegt, und zwar vor
+            # der Transaktion: Hashen und Kopieren sollen keine Schreibsperre halten
+            try:
+                content_hash = file_sha256(self.image_path)
+                already_stored = self.document_store.find(content_hash) is not None
+                content_hash, stored_image_path = self.document_store.put(self.image_path, sha256=content_hash)
+            except OSError as e:
+                print(f"Fehler beim Ablegen des Bildes {self.image_path}: {e}")
+                messagebox.showerror("Fehler", f"Das Bild konnte nicht gespeichert werden: {e}")
+                self.status_label.configure(text=f"❌ Fehler beim Hinzufügen von Rechnung '{invoice_name}'.", text_color="red")
+                return
+
+        try:
+            with self.db_manager.batch():
+                if stored_image_path:
+                    self.db_manager.register_document(content_hash, stored_image_path)
+                invoice_id = self.db_manager.add_invoice(invoice_name, amount, stored_image_path, None, status, due_date_str,
+                                                         reminder_date_str, category_id, pdf_status, content_hash)
+        except sqlite3.Error as e:
+            print(f"Fehler beim Speichern der Rechnung: {e}")
+            invoice_id = None
+            # Nur eine eben erst abgelegte Datei entfernen; einen vorhandenen Inhalt nutzen andere Rechnungen
+            if stored_image_path and not already_stored:
+                self.document_store.remove(stored_image_path)
+        if invoice_id:
+            if stored_image_path:
+                self.pdf_converter.submit(invoice_id, stored_image_path, self.document_store.temp_path(".pdf"))
             self.status_label.configure(text=f"✅ Rechnung '{invoice_name}' hinzugefügt.", text_color="green")
             messagebox.showinfo("Erfolgreich", f"Rechnung '{invoice_name}' erfolgreich hinzugefügt!")
             
@@ -237,97 +412,341 @@ class InvoiceApp(ctk.CTk):
             else:
                 self.new_invoice_category_combobox.set("")
             self.image_path = None
-            self.pdf_path = None
-            self.load_invoices_to_listbox()
         else:
             messagebox.showerror("Fehler", f"Rechnung '{invoice_name}' konnte nicht hinzugefügt werden.")
             self.status_label.configure(text=f"❌ Fehler beim Hinzufügen von Rechnung '{invoice_name}'.", text_color="red")
 
-    def convert_image_to_pdf(self, image_path, pdf_path):
-        try:
-            img = Image.open(image_path).convert("RGB")
-            img.save(pdf_path, "PDF", resolution=100.0)
+    def resume_pending_pdf_conversions(self):
+        # Konvertierungen, die beim letzten Beenden noch offen waren, erneut einreihen
+        self.document_store.clear_temp()
+        for invoice_id, image_path, _ in self.db_manager.get_pending_pdf_conversions():
+            if image_path and os.path.exists(image_path):
+                self.pdf_converter.submit(invoice_id, image_path, self.document_store.temp_path(".pdf"))
+            else:
+                self.db_manager.set_invoice_pdf_status(invoice_id, None, "failed")
+
+    def on_pdf_conversion_progress(self, finished, total):
+        if finished < total:
+            self.status_label.configure(text=f"⏳ PDF-Erstellung: {finished}/{total} fertig", text_color="blue")
+
+    def on_pdf_conversion_done(self, invoice_id, pdf_path, error, cancelled):
+        if cancelled:
+            self.db_manager.set_invoice_pdf_status(invoice_id, None, "cancelled")
+            self.status_label.configure(text=f"PDF-Erstellung für Rechnung ID {invoice_id} abgebrochen.", text_color="gray")
+        elif error is not None:
+            print(f"Fehler bei der PDF-Konvertierung: {error}")
+            self.db_manager.set_invoice_pdf_status(invoice_id, None, "failed")
+            messagebox.showerror("PDF-Konvertierungsfehler", f"Fehler beim Konvertieren zu PDF: {error}")
+            self.status_label.configure(text=f"❌ PDF-Konvertierungsfehler bei Rechnung ID {invoice_id}.", text_color="red")
+        else:
             print(f"Bild erfolgreich in PDF konvertiert: {pdf_path}")
-            self.status_label.configure(text=self.status_label.cget("text") + f" & PDF gespeichert: {os.path.basename(pdf_path)}", text_color="green")
-        except Exception as e:
-            print(f"Fehler bei der PDF-Konvertierung: {e}")
-            messagebox.showerror("PDF-Konvertierungsfehler", f"Fehler beim Konvertieren zu PDF: {e}")
-            self.status_label.configure(text=self.status_label.cget("text") + f" ❌ PDF-Konvertierungsfehler.", text_color="red")
+            content_hash, pdf_path = self.document_store.put(pdf_path, move=True)
+            with self.db_manager.batch():
+                self.db_manager.register_document(content_hash, pdf_path)
+                updated = self.db_manager.set_invoice_pdf_status(invoice_id, pdf_path, "done")
+            if not updated:
+                # Rechnung während der Konvertierung gelöscht -> PDF wieder freigeben
+                if pdf_path in self.db_manager.release_unreferenced_documents([pdf_path]):
+                    self.document_store.remove(pdf_path)
+                self.status_label.configure(text=f"Rechnung ID {invoice_id} wurde gelöscht, PDF verworfen.", text_color="gray")
+                return
+            self.status_label.configure(text=f"✅ PDF gespeichert: {os.path.basename(pdf_path)}", text_color="green")
+
+    def cancel_pdf_conversions(self):
+        if self.pdf_converter.jobs:
+            self.pdf_converter.cancel_all()
+            self.status_label.configure(text="PDF-Erstellung wird abgebrochen...", text_color="gray")
+        else:
+            self.status_label.configure(text="Keine laufende PDF-Erstellung.", text_color="gray")
+
+    def start_bulk_import(self):
+        directory = filedialog.askdirectory(title="Ordner mit Rechnungsbildern auswählen")
+        if not directory:
+            self.status_label.configure(text="Import abgebrochen.", text_color="gray")
+            return
+
+        category_id = self.categories_map.get(self.new_invoice_category_combobox.get())
+        self.bulk_import_btn.configure(state="disabled")
+        self.status_label.configure(text=f"⏳ Importiere Ordner {directory} ...", text_color="blue")
+
+        # Der Import läuft in einem eigenen Thread; der DatabaseManager ist thread-sicher
+        self.bulk_import_result = {}
+
+        def run_import():
+            try:
+                self.bulk_import_result["stats"] = import_directory(
+                    self.db_manager, directory, category_id=category_id,
+                    progress=lambda done, total: self.bulk_import_result.update(progress=(done, total)))
+            except Exception as e:
+                self.bulk_import_result["error"] = e
+            finally:
+                self.bulk_import_result["done"] = True
+
+        threading.Thread(target=run_import, daemon=True).start()
+        self.after(200, self.poll_bulk_import)
+
+    def poll_bulk_import(self):
+        result = self.bulk_import_result
+        if not result.get("done"):
+            if "progress" in result:
+                done, total = result["progress"]
+                self.status_label.configure(text=f"⏳ Import: {done}/{total} Dateien verarbeitet", text_color="blue")
+            self.after(200, self.poll_bulk_import)
+            return
+
+        self.bulk_import_btn.configure(state="normal")
+        if "error" in result:
+            print(f"Fehler beim Import: {result['error']}")
+            messagebox.showerror("Importfehler", f"Der Import ist fehlgeschlagen: {result['error']}")
+            self.status_label.configure(text="❌ Import fehlgeschlagen.", text_color="red")
+            return
+
+        summary = result["stats"].summary()
+        print(summary)
+        self.status_label.configure(text=f"✅ {summary}", text_color="green")
+        self.load_invoices_to_listbox()
+
+    # Dateityp im Speichern-Dialog -> (Exportformat, PDFs als ZIP beilegen)
+    EXPORT_FILE_TYPES = {
+        "CSV": ("csv", False),
+        "Excel": ("xlsx", False),
+        "DATEV-Buchungsstapel": ("datev", False),
+        "ZIP mit PDFs": ("csv", True),
+    }
+
+    def start_export(self):
+        # Exportiert die aktuell gefilterte Ansicht
+        file_type = ctk.StringVar(value="CSV")
+        path = filedialog.asksaveasfilename(title="Rechnungen exportieren", typevariable=file_type,
+                                            filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx"),
+                                                       ("DATEV-Buchungsstapel", "*.csv"), ("ZIP mit PDFs", "*.zip")])
+        if not path:
+            return
+        export_format, include_pdfs = self.EXPORT_FILE_TYPES.get(file_type.get(), ("csv", False))
+        status_filter, category_filter, tax_filter = self.invoice_list_view.filters
+        options = {}
+        tax_year = None
+        if export_format == "datev":
+            year = simpledialog.askinteger("DATEV-Export", "Wirtschaftsjahr:", initialvalue=datetime.now().year)
+            if year is None:
+                return
+            options["fiscal_year"] = year
+            # Mit aktivem Steuerfilter nur die für dieses Jahr vorgemerkten Rechnungen
+            tax_year = year if tax_filter else None
+
+        self.export_btn.configure(state="disabled")
+        self.status_label.configure(text=f"⏳ Exportiere nach {path} ...", text_color="blue")
+        self.export_result = {}
+
+        def run_export():
+            try:
+                from invoice_export import export_invoices
+                self.export_result["count"] = export_invoices(self.db_manager, path, export_format, status_filter, category_filter,
+                                                              tax_filter, tax_year=tax_year, include_pdfs=include_pdfs,
+                                                              **options)
+            except Exception as e:
+                self.export_result["error"] = e
+            finally:
+                self.export_result["done"] = True
+
+        threading.Thread(target=run_export, daemon=True).start()
+        self.after(200, self.poll_export)
+
+    def poll_export(self):
+        result = self.export_result
+        if not result.get("done"):
+            self.after(200, self.poll_export)
+            return
+
+        self.export_btn.configure(state="normal")
+        if "error" in result:
+            print(f"Fehler beim Export: {result['error']}")
+            messagebox.showerror("Exportfehler", f"Der Export ist fehlgeschlagen: {result['error']}")
+            self.status_label.configure(text="❌ Export fehlgeschlagen.", text_color="red")
+            return
+        self.status_label.configure(text=f"✅ {result['count']} Rechnungen exportiert.", text_color="green")
+
+    def on_search_input(self, event=None):
+        # Entprellt: gesucht wird erst 300 ms nach dem letzten Tastendruck
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(300, self.run_search)
+
+    def run_search(self):
+        self.search_after_id = None
+        search_text = self.search_entry.get()
+        if (search_text.strip() or None) == self.invoice_list_view.search_text:
+            return
+        self.selected_invoice_id = None
+        self.selected_invoice_ids = []
+        self.invoice_list_view.set_search(search_text, reload=False)
+        self.load_invoice_list_async()
 
     def apply_filters(self, event=None):
+        # Entprellt: bei schnellen Wechseln der Filter wird nur der letzte Stand abgefragt
+        if self.filter_after_id is not None:
+            self.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.after(200, self.run_apply_filters)
+
+    def run_apply_filters(self):
+        self.filter_after_id = None
+        filters = (self.status_filter_combobox.get(), self.category_combobox.get(), self.tax_filter_var.get())
+        if filters == self.invoice_list_view.filters:
+            return
         self.selected_invoice_id = None 
-        self.load_invoices_to_listbox()
+        self.selected_invoice_ids = []
+        self.invoice_list_view.set_filters(*filters, reload=False)
+        self.load_invoice_list_async()
+
+    def load_invoice_list_async(self):
+        # Filter- und Suchwechsel laden im Hintergrund; eine noch laufende Abfrage
+        # für einen älteren Filter wird abgebrochen und ihr Ergebnis verworfen
+        self.async_pump.run_latest("invoice_list", self._load_invoice_list())
+
+    async def _load_invoice_list(self):
+        # Ladeanzeige erst nach 150 ms, damit schnelle Abfragen nicht flackern
+        if self.loading_after_id is None:
+            self.loading_after_id = self.after(150, self.show_invoice_list_loading)
+        try:
+            await self.invoice_list_view.reload_async(self.async_db)
+        except asyncio.CancelledError:
+            # Die nachfolgende Abfrage übernimmt die Ladeanzeige
+            raise
+        except Exception as e:
+            print(f"Fehler beim Laden der Rechnungen: {e}")
+            self.status_label.configure(text="❌ Rechnungen konnten nicht geladen werden.", text_color="red")
+            self.hide_invoice_list_loading()
+        else:
+            self.hide_invoice_list_loading()
+
+    def show_invoice_list_loading(self):
+        self.loading_after_id = "shown"
+        self.status_label.configure(text="⏳ Rechnungen werden geladen...", text_color="blue")
 
-    def load_invoices_to_listbox(self):
-        self.invoice_listbox.configure(state="normal")
-        self.invoice_listbox.delete("1.0", "end") 
+    def hide_invoice_list_loading(self):
+        if self.loading_after_id == "shown":
+            self.status_label.configure(text="")
+        elif self.loading_after_id is not None:
+            self.after_cancel(self.loading_after_id)
+        self.loading_after_id = None
 
-        current_status_filter = self.status_filter_combobox.get()
-        current_category_filter = self.category_combobox.get()
-        current_tax_filter = self.tax_filter_var.get()
+    def load_invoices_to_listbox(self, reset_position=False):
+        filters = (self.status_filter_combobox.get(), self.category_combobox.get(), self.tax_filter_var.get())
 
-        invoices = self.db_manager.get_invoices(current_status_filter, current_category_filter, current_tax_filter)
-        self.invoice_data = {} 
+        # Es wird nur die sichtbare Seite geladen; nach Änderungen bleibt die Position erhalten
+        if reset_position or filters != self.invoice_list_view.filters:
+            self.invoice_list_view.set_filters(*filters)
+        else:
+            self.invoice_list_view.reload()
 
-        # NEU: Spalten für den Preis hinzugefügt
-        header_format = "{:<5} {:<30} {:<10} {:<10} {:<12} {:<15} {:<15} {:<3}"
-        self.invoice_listbox.insert("end", header_format.format("ID", "Name", "Preis", "Status", "Fällig", "Erinnerung", "Kategorie", "🧾") + "\n")
-        self.invoice_listbox.insert("end", "-" * 115 + "\n")
+    def on_invoice_list_rendered(self):
+        self.prev_page_btn.configure(state="normal" if self.invoice_list_view.has_prev else "disabled")
+        self.next_page_btn.configure(state="normal" if self.invoice_list_view.has_next else "disabled")
+        self.highlight_selection()
 
-        for invoice in invoices:
-            invoice_id, name, amount, image_path, pdf_path, _, status, due_date, reminder_date, tax_year, category_name = invoice
-            
-            due_display = due_date if due_date else "N/A"
-            reminder_display = reminder_date if reminder_date else "N/A"
-            category_display = category_name if category_name else "Keine"
-            amount_display = f"{amount:.2f} €" if amount is not None else "N/A"
-
-            display_name = (name[:28] + '..') if len(name) > 28 else name
-            display_category = (category_display[:13] + '..') if len(category_display) > 13 else category_display
-            tax_icon = "✓" if tax_year else " "
-
-            display_text = header_format.format(
-                invoice_id,
-                display_name,
-                amount_display,
-                status,
-                due_display,
-                reminder_display,
-                display_category,
-                tax_icon
-            )
-
-            self.invoice_listbox.insert("end", display_text + "\n", f"invoice_line_{invoice_id}")
-            self.invoice_data[invoice_id] = invoice 
-        
-        self.invoice_listbox.configure(state="disabled")
+    def highlight_selection(self):
+        self.invoice_listbox.tag_remove("highlight", "1.0", "end")
+        for invoice_id in self.selected_invoice_ids:
+            line_num = self.invoice_list_view.line_of(invoice_id)
+            if line_num is not None:
+                self.invoice_listbox.tag_add("highlight", f"{line_num}.0", f"{line_num}.end")
+        self.invoice_listbox.tag_config("highlight", background="#dddddd")
+
+    def show_next_page(self):
+        self.invoice_list_view.next_page()
+
+    def show_previous_page(self):
+        self.invoice_list_view.prev_page()
+
+    def on_invoice_list_scroll(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.invoice_list_view.scroll(-3)
+        else:
+            self.invoice_list_view.scroll(3)
+        return "break"
+
+    def on_invoice_list_resize(self, event):
+        visible_lines = event.height // self.invoice_line_height - InvoiceListView.HEADER_LINES
+        if "first_data" not in self.startup_timing:
+            # Vor dem ersten Laden nur die Seitengröße merken (on_first_paint lädt die Liste)
+            self.invoice_list_view.page_size = max(1, visible_lines)
+            return
+        self.invoice_list_view.resize(visible_lines)
+
+    def invoice_at_click(self):
+        line_num = int(self.invoice_listbox.index(ctk.CURRENT).split('.')[0])
+        return self.invoice_list_view.row_at_line(line_num)
 
     def on_invoice_single_click(self, event):
         try:
-            line_num = int(self.invoice_listbox.index(ctk.CURRENT).split('.')[0])
-            if line_num <= 2: 
+            invoice = self.invoice_at_click()
+            if invoice is None: 
                 self.clear_selection()
                 return
 
-            selected_item_text = self.invoice_listbox.get(f"{line_num}.0", f"{line_num}.end").strip()
-            invoice_id = int(selected_item_text.split()[0]) 
-
-            self.clear_selection()
-            self.selected_invoice_id = invoice_id
-            
-            self.invoice_listbox.tag_add("highlight", f"{line_num}.0", f"{line_num}.end")
-            self.invoice_listbox.tag_config("highlight", background="#dddddd")
+            self.selected_invoice_id = invoice[0]
+            self.selected_invoice_ids = [invoice[0]]
+            self.highlight_selection()
+            self.show_invoice_preview(invoice)
         except:
             self.clear_selection()
             pass
 
+    def on_invoice_ctrl_click(self, event):
+        invoice = self.invoice_at_click()
+        if invoice is not None:
+            if invoice[0] in self.selected_invoice_ids:
+                self.selected_invoice_ids.remove(invoice[0])
+            else:
+                self.selected_invoice_ids.append(invoice[0])
+            self.selected_invoice_id = invoice[0]
+            self.highlight_selection()
+        return "break"
+
+    def on_invoice_shift_click(self, event):
+        invoice = self.invoice_at_click()
+        if invoice is None:
+            return "break"
+        rows = self.invoice_list_view.rows
+        anchor_row = self.invoice_list_view.get_row(self.selected_invoice_id) if self.selected_invoice_id is not None else None
+        start = rows.index(anchor_row) if anchor_row is not None else rows.index(invoice)
+        end = rows.index(invoice)
+        if start > end:
+            start, end = end, start
+        # Der Anker (zuletzt angeklickter Eintrag) bleibt für weitere Shift-Klicks erhalten
+        self.selected_invoice_ids = [row[0] for row in rows[start:end + 1]]
+        if self.selected_invoice_id is None:
+            self.selected_invoice_id = invoice[0]
+        self.highlight_selection()
+        return "break"
+
     def clear_selection(self):
         self.invoice_listbox.tag_remove("highlight", "1.0", "end")
         self.selected_invoice_id = None
+        self.selected_invoice_ids = []
+        self.preview_label.configure(image=None, text="")
+
+    def show_invoice_preview(self, invoice):
+        # Vorschaubild aus dem Thumbnail-Cache; das Originalbild wird dafür nicht voll dekodiert
+        image_path = invoice[3]
+        if not image_path or not os.path.exists(image_path):
+            self.preview_label.configure(image=None, text="Keine Vorschau")
+            return
+        try:
+            thumb_path = self.document_store.thumbnail(image_path)
+            thumb = Image.open(thumb_path)
+            self.preview_image = ctk.CTkImage(light_image=thumb, size=thumb.size)
+            self.preview_label.configure(image=self.preview_image, text="")
+        except Exception as e:
+            print(f"Fehler beim Erstellen der Vorschau: {e}")
+            self.preview_label.configure(image=None, text="Keine Vorschau")
 
     def on_invoice_double_click(self, event):
         if self.selected_invoice_id is not None:
-            invoice_tuple = self.invoice_data.get(self.selected_invoice_id)
+            if self.pdf_converter.is_pending(self.selected_invoice_id):
+                self.status_label.configure(text="⏳ Die PDF wird noch erstellt...", text_color="orange")
+                return
+            invoice_tuple = self.invoice_list_view.get_row(self.selected_invoice_id)
             if invoice_tuple:
                 pdf_path = invoice_tuple[4]
                 if pdf_path and os.path.exists(pdf_path):
@@ -346,58 +765,73 @@ class InvoiceApp(ctk.CTk):
                     messagebox.showwarning("PDF nicht gefunden", "Die zugehörige PDF-Datei existiert nicht mehr.")
                     self.status_label.configure(text="⚠️ PDF nicht gefunden.", text_color="orange")
     
-    def get_selected_invoice_id(self):
-        if self.selected_invoice_id is None:
+    def get_selected_invoice_ids(self):
+        if not self.selected_invoice_ids:
             messagebox.showwarning("Keine Auswahl", "Bitte wählen Sie eine Rechnung aus der Liste aus.")
-            return None
-        return self.selected_invoice_id
+            return []
+        return list(self.selected_invoice_ids)
+
+    def describe_invoices(self, invoice_ids):
+        if len(invoice_ids) == 1:
+            return f"Rechnung ID {invoice_ids[0]}"
+        return f"{len(invoice_ids)} Rechnungen"
 
     def update_selected_invoice_status(self, new_status):
-        invoice_id = self.get_selected_invoice_id()
-        if invoice_id is not None:
-            if self.db_manager.update_invoice_status(invoice_id, new_status):
-                self.status_label.configure(text=f"Status von Rechnung ID {invoice_id} auf '{new_status}' geändert.", text_color="blue")
-                self.load_invoices_to_listbox()
+        invoice_ids = self.get_selected_invoice_ids()
+        if invoice_ids:
+            # Eine Transaktion für die gesamte Auswahl; die Liste wird danach einmal aktualisiert
+            updated = self.db_manager.update_invoice_status_many(invoice_ids, new_status)
+            if updated == len(invoice_ids):
+                self.status_label.configure(text=f"Status von {self.describe_invoices(invoice_ids)} auf '{new_status}' geändert.", text_color="blue")
+                self.clear_selection()
+            elif updated:
+                # Die übrigen wurden inzwischen (z.B. von einer anderen Programminstanz) gelöscht
+                self.status_label.configure(text=f"Status von {updated} der {len(invoice_ids)} Rechnungen auf '{new_status}' geändert, "
+                                                 "die übrigen existieren nicht mehr.", text_color="orange")
                 self.clear_selection()
             else:
-                self.status_label.configure(text=f"Fehler beim Aktualisieren des Status für Rechnung ID {invoice_id}.", text_color="red")
+                self.status_label.configure(text=f"Fehler beim Aktualisieren des Status für {self.describe_invoices(invoice_ids)}.", text_color="red")
 
     def delete_selected_invoice(self):
-        invoice_id = self.get_selected_invoice_id()
-        if invoice_id is not None:
-            paths = self.db_manager.get_invoice_paths(invoice_id)
-
-            if messagebox.askyesno("Rechnung löschen", f"Sind Sie sicher, dass Sie Rechnung ID {invoice_id} löschen möchten? Dies kann nicht rückgängig gemacht werden."):
-                if self.db_manager.delete_invoice(invoice_id):
-                    self.status_label.configure(text=f"Rechnung ID {invoice_id} erfolgreich gelöscht.", text_color="red")
-                    self.load_invoices_to_listbox() 
+        invoice_ids = self.get_selected_invoice_ids()
+        if invoice_ids:
+            description = self.describe_invoices(invoice_ids)
+            if messagebox.askyesno("Rechnung löschen", f"Sind Sie sicher, dass Sie {description} löschen möchten? Dies kann nicht rückgängig gemacht werden."):
+                paths = self.db_manager.get_invoice_paths_many(invoice_ids)
+                if self.db_manager.delete_invoices(invoice_ids):
+                    self.status_label.configure(text=f"{description} erfolgreich gelöscht.", text_color="red")
                     self.clear_selection()
 
-                    if paths:
-                        image_p, pdf_p = paths
-                        if image_p and os.path.exists(image_p):
-                            try:
-                                os.remove(image_p)
-                                print(f"Bilddatei gelöscht: {image_p}")
-                            except OSError as e:
-                                print(f"Fehler beim Löschen der Bilddatei {image_p}: {e}")
-                        if pdf_p and os.path.exists(pdf_p):
-                            try:
-                                os.remove(pdf_p)
-                                print(f"PDF-Datei gelöscht: {pdf_p}")
-                            except OSError as e:
-                                print(f"Fehler beim Löschen der PDF-Datei {pdf_p}: {e}")
+                    file_paths = [path for image_p, pdf_p in paths for path in (image_p, pdf_p) if path]
+                    # Dateien im Dokumentenspeicher nur löschen, wenn keine andere Rechnung sie noch nutzt
+                    released = set(self.db_manager.release_unreferenced_documents(file_paths))
+                    file_paths = [path for path in set(file_paths)
+                                  if path in released or not self.document_store.is_managed(path)]
+                    if file_paths:
+                        threading.Thread(target=self.delete_invoice_files, args=(file_paths,), daemon=True).start()
                 else:
-                    self.status_label.configure(text=f"Fehler beim Löschen der Rechnung ID {invoice_id}.", text_color="red")
+                    self.status_label.configure(text=f"Fehler beim Löschen von {description}.", text_color="red")
             else:
                 self.status_label.configure(text="Löschen abgebrochen.", text_color="gray")
-    
-    def check_reminders_on_start(self):
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        due_today, remind_today = self.db_manager.get_due_and_reminder_invoices(today_str)
 
+    @staticmethod
+    def delete_invoice_files(file_paths):
+        # Läuft in einem Hintergrund-Thread, damit viele Dateien die Oberfläche nicht blockieren
+        for path in file_paths:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                    print(f"Datei gelöscht: {path}")
+                except OSError as e:
+                    print(f"Fehler beim Löschen der Datei {path}: {e}")
+    
+    def show_reminders(self, due_today, remind_today, catch_up=False):
+        # Wird vom ReminderScheduler beim Start (inkl. verpasster Tage) und zu jedem neuen Termin aufgerufen
         if due_today or remind_today:
-            message = "Wichtige Benachrichtigungen für heute:\n\n"
+            if catch_up:
+                message = "Wichtige Benachrichtigungen seit dem letzten Start:\n\n"
+            else:
+                message = "Wichtige Benachrichtigungen für heute:\n\n"
             if due_today:
                 message += "Fällige Rechnungen:\n"
                 for name, date in due_today:
@@ -445,6 +879,36 @@ class InvoiceApp(ctk.CTk):
 
         self.category_add_delete_window.protocol("WM_DELETE_WINDOW", self.on_category_window_close)
 
+    def open_diagnostics(self, event=None):
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        self.diagnostics_window = ctk.CTkToplevel(self)
+        self.diagnostics_window.title("Diagnose")
+        self.diagnostics_window.geometry("820x480")
+
+        self.diagnostics_textbox = ctk.CTkTextbox(self.diagnostics_window, font=("Courier New", 11), wrap="none")
+        self.diagnostics_textbox.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+        ctk.CTkButton(self.diagnostics_window, text="Zurücksetzen", command=self.instrumentation.reset,
+                      font=("Arial", 10), corner_radius=8).pack(pady=(0, 10))
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        if self.diagnostics_window is None or not self.diagnostics_window.winfo_exists():
+            self.diagnostics_window = None
+            return
+        monitor = self.stall_monitor
+        lines = [f"Tk-Blockaden über {monitor.stall_threshold_ms} ms: {monitor.stalls}, "
+                 f"zusammen {monitor.stalled_ms / 1000:.1f} s",
+                 f"Langsame Abfragen ab {self.instrumentation.slow_threshold_ms:g} ms -> slow_queries.log",
+                 "Zeiten in ms", ""]
+        lines.extend(self.instrumentation.format_report())
+        self.diagnostics_textbox.configure(state="normal")
+        self.diagnostics_textbox.delete("1.0", "end")
+        self.diagnostics_textbox.insert("end", "\n".join(lines) + "\n")
+        self.diagnostics_textbox.configure(state="disabled")
+        self.diagnostics_window.after(1000, self.refresh_diagnostics)
+
     def load_categories_for_management_listbox(self):
         self.category_listbox_add_delete.configure(state="normal")
         self.category_listbox_add_delete.delete("1.0", "end")
@@ -501,43 +965,48 @@ class InvoiceApp(ctk.CTk):
         self.status_label.configure(text="Kategorienverwaltung geschlossen.", text_color="gray")
     
     def show_analytics_charts(self):
-        self.data_analytics.display_all_charts()
+        if self.data_analytics is None:
+            # Lädt matplotlib und numpy erst beim ersten Öffnen der Statistiken
+            from data_analytics import DataAnalytics
+            self.data_analytics = DataAnalytics(self.db_manager)
+        self.data_analytics.display_all_charts(self)
         self.status_label.configure(text="Statistiken in neuem Fenster angezeigt.", text_color="blue")
         
     def update_tax_declaration_status(self):
-        invoice_id = self.get_selected_invoice_id()
-        if invoice_id is None:
+        invoice_ids = self.get_selected_invoice_ids()
+        if not invoice_ids:
             return
 
         current_year = datetime.now().year
-        year_str = simpledialog.askstring("Steuererklärung markieren",
-                                        f"Für welches Jahr soll diese Rechnung (ID: {invoice_id}) vorgemerkt werden?",
-                                        initialvalue=str(current_year))
+        if len(invoice_ids) == 1:
+            question = f"Für welches Jahr soll diese Rechnung (ID: {invoice_ids[0]}) vorgemerkt werden?"
+        else:
+            question = f"Für welches Jahr sollen diese {len(invoice_ids)} Rechnungen vorgemerkt werden?"
+        year_str = simpledialog.askstring("Steuererklärung markieren", question, initialvalue=str(current_year))
 
         if year_str:
             try:
                 year = int(year_str)
-                if self.db_manager.set_invoice_for_tax_declaration(invoice_id, year):
-                    self.status_label.configure(text=f"Rechnung ID {invoice_id} für die Steuererklärung {year} vorgemerkt.", text_color="blue")
-                    self.load_invoices_to_listbox()
+                if self.db_manager.set_invoices_for_tax_declaration(invoice_ids, year):
+                    self.status_label.configure(text=f"{self.describe_invoices(invoice_ids)} für die Steuererklärung {year} vorgemerkt.", text_color="blue")
                     self.clear_selection()
                 else:
-                    self.status_label.configure(text=f"Fehler beim Markieren von Rechnung ID {invoice_id}.", text_color="red")
+                    self.status_label.configure(text=f"Fehler beim Markieren von {self.describe_invoices(invoice_ids)}.", text_color="red")
             except ValueError:
                 messagebox.showerror("Ungültige Eingabe", "Bitte geben Sie eine gültige Jahreszahl ein.")
     
     def remove_tax_declaration_status(self):
-        invoice_id = self.get_selected_invoice_id()
-        if invoice_id is None:
+        invoice_ids = self.get_selected_invoice_ids()
+        if not invoice_ids:
             return
 
-        if messagebox.askyesno("Vormerkung entfernen", f"Soll die Vormerkung für die Steuererklärung für Rechnung ID {invoice_id} entfernt werden?"):
-            if self.db_manager.set_invoice_for_tax_declaration(invoice_id, None):
-                self.status_label.configure(text=f"Vormerkung für Rechnung ID {invoice_id} entfernt.", text_color="blue")
-                self.load_invoices_to_listbox()
+        description = self.describe_invoices(invoice_ids)
+        if messagebox.askyesno("Vormerkung entfernen", f"Soll die Vormerkung für die Steuererklärung für {description} entfernt werden?"):
+            if self.db_manager.set_invoices_for_tax_declaration(invoice_ids, None):
+                self.status_label.configure(text=f"Vormerkung für {description} entfernt.", text_color="blue")
                 self.clear_selection()
             else:
-                self.status_label.configure(text=f"Fehler beim Entfernen der Vormerkung für Rechnung ID {invoice_id}.", text_color="red")
+                self.status_label.configure(text=f"Fehler beim Entfernen der Vormerkung für {description}.", text_color="red")
 
 if __name__ == '__main__':
     app = InvoiceApp()
@@ -0,0 +1,190 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from database_manager import DatabaseManager
+
+# Kommandozeile ohne GUI-Abhängigkeiten, z.B. für cron oder systemd-Timer:
+#   python -m invoice_cli --db rechnungen.db due --days 7
+# Schwere Module (PIL, Export, Import) werden erst im jeweiligen Unterbefehl geladen.
+
+STATUS_CHOICES = ("Alle", "Offen", "Bezahlt", "Erinnert")
+# So oft prüft "remind --daemon" auf Änderungen anderer Programminstanzen
+EXTERNAL_POLL_SECONDS = 5
+
+
+def print_invoices(rows):
+    from invoice_list_view import InvoiceListView
+    for line in InvoiceListView.format_header():
+        print(line)
+    for invoice in rows:
+        print(InvoiceListView.format_row(invoice))
+
+
+def cmd_list(db_manager, args):
+    if args.search:
+        rows = db_manager.search_invoices(args.search, args.status, args.category, args.tax, limit=args.limit)
+    else:
+        rows = db_manager.get_invoices_page(args.status, args.category, args.tax, limit=args.limit)
+    print_invoices(rows)
+    return 0
+
+
+def cmd_due(db_manager, args):
+    today = date.today()
+    until = today + timedelta(days=args.days)
+    # Beide Abfragen sind bereits nach Fälligkeit sortiert
+    rows = db_manager.get_overdue(today.isoformat()) + db_manager.get_invoices_due_between(today.isoformat(), until.isoformat())
+    print_invoices(rows)
+    return 0
+
+
+def print_reminders(due, reminders, catch_up):
+    if not due and not reminders:
+        print("Keine aktuellen Benachrichtigungen.")
+        return
+    print("Wichtige Benachrichtigungen seit dem letzten Lauf:" if catch_up else "Wichtige Benachrichtigungen für heute:")
+    for name, event_date in due:
+        print(f"- {name} (fällig am {event_date})")
+    for name, event_date in reminders:
+        print(f"- {name} (Erinnerung am {event_date})")
+    sys.stdout.flush()
+
+
+def cmd_remind(db_manager, args):
+    from reminder_scheduler import ReminderScheduler
+    scheduler = ReminderScheduler(db_manager, print_reminders)
+    scheduler.start()
+    if not args.daemon:
+        return 0
+    try:
+        while True:
+            time.sleep(min(scheduler.seconds_until_next(), EXTERNAL_POLL_SECONDS))
+            # Änderungen anderer Prozesse (GUI, Import) kommen über das Änderungsprotokoll
+            # der Datenbank und passen nur die betroffenen Termine im Heap an
+            db_manager.poll_external_changes()
+            scheduler.check()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        scheduler.stop()
+
+
+def cmd_mark_paid(db_manager, args):
+    existing = {invoice[0] for invoice in db_manager.get_invoices_by_ids(args.ids)}
+    missing = [invoice_id for invoice_id in args.ids if invoice_id not in existing]
+    for invoice_id in missing:
+        print(f"Rechnung {invoice_id} existiert nicht.", file=sys.stderr)
+    if existing:
+        db_manager.update_invoice_status_many(sorted(existing), "Bezahlt")
+        print(f"{len(existing)} Rechnung(en) als bezahlt markiert.")
+    return 1 if missing else 0
+
+
+def cmd_import(db_manager, args):
+    from bulk_import import import_directory
+    category_id = None
+    if args.category:
+        category_id = dict((name, id) for id, name in db_manager.get_categories()).get(args.category)
+        if category_id is None:
+            print(f"Kategorie '{args.category}' existiert nicht.", file=sys.stderr)
+            return 2
+    stats = import_directory(db_manager, args.directory, category_id=category_id, workers=args.workers,
+                             batch_size=args.batch_size)
+    print(stats.summary())
+    return 0 if stats.failed == 0 else 1
+
+
+def cmd_export(db_manager, args):
+    from invoice_export import export_invoices
+    if args.output == "-" and (args.format != "csv" or args.zip):
+        print("Nur CSV ohne PDFs kann auf die Standardausgabe geschrieben werden.", file=sys.stderr)
+        return 2
+    output = sys.stdout if args.output == "-" else args.output
+    options = {}
+    if args.format == "datev" and args.fiscal_year is not None:
+        options["fiscal_year"] = args.fiscal_year
+    try:
+        count = export_invoices(db_manager, output, args.format, args.status, args.category, args.tax,
+                                tax_year=args.tax_year, include_pdfs=args.zip, **options)
+    except BrokenPipeError:
+        # Leser der Standardausgabe vorzeitig beendet (z.B. "| head"); beim Beenden nicht erneut schreiben
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    print(f"{count} Rechnungen exportiert.", file=sys.stderr)
+    return 0
+
+
+def cmd_archive(db_manager, args):
+    min_age_days = args.days
+    if min_age_days is None:
+        min_age_days = int(db_manager.get_state("archive_min_age_days", DatabaseManager.ARCHIVE_MIN_AGE_DAYS))
+    moved = db_manager.archive_paid_invoices(min_age_days)
+    print(f"{moved} bezahlte Rechnung(en) archiviert, Archivjahre: "
+          f"{', '.join(map(str, db_manager.get_archive_years())) or 'keine'}")
+    return 0
+
+
+def add_filter_arguments(parser):
+    parser.add_argument("--status", default="Alle", choices=STATUS_CHOICES)
+    parser.add_argument("--category", default="Alle", help="Kategoriename, 'Keine' oder 'Alle'")
+    parser.add_argument("--tax", action="store_true", help="Nur für die Steuererklärung vorgemerkte Rechnungen")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="invoice_cli", description="Rechnungsverwaltung ohne Oberfläche.")
+    parser.add_argument("--db", default="invoice_data.db", help="Pfad zur Datenbank")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="Rechnungen anzeigen")
+    add_filter_arguments(list_parser)
+    list_parser.add_argument("--search", help="Volltextsuche im Namen")
+    list_parser.add_argument("--limit", type=int, default=50)
+    list_parser.set_defaults(handler=cmd_list)
+
+    due_parser = subparsers.add_parser("due", help="Offene Rechnungen, die bis in N Tagen fällig sind (inkl. überfälliger)")
+    due_parser.add_argument("--days", type=int, default=0)
+    due_parser.set_defaults(handler=cmd_due)
+
+    remind_parser = subparsers.add_parser("remind", help="Fälligkeiten und Erinnerungen seit dem letzten Lauf melden")
+    remind_parser.add_argument("--daemon", action="store_true", help="Weiterlaufen und zu jedem Termin melden")
+    remind_parser.set_defaults(handler=cmd_remind)
+
+    paid_parser = subparsers.add_parser("mark-paid", help="Rechnungen als bezahlt markieren")
+    paid_parser.add_argument("ids", type=int, nargs="+")
+    paid_parser.set_defaults(handler=cmd_mark_paid)
+
+    import_parser = subparsers.add_parser("import", help="Alle Rechnungsbilder eines Ordners importieren")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--category", help="Name der Kategorie für alle importierten Rechnungen")
+    import_parser.add_argument("--workers", type=int, default=None)
+    import_parser.add_argument("--batch-size", type=int, default=200)
+    import_parser.set_defaults(handler=cmd_import)
+
+    export_parser = subparsers.add_parser("export", help="Rechnungen als CSV, XLSX oder DATEV-Buchungsstapel exportieren")
+    add_filter_arguments(export_parser)
+    export_parser.add_argument("--format", default="csv", choices=("csv", "xlsx", "datev"))
+    export_parser.add_argument("--tax-year", type=int, help="Nur Rechnungen, die für dieses Steuerjahr vorgemerkt sind")
+    export_parser.add_argument("--fiscal-year", type=int, help="Wirtschaftsjahr des DATEV-Buchungsstapels "
+                                                               "(Standard: --tax-year, sonst das laufende Jahr)")
+    export_parser.add_argument("--zip", action="store_true", help="Exportdatei und PDFs als ZIP-Archiv schreiben")
+    export_parser.add_argument("-o", "--output", default="-", help="Zieldatei ('-' = Standardausgabe)")
+    export_parser.set_defaults(handler=cmd_export)
+
+    archive_parser = subparsers.add_parser("archive", help="Alte bezahlte Rechnungen in Jahresarchive verschieben")
+    archive_parser.add_argument("--days", type=int, help="Mindestalter in Tagen (Standard: archive_min_age_days "
+                                                         f"aus der Datenbank, sonst {DatabaseManager.ARCHIVE_MIN_AGE_DAYS})")
+    archive_parser.set_defaults(handler=cmd_archive)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with DatabaseManager(args.db) as db_manager:
+        return args.handler(db_manager, args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+import csv
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime
+
+# Export der Rechnungen für Steuerberater/Buchhaltung. Alle Formate lesen die
+# Zeilen als Iterator (DatabaseManager.iter_invoices) und schreiben sie sofort
+# weiter, der Speicherbedarf hängt also nicht von der Anzahl der Rechnungen ab.
+
+EXPORT_HEADER = ["ID", "Name", "Betrag", "Status", "Fällig", "Erinnerung", "Erstellt", "Steuerjahr", "Kategorie", "PDF"]
+
+# DATEV-Buchungsstapel (EXTF, Formatversion 13); nur die Pflichtspalten und der Buchungstext werden befüllt
+DATEV_COLUMNS = ["Umsatz (ohne Soll/Haben-Kz)", "Soll/Haben-Kennzeichen", "WKZ Umsatz", "Kurs", "Basis-Umsatz",
+                 "WKZ Basis-Umsatz", "Konto", "Gegenkonto (ohne BU-Schlüssel)", "BU-Schlüssel", "Belegdatum",
+                 "Belegfeld 1", "Belegfeld 2", "Skonto", "Buchungstext"]
+
+
+def format_amount(amount):
+    return f"{amount:.2f}".replace(".", ",") if amount is not None else ""
+
+
+def export_row(invoice, pdf_name=None):
+    invoice_id, name, amount, _, pdf_path, creation_date, status, due_date, reminder_date, tax_year, category_name = invoice
+    return [invoice_id, name, format_amount(amount), status, due_date or "", reminder_date or "", creation_date or "",
+            tax_year or "", category_name or "", pdf_name or ""]
+
+
+def write_csv(rows, output):
+    # output ist ein Pfad oder ein bereits geöffnetes Textobjekt (z.B. sys.stdout)
+    if isinstance(output, str):
+        with open(output, "w", newline="", encoding="utf-8-sig") as f:
+            return write_csv(rows, f)
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(EXPORT_HEADER)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_xlsx(rows, output):
+    # write_only schreibt die Zeilen direkt in eine temporäre Datei statt sie als Zellobjekte zu halten
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Rechnungen")
+    sheet.append(EXPORT_HEADER)
+    count = 0
+    for row in rows:
+        # Beträge als Zahl, damit Excel damit rechnen kann
+        row[2] = float(row[2].replace(",", ".")) if row[2] else None
+        sheet.append(row)
+        count += 1
+    workbook.save(output)
+    return count
+
+
+def write_datev(rows, output, fiscal_year=None, account="4900", contra_account="1200", consultant_number="",
+                client_number=""):
+    # Buchungsstapel im DATEV-Format (Windows-1252, CRLF, Semikolon). Jede
+    # Rechnung wird als Aufwand (account) gegen das Bankkonto (contra_account) gebucht.
+    # Das Belegdatum enthält nur Tag und Monat: Rechnungen mit Belegdatum außerhalb
+    # des Wirtschaftsjahres werden deshalb übersprungen.
+    fiscal_year = fiscal_year or datetime.now().year
+    created = datetime.now().strftime("%Y%m%d%H%M%S%f")[:17]
+    header = ["EXTF", 700, 21, "Buchungsstapel", 13, created, "", "RE", "", "", consultant_number, client_number,
+              f"{fiscal_year}0101", 4, f"{fiscal_year}0101", f"{fiscal_year}1231", f"Rechnungen {fiscal_year}", "", 1, 0, 0,
+              "EUR"]
+    count = 0
+    with open(output, "w", newline="", encoding="cp1252", errors="replace") as f:
+        writer = csv.writer(f, delimiter=";", lineterminator="\r\n")
+        writer.writerow(header)
+        writer.writerow(DATEV_COLUMNS)
+        for row in rows:
+            invoice_id, name, amount, _, due_date, _, creation_date = row[:7]
+            if not amount or float(amount.replace(",", ".")) == 0:
+                # Ohne Betrag kann keine Buchung erzeugt werden
+                continue
+            document_date = due_date or creation_date[:10]
+            if document_date[:4] != str(fiscal_year):
+                continue
+            writer.writerow([amount, "S", "EUR", "", "", "", account, contra_account, "",
+                             document_date[8:10] + document_date[5:7], str(invoice_id)[:36], "", "", name[:60]])
+            count += 1
+    return count
+
+
+EXPORT_FORMATS = {
+    "csv": (write_csv, ".csv"),
+    "xlsx": (write_xlsx, ".xlsx"),
+    "datev": (write_datev, ".csv"),
+}
+
+
+def pdf_archive_name(invoice):
+    safe_name = re.sub(r"[^\w\-]+", "_", invoice[1]).strip("_")[:50]
+    return f"belege/{invoice[0]}_{safe_name}.pdf"
+
+
+def _export_rows(invoices, archive=None):
+    # Wandelt die Zeilen um und legt dabei (optional) jede PDF sofort im ZIP ab
+    for invoice in invoices:
+        pdf_name = None
+        pdf_path = invoice[4]
+        if archive is not None and pdf_path and os.path.exists(pdf_path):
+            pdf_name = pdf_archive_name(invoice)
+            # ZipFile.write liest die Datei blockweise
+            archive.write(pdf_path, pdf_name)
+        yield export_row(invoice, pdf_name)
+
+
+def export_invoices(db_manager, output, export_format="csv", status_filter="Alle", category_filter="Alle",
+                    tax_filter=False, tax_year=None, include_pdfs=False, **format_options):
+    # Gibt die Anzahl der exportierten Rechnungen zurück. Mit include_pdfs ist
+    # output eine ZIP-Datei, die die Exportdatei und alle zugehörigen PDFs enthält.
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unbekanntes Exportformat: {export_format}")
+    writer, extension = EXPORT_FORMATS[export_format]
+    period_year = None
+    if export_format == "datev":
+        # Ein Buchungsstapel umfasst genau ein Wirtschaftsjahr
+        period_year = format_options.setdefault("fiscal_year", tax_year or datetime.now().year)
+    invoices = db_manager.iter_invoices(status_filter, category_filter, tax_filter, tax_year=tax_year,
+                                        period_year=period_year)
+    # Schließen gibt die Lese-Verbindung auch bei Schreibfehlern sofort frei
+    try:
+        if not include_pdfs:
+            return writer(_export_rows(invoices), output, **format_options)
+
+        with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            # Die Exportdatei entsteht neben den PDFs in einer temporären Datei und
+            # wird zum Schluss ebenfalls blockweise ins ZIP kopiert
+            fd, data_path = tempfile.mkstemp(suffix=extension)
+            os.close(fd)
+            try:
+                count = writer(_export_rows(invoices, archive), data_path, **format_options)
+                archive.write(data_path, "rechnungen" + extension)
+            finally:
+                os.remove(data_path)
+        return count
+    finally:
+        invoices.close()
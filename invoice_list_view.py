@@ -0,0 +1,323 @@
+from query_cache import QueryCache
+
+
+class InvoiceListView:
+    # Virtualisierte Rechnungsliste: Es wird immer nur das sichtbare Fenster
+    # an Zeilen aus der Datenbank geladen (Keyset-Pagination über due_date, id)
+    # und in einem einzigen insert in die Textbox geschrieben.
+    # Im Suchmodus werden die Treffer nach Relevanz sortiert und per Offset geblättert.
+    # Ganze Seiten werden bis zur nächsten Datenänderung zwischengespeichert.
+    HEADER_FORMAT = "{:<5} {:<30} {:<10} {:<10} {:<12} {:<15} {:<15} {:<3}"
+    HEADER_LINES = 2
+
+    def __init__(self, textbox, db_manager, page_size=30, on_render=None):
+        self.textbox = textbox
+        self.db_manager = db_manager
+        self.page_size = page_size
+        self.on_render = on_render
+        self.filters = ("Alle", "Alle", False)
+        self.rows = []
+        self.rows_by_id = {}
+        # Schlüssel der Zeile direkt vor dem sichtbaren Fenster (None = Listenanfang)
+        self.anchor = None
+        self.has_next = False
+        self.search_text = None
+        self.offset = 0
+        self.cache = QueryCache()
+
+    @staticmethod
+    def row_key(invoice):
+        return (invoice[7], invoice[0])
+
+    @property
+    def has_prev(self):
+        if self.search_text:
+            return self.offset > 0
+        return self.anchor is not None
+
+    def _fetch(self, after=None, before=None, limit=None):
+        return self.db_manager.get_invoices_page(*self.filters, after=after, before=before, limit=limit)
+
+    def _cache_key(self, after=None, before=None, offset=0):
+        sort = "relevance" if self.search_text else self.db_manager.PAGE_ORDER_DESC
+        return (self.filters, self.search_text, sort, after, before, offset, self.page_size)
+
+    def _load_page(self, after=None, before=None, offset=0):
+        key = self._cache_key(after, before, offset)
+        version = self.db_manager.data_version
+        rows = self.cache.get(key, version)
+        if rows is None:
+            if self.search_text:
+                rows = self.db_manager.search_invoices(self.search_text, *self.filters, limit=self.page_size + 1,
+                                                       offset=offset)
+            else:
+                rows = self._fetch(after=after, before=before, limit=self.page_size + 1)
+            self.cache.put(key, version, rows)
+        return rows
+
+    async def _load_page_async(self, async_db, after=None, offset=0):
+        key = self._cache_key(after, None, offset)
+        # Version vor der Abfrage merken: ändert sich die Datenbank währenddessen, wird nicht gecacht
+        version = self.db_manager.data_version
+        rows = self.cache.get(key, version)
+        if rows is None:
+            if self.search_text:
+                rows = await async_db.search_invoices(self.search_text, *self.filters, limit=self.page_size + 1,
+                                                      offset=offset)
+            else:
+                rows = await async_db.get_invoices_page(*self.filters, after=after, limit=self.page_size + 1)
+            self.cache.put(key, version, rows)
+        return rows
+
+    def _set_rows(self, rows):
+        self.rows = rows
+        self.rows_by_id = {invoice[0]: invoice for invoice in rows}
+        self.render()
+
+    def set_filters(self, status_filter, category_filter, tax_filter, reload=True):
+        self.filters = (status_filter, category_filter, tax_filter)
+        self.anchor = None
+        self.offset = 0
+        if reload:
+            self.reload()
+
+    def set_search(self, search_text, reload=True):
+        self.search_text = search_text.strip() if search_text and search_text.strip() else None
+        self.anchor = None
+        self.offset = 0
+        if reload:
+            self.reload()
+
+    def _reload_search(self):
+        rows = self._load_page(offset=self.offset)
+        if not rows and self.offset > 0:
+            self.offset = 0
+            rows = self._load_page()
+        self.has_next = len(rows) > self.page_size
+        self._set_rows(rows[:self.page_size])
+
+    def reload(self):
+        if self.search_text:
+            self._reload_search()
+            return
+        rows = self._load_page(after=self.anchor)
+        if not rows and self.anchor is not None:
+            # Das Fenster ist leer geworden (z.B. nach Löschungen) -> zurück an den Anfang
+            self.anchor = None
+            rows = self._load_page()
+        self.has_next = len(rows) > self.page_size
+        self._set_rows(rows[:self.page_size])
+
+    async def reload_async(self, async_db):
+        # Wie reload(), aber die Abfrage läuft über AsyncDatabaseManager im Hintergrund.
+        # Wird die Aufgabe vorher abgebrochen, bleibt die Anzeige unverändert.
+        rows = await self._load_page_async(async_db, after=self.anchor, offset=self.offset)
+        if not rows and self.has_prev:
+            # Fenster leer geworden -> zurück an den Anfang wie in reload()
+            self.anchor = None
+            self.offset = 0
+            await self.reload_async(async_db)
+            return
+        self.has_next = len(rows) > self.page_size
+        self._set_rows(rows[:self.page_size])
+
+    def next_page(self):
+        if not self.has_next or not self.rows:
+            return
+        if self.search_text:
+            self.offset += len(self.rows)
+            self.reload()
+            return
+        self.anchor = self.row_key(self.rows[-1])
+        self.reload()
+
+    def prev_page(self):
+        if not self.has_prev or not self.rows:
+            return
+        if self.search_text:
+            self.offset = max(0, self.offset - self.page_size)
+            self.reload()
+            return
+        rows = self._load_page(before=self.row_key(self.rows[0]))
+        if len(rows) > self.page_size:
+            self.anchor = self.row_key(rows[0])
+            rows = rows[1:]
+        else:
+            self.anchor = None
+            rows = self._load_page()
+        self.has_next = True
+        self._set_rows(rows[:self.page_size])
+
+    def scroll(self, step):
+        # Verschiebt das Fenster um `step` Zeilen; es werden nur die neu
+        # sichtbaren Zeilen nachgeladen.
+        if not self.rows:
+            return
+        if self.search_text:
+            if (step > 0 and self.has_next) or (step < 0 and self.has_prev):
+                self.offset = max(0, self.offset + step)
+                self.reload()
+            return
+        if step > 0:
+            if not self.has_next:
+                return
+            new_rows = self._fetch(after=self.row_key(self.rows[-1]), limit=step + 1)
+            self.has_next = len(new_rows) > step
+            new_rows = new_rows[:step]
+            if not new_rows:
+                return
+            dropped = self.rows[:len(new_rows)]
+            self.anchor = self.row_key(dropped[-1])
+            self._set_rows(self.rows[len(new_rows):] + new_rows)
+        elif step < 0:
+            if not self.has_prev:
+                return
+            step = -step
+            new_rows = self._fetch(before=self.row_key(self.rows[0]), limit=step + 1)
+            if len(new_rows) > step:
+                self.anchor = self.row_key(new_rows[0])
+                new_rows = new_rows[1:]
+            else:
+                self.anchor = None
+            kept = self.rows[:self.page_size - len(new_rows)]
+            if len(kept) < len(self.rows):
+                self.has_next = True
+            self._set_rows(new_rows + kept)
+
+    # --- Inkrementelle Aktualisierung nach Einzeländerungen ---------------
+
+    @staticmethod
+    def _sort_key(row_key):
+        # Listenreihenfolge ist absteigend nach diesem Schlüssel (NULL-Daten zuletzt)
+        due_date, invoice_id = row_key
+        return (due_date is not None, due_date or "", invoice_id)
+
+    def _matches_filters(self, invoice):
+        status_filter, category_filter, tax_filter = self.filters
+        if status_filter != "Alle" and invoice[6] != status_filter:
+            return False
+        if category_filter != "Alle" and invoice[10] != (None if category_filter == "Keine" else category_filter):
+            return False
+        if tax_filter and invoice[9] is None:
+            return False
+        return True
+
+    def _belongs_to_window(self, invoice):
+        key = self._sort_key(self.row_key(invoice))
+        if self.anchor is not None and key >= self._sort_key(self.anchor):
+            return False
+        if self.has_next and self.rows and key < self._sort_key(self.row_key(self.rows[-1])):
+            return False
+        return True
+
+    def _insert_position(self, invoice):
+        key = self._sort_key(self.row_key(invoice))
+        for index, row in enumerate(self.rows):
+            if key > self._sort_key(self.row_key(row)):
+                return index
+        return len(self.rows)
+
+    def _line_index(self, index):
+        return f"{index + self.HEADER_LINES + 1}.0"
+
+    def _remove_at(self, index):
+        invoice = self.rows.pop(index)
+        self.rows_by_id.pop(invoice[0], None)
+        self.textbox.delete(self._line_index(index), self._line_index(index + 1))
+
+    def _insert_at(self, index, invoice):
+        self.rows.insert(index, invoice)
+        self.rows_by_id[invoice[0]] = invoice
+        self.textbox.insert(self._line_index(index), self.format_row(invoice) + "\n")
+
+    def apply_change(self, action, invoice_ids, rows):
+        # Wird von DatabaseManager nach jeder Einzeländerung aufgerufen und
+        # passt nur die betroffenen Zeilen an, statt die Seite neu zu laden.
+        if action == "reload" or self.search_text:
+            # Suchtreffer sind nach Relevanz sortiert -> Position nicht lokal bestimmbar
+            self.reload()
+            return
+        self.textbox.configure(state="normal")
+        for invoice_id in invoice_ids:
+            if invoice_id in self.rows_by_id:
+                self._remove_at(self.rows.index(self.rows_by_id[invoice_id]))
+        if action != "delete":
+            for invoice in rows:
+                if self._matches_filters(invoice) and self._belongs_to_window(invoice):
+                    self._insert_at(self._insert_position(invoice), invoice)
+        while len(self.rows) > self.page_size:
+            self._remove_at(len(self.rows) - 1)
+            self.has_next = True
+        if len(self.rows) < self.page_size and self.has_next and self.rows:
+            missing = self.page_size - len(self.rows)
+            new_rows = self._fetch(after=self.row_key(self.rows[-1]), limit=missing + 1)
+            self.has_next = len(new_rows) > missing
+            for invoice in new_rows[:missing]:
+                self._insert_at(len(self.rows), invoice)
+        self.textbox.configure(state="disabled")
+
+        if not self.rows and (self.anchor is not None or self.has_next):
+            self.reload()
+        elif self.on_render:
+            self.on_render()
+
+    def resize(self, page_size):
+        page_size = max(1, page_size)
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self.reload()
+
+    @classmethod
+    def format_row(cls, invoice):
+        invoice_id, name, amount, image_path, pdf_path, _, status, due_date, reminder_date, tax_year, category_name = invoice
+
+        due_display = due_date if due_date else "N/A"
+        reminder_display = reminder_date if reminder_date else "N/A"
+        category_display = category_name if category_name else "Keine"
+        amount_display = f"{amount:.2f} €" if amount is not None else "N/A"
+
+        display_name = (name[:28] + '..') if len(name) > 28 else name
+        display_category = (category_display[:13] + '..') if len(category_display) > 13 else category_display
+        tax_icon = "✓" if tax_year else " "
+
+        return cls.HEADER_FORMAT.format(
+            invoice_id,
+            display_name,
+            amount_display,
+            status,
+            due_display,
+            reminder_display,
+            display_category,
+            tax_icon
+        )
+
+    @classmethod
+    def format_header(cls):
+        return [cls.HEADER_FORMAT.format("ID", "Name", "Preis", "Status", "Fällig", "Erinnerung", "Kategorie", "🧾"),
+                "-" * 115]
+
+    def render(self):
+        lines = self.format_header()
+        lines.extend(self.format_row(invoice) for invoice in self.rows)
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("end", "\n".join(lines) + "\n")
+        self.textbox.configure(state="disabled")
+        if self.on_render:
+            self.on_render()
+
+    def row_at_line(self, line_num):
+        index = line_num - self.HEADER_LINES - 1
+        if 0 <= index < len(self.rows):
+            return self.rows[index]
+        return None
+
+    def line_of(self, invoice_id):
+        for index, invoice in enumerate(self.rows):
+            if invoice[0] == invoice_id:
+                return index + self.HEADER_LINES + 1
+        return None
+
+    def get_row(self, invoice_id):
+        return self.rows_by_id.get(invoice_id)
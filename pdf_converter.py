@@ -0,0 +1,99 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def convert_image_to_pdf(image_path, pdf_path):
+    # Läuft im Worker-Prozess; darf daher keine Tk-Objekte anfassen.
+    # PIL wird erst hier importiert: die Kommandozeile (Import) lädt es so erst beim ersten Bild.
+    from PIL import Image
+    img = Image.open(image_path).convert("RGB")
+    img.save(pdf_path, "PDF", resolution=100.0)
+    return pdf_path
+
+
+class PdfConversionExecutor:
+    # Führt Bild->PDF-Konvertierungen im Hintergrund aus. Ergebnisse werden per
+    # after()-Polling im Tk-Hauptthread gemeldet, damit die Oberfläche nicht blockiert.
+    def __init__(self, widget, on_done=None, on_progress=None, max_workers=None, use_processes=True, poll_interval=100,
+                 instrumentation=None):
+        self.widget = widget
+        self.instrumentation = instrumentation
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.poll_interval = poll_interval
+        # PIL-Konvertierung ist CPU-gebunden -> standardmäßig ein Prozesspool
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.executor = executor_class(max_workers=max_workers)
+        self.jobs = {}
+        self.finished_count = 0
+        self.submitted_count = 0
+        self._poll_id = None
+
+    def submit(self, invoice_id, image_path, pdf_path):
+        future = self.executor.submit(convert_image_to_pdf, image_path, pdf_path)
+        self.jobs[invoice_id] = {"future": future, "pdf_path": pdf_path, "cancelled": False,
+                                 "submitted": time.perf_counter()}
+        self.submitted_count += 1
+        self._report_progress()
+        if self._poll_id is None:
+            self._poll_id = self.widget.after(self.poll_interval, self._poll)
+
+    def is_pending(self, invoice_id):
+        return invoice_id in self.jobs
+
+    def cancel(self, invoice_id):
+        job = self.jobs.get(invoice_id)
+        if job is None:
+            return False
+        # Wartende Jobs werden sofort verworfen; laufende werden nach dem Ende verworfen
+        job["cancelled"] = True
+        job["future"].cancel()
+        return True
+
+    def cancel_all(self):
+        for invoice_id in list(self.jobs):
+            self.cancel(invoice_id)
+
+    def _report_progress(self):
+        if self.on_progress:
+            self.on_progress(self.finished_count, self.submitted_count)
+
+    def _poll(self):
+        self._poll_id = None
+        for invoice_id, job in list(self.jobs.items()):
+            future = job["future"]
+            if not future.done():
+                continue
+            del self.jobs[invoice_id]
+            self.finished_count += 1
+            error = None
+            cancelled = job["cancelled"] or future.cancelled()
+            if cancelled:
+                if not future.cancelled() and future.exception() is None and os.path.exists(job["pdf_path"]):
+                    try:
+                        os.remove(job["pdf_path"])
+                    except OSError as e:
+                        print(f"Fehler beim Entfernen der abgebrochenen PDF {job['pdf_path']}: {e}")
+            else:
+                error = future.exception()
+                if self.instrumentation is not None:
+                    # Inklusive Wartezeit im Pool, auf poll_interval genau
+                    self.instrumentation.record("pdf.convert", (time.perf_counter() - job["submitted"]) * 1000,
+                                                error is not None)
+            if self.on_done:
+                self.on_done(invoice_id, job["pdf_path"], error, cancelled)
+            self._report_progress()
+
+        if self.jobs:
+            self._poll_id = self.widget.after(self.poll_interval, self._poll)
+        else:
+            self.finished_count = 0
+            self.submitted_count = 0
+
+    def shutdown(self):
+        self.cancel_all()
+        if self._poll_id is not None:
+            self.widget.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,37 @@
+from collections import OrderedDict
+
+
+class QueryCache:
+    # LRU-Cache für Abfrageergebnisse. Jeder Eintrag merkt sich die Datenversion
+    # (DatabaseManager.data_version), mit der er gelesen wurde; ändert sich die
+    # Version, sind alle Einträge ungültig.
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, version, value):
+        # Ergebnisse einer inzwischen veralteten Version werden nicht gespeichert
+        if version != self.version:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,143 @@
+import heapq
+from datetime import date, datetime, timedelta
+
+
+class ReminderScheduler:
+    # Hält alle kommenden Fälligkeiten und Erinnerungen in einem Min-Heap
+    # (datum, art, id, name) und wacht erst zum nächsten Termin wieder auf.
+    # Änderungen an Rechnungen kommen über den Change-Listener des
+    # DatabaseManager, die Tabelle wird also nicht regelmäßig neu abgefragt.
+    # Ohne widget (z.B. im Daemon) ruft der Aufrufer check() selbst auf.
+    STATE_KEY = "reminders_last_checked"
+    # Spätestens stündlich aufwachen, damit Uhrumstellungen und Standby nicht stören
+    MAX_SLEEP_SECONDS = 3600
+
+    def __init__(self, db_manager, on_events, widget=None):
+        self.db_manager = db_manager
+        # on_events(due, reminders, catch_up) mit Listen von (name, datum)
+        self.on_events = on_events
+        self.widget = widget
+        self.heap = []
+        # Aktueller Termin je (art, id); veraltete Heap-Einträge werden beim Entnehmen verworfen
+        self.entries = {}
+        # Heute bereits gemeldete Termine, damit Änderungen sie nicht erneut auslösen
+        self.fired_today = set()
+        self.last_checked = None
+        self._after_id = None
+
+    @staticmethod
+    def today():
+        return date.today().isoformat()
+
+    def start(self):
+        # Holt alle seit dem letzten Lauf verpassten Termine nach und lädt danach den Heap
+        today = self.today()
+        yesterday = (date.fromisoformat(today) - timedelta(days=1)).isoformat()
+        last_checked = self.db_manager.get_state(self.STATE_KEY) or yesterday
+        missed = self.db_manager.get_reminder_events(min(last_checked, yesterday), today)
+        self.fired_today = {(kind, invoice_id, event_date) for event_date, kind, invoice_id, _ in missed if event_date == today}
+        self._mark_checked(today)
+        self.load()
+        self.db_manager.add_change_listener(self.apply_change)
+        self._report(missed, catch_up=last_checked < yesterday, initial=True)
+        self._schedule()
+
+    def stop(self):
+        self.db_manager.remove_change_listener(self.apply_change)
+        if self._after_id is not None and self.widget is not None:
+            self.widget.after_cancel(self._after_id)
+        self._after_id = None
+
+    def load(self):
+        self.entries = {}
+        self.heap = []
+        for event in self.db_manager.get_reminder_events(self.last_checked):
+            self.entries[(event[1], event[2])] = event[0]
+            self.heap.append(event)
+        heapq.heapify(self.heap)
+
+    def _mark_checked(self, today):
+        if today != self.last_checked:
+            if self.last_checked is not None:
+                self.fired_today = set()
+            self.last_checked = today
+            self.db_manager.set_state(self.STATE_KEY, today)
+
+    def _report(self, events, catch_up=False, initial=False):
+        due = [(name, event_date) for event_date, kind, _, name in events if kind == "due"]
+        reminders = [(name, event_date) for event_date, kind, _, name in events if kind == "reminder"]
+        if due or reminders or initial:
+            self.on_events(due, reminders, catch_up)
+
+    def check(self):
+        # Meldet alle Termine bis einschließlich heute; gibt die Anzahl zurück
+        today = self.today()
+        events = []
+        while self.heap and self.heap[0][0] <= today:
+            event = heapq.heappop(self.heap)
+            event_date, kind, invoice_id, _ = event
+            key = (kind, invoice_id)
+            if self.entries.get(key) != event_date:
+                continue
+            del self.entries[key]
+            if (kind, invoice_id, event_date) in self.fired_today:
+                continue
+            events.append(event)
+        self._mark_checked(today)
+        self.fired_today.update((kind, invoice_id, event_date) for event_date, kind, invoice_id, _ in events if event_date == today)
+        self._report(events)
+        self._compact()
+        return len(events)
+
+    def _compact(self):
+        if len(self.heap) > 2 * len(self.entries) + 100:
+            self.heap = [event for event in self.heap if self.entries.get((event[1], event[2])) == event[0]]
+            heapq.heapify(self.heap)
+
+    def seconds_until_next(self, now=None):
+        now = now or datetime.now()
+        if not self.heap:
+            return self.MAX_SLEEP_SECONDS
+        next_time = datetime.combine(date.fromisoformat(self.heap[0][0]), datetime.min.time())
+        return max(0.0, min((next_time - now).total_seconds(), self.MAX_SLEEP_SECONDS))
+
+    def _schedule(self):
+        if self.widget is None:
+            return
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+        self._after_id = self.widget.after(int(self.seconds_until_next() * 1000) + 1, self._on_timer)
+
+    def _on_timer(self):
+        self._after_id = None
+        self.check()
+        self._schedule()
+
+    @staticmethod
+    def events_for(invoice):
+        # Termine einer Zeile im Format von get_invoices
+        invoice_id, name, status, due_date, reminder_date = invoice[0], invoice[1], invoice[6], invoice[7], invoice[8]
+        events = []
+        if due_date and status == "Offen":
+            events.append((due_date, "due", invoice_id, name))
+        if reminder_date and status != "Bezahlt":
+            events.append((reminder_date, "reminder", invoice_id, name))
+        return events
+
+    def apply_change(self, action, invoice_ids, rows):
+        if action == "reload":
+            self.load()
+            self._schedule()
+            return
+        for invoice_id in invoice_ids:
+            self.entries.pop(("due", invoice_id), None)
+            self.entries.pop(("reminder", invoice_id), None)
+        today = self.today()
+        for invoice in rows:
+            for event in self.events_for(invoice):
+                # Vergangene Termine werden nicht nachgemeldet, heutige schon (beim nächsten Timer)
+                if event[0] < today or (event[1], event[2], event[0]) in self.fired_today:
+                    continue
+                self.entries[(event[1], event[2])] = event[0]
+                heapq.heappush(self.heap, event)
+        self._schedule()
@@ -0,0 +1,321 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+from invoice_list_view import InvoiceListView
+from reminder_scheduler import ReminderScheduler
+
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "rechnungen.db")
+        self.managers = []
+
+    def tearDown(self):
+        for db_manager in self.managers:
+            db_manager.close()
+        shutil.rmtree(self.directory)
+
+    def open(self):
+        db_manager = DatabaseManager(self.db_path)
+        self.managers.append(db_manager)
+        return db_manager
+
+
+class ArchiveTest(DatabaseTestCase):
+    def add_paid_invoices(self, db_manager, years):
+        return [db_manager.add_invoice(f"Rechnung {year}", 10.0, None, None, "Bezahlt", f"{year}-03-01", None, None)
+                for year in years]
+
+    @staticmethod
+    def archive_files(db_manager):
+        return [name for name in os.listdir(db_manager.archive_dir) if name.endswith(".db")]
+
+    def test_more_years_than_attach_limit(self):
+        db_manager = self.open()
+        years = list(range(2008, 2022))
+        invoice_ids = self.add_paid_invoices(db_manager, years)
+        self.assertEqual(db_manager.archive_paid_invoices(365, today=date(2025, 6, 30)), len(years))
+        self.assertLessEqual(len(db_manager._archives), DatabaseManager.ARCHIVE_MAX_FILES)
+        self.assertEqual(db_manager.get_archive_years(), years)
+        self.assertEqual(db_manager.get_invoices(), [])
+        db_manager.close()
+
+        reopened = self.open()
+        self.assertEqual(reopened.get_archive_years(), years)
+        self.assertEqual(len(reopened.get_invoices_by_ids(invoice_ids)), len(years))
+
+    def test_merges_surplus_archive_files(self):
+        db_manager = self.open()
+        # Archivdateien wie von einer Version ohne Limit angelegt
+        db_manager.ARCHIVE_MAX_FILES = 10
+        years = list(range(2010, 2020))
+        self.add_paid_invoices(db_manager, years)
+        db_manager.archive_paid_invoices(365, today=date(2025, 6, 30))
+        self.assertEqual(len(self.archive_files(db_manager)), 10)
+        db_manager.close()
+
+        reopened = self.open()
+        self.assertEqual(len(self.archive_files(reopened)), DatabaseManager.ARCHIVE_MAX_FILES)
+        self.assertEqual(reopened.get_archive_years(), years)
+        self.add_paid_invoices(reopened, [2021])
+        self.assertEqual(reopened.archive_paid_invoices(365, today=date(2025, 6, 30)), 1)
+        self.assertEqual(reopened.get_archive_years(), years + [2021])
+
+    def test_only_outdated_archives_are_migrated(self):
+        db_manager = self.open()
+        self.add_paid_invoices(db_manager, [2015, 2016])
+        db_manager.archive_paid_invoices(365, today=date(2025, 6, 30))
+        db_manager.close()
+        # 2015: aktueller Schemastand, Index fehlt absichtlich; 2016: Stand einer älteren Version
+        for year, version in ((2015, DatabaseManager.ARCHIVE_SCHEMA_VERSION), (2016, 0)):
+            conn = sqlite3.connect(db_manager._archive_path(year))
+            conn.execute("DROP INDEX idx_invoices_content_hash")
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            conn.close()
+
+        reopened = self.open()
+        for year, expected in ((2015, []), (2016, [("idx_invoices_content_hash",)])):
+            conn = sqlite3.connect(reopened._archive_path(year))
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], DatabaseManager.ARCHIVE_SCHEMA_VERSION)
+            self.assertEqual(conn.execute("SELECT name FROM sqlite_master "
+                                          "WHERE name = 'idx_invoices_content_hash'").fetchall(), expected)
+            conn.close()
+        self.assertEqual(reopened.get_archive_years(), [2015, 2016])
+
+    def test_status_change_moves_invoice_out_of_archive(self):
+        db_manager = self.open()
+        invoice_id, = self.add_paid_invoices(db_manager, [2015])
+        db_manager.archive_paid_invoices(365, today=date(2025, 6, 30))
+        self.assertTrue(db_manager.update_invoice_status(invoice_id, "Bezahlt"))
+        self.assertEqual(db_manager.get_invoices(), [])
+
+        self.assertEqual(db_manager.update_invoice_status_many([invoice_id, invoice_id + 1], "Offen"), 1)
+        self.assertEqual([(invoice[0], invoice[6]) for invoice in db_manager.get_invoices()], [(invoice_id, "Offen")])
+        self.assertEqual(db_manager.get_archive_years(), [])
+        self.assertFalse(db_manager.update_invoice_status(invoice_id + 1, "Offen"))
+        # Beim nächsten Archivieren bleibt die offene Rechnung in der Haupttabelle
+        self.assertEqual(db_manager.archive_paid_invoices(365, today=date(2025, 6, 30)), 0)
+        self.assertEqual(len(db_manager.get_invoices()), 1)
+
+    def test_tax_search_includes_archive(self):
+        db_manager = self.open()
+        archived_id, current_id = self.add_paid_invoices(db_manager, [2015, 2025])
+        db_manager.set_invoices_for_tax_declaration([archived_id, current_id], 2015)
+        db_manager.archive_paid_invoices(365, today=date(2025, 6, 30))
+        self.assertEqual(sorted(invoice[0] for invoice in db_manager.search_invoices("rechnung", tax_filter=True)),
+                         [archived_id, current_id])
+        self.assertEqual([invoice[0] for invoice in db_manager.search_invoices("rechnung 2015", tax_filter=True)],
+                         [archived_id])
+        self.assertEqual([invoice[0] for invoice in db_manager.search_invoices("rechnung")], [current_id])
+
+
+class PaginationTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_manager = self.open()
+        due_dates = ["2025-03-01", None, "2025-01-15", "2025-03-01", None, "2024-12-31", None, "2025-02-01"]
+        for index, due_date in enumerate(due_dates):
+            self.db_manager.add_invoice(f"Rechnung {index}", 10.0, None, None, "Offen", due_date, None, None)
+        # Listenreihenfolge: due_date absteigend, dann id absteigend, ohne Fälligkeit zuletzt
+        self.expected = sorted(self.db_manager.get_invoices(),
+                               key=lambda invoice: (invoice[7] is not None, invoice[7] or "", invoice[0]), reverse=True)
+
+    @staticmethod
+    def key(invoice):
+        return (invoice[7], invoice[0])
+
+    def test_forward_and_backward_across_null_due_dates(self):
+        for limit in (1, 2, 3):
+            pages = [self.db_manager.get_invoices_page(limit=limit)]
+            while True:
+                page = self.db_manager.get_invoices_page(after=self.key(pages[-1][-1]), limit=limit)
+                if not page:
+                    break
+                pages.append(page)
+            self.assertEqual([invoice for page in pages for invoice in page], self.expected)
+            for previous, page in zip(pages, pages[1:]):
+                self.assertEqual(self.db_manager.get_invoices_page(before=self.key(page[0]), limit=limit), previous)
+
+
+class StubTextbox:
+    # Genug von CTkTextbox für InvoiceListView: Positionen "zeile.0" und "end"
+    def __init__(self):
+        self.text = ""
+
+    def configure(self, **options):
+        pass
+
+    def _offset(self, index):
+        if index == "end":
+            return len(self.text)
+        offset = 0
+        for _ in range(int(index.split(".")[0]) - 1):
+            offset = self.text.find("\n", offset) + 1
+            if offset == 0:
+                return len(self.text)
+        return offset
+
+    def insert(self, index, text):
+        offset = self._offset(index)
+        self.text = self.text[:offset] + text + self.text[offset:]
+
+    def delete(self, start, end):
+        self.text = self.text[:self._offset(start)] + self.text[self._offset(end):]
+
+
+class ListViewChangeTest(DatabaseTestCase):
+    def assert_matches_reload(self, view):
+        fresh = InvoiceListView(StubTextbox(), view.db_manager, page_size=view.page_size)
+        fresh.filters, fresh.anchor = view.filters, view.anchor
+        fresh.reload()
+        self.assertEqual(view.rows, fresh.rows)
+        self.assertEqual(view.has_next, fresh.has_next)
+        self.assertEqual(view.textbox.text, fresh.textbox.text)
+
+    def test_apply_change_matches_reload(self):
+        db_manager = self.open()
+        invoice_ids = [db_manager.add_invoice(f"Rechnung {day}", 10.0, None, None, "Offen", f"2025-01-{day:02d}", None, None)
+                       for day in range(1, 13)]
+        undated_id = db_manager.add_invoice("ohne Datum", 5.0, None, None, "Offen", None, None, None)
+        view = InvoiceListView(StubTextbox(), db_manager, page_size=4)
+        view.set_filters("Offen", "Alle", False)
+        view.next_page()
+        db_manager.add_change_listener(view.apply_change)
+        self.assert_matches_reload(view)
+
+        changes = [
+            lambda: db_manager.add_invoice("neu im Fenster", 1.0, None, None, "Offen", "2025-01-07", None, None),
+            lambda: db_manager.add_invoice("neu davor", 1.0, None, None, "Offen", "2025-01-30", None, None),
+            lambda: db_manager.update_invoice_status(invoice_ids[6], "Bezahlt"),
+            lambda: db_manager.delete_invoice(invoice_ids[5]),
+            lambda: db_manager.update_invoice_status(invoice_ids[6], "Offen"),
+            lambda: db_manager.delete_invoices(invoice_ids[:3] + [undated_id]),
+            lambda: db_manager.update_invoice_status_many(invoice_ids[3:5], "Bezahlt"),
+        ]
+        for change in changes:
+            change()
+            self.assert_matches_reload(view)
+
+
+class ReminderCatchUpTest(DatabaseTestCase):
+    def test_start_reports_events_missed_since_last_check(self):
+        db_manager = self.open()
+        add = db_manager.add_invoice
+        add("vor letzter Prüfung", 1.0, None, None, "Offen", "2025-03-05", None, None)
+        add("verpasst fällig", 1.0, None, None, "Offen", "2025-03-07", None, None)
+        add("verpasst bezahlt", 1.0, None, None, "Bezahlt", "2025-03-08", "2025-03-08", None)
+        add("verpasst erinnert", 1.0, None, None, "Erinnert", "2025-04-01", "2025-03-09", None)
+        add("heute fällig", 1.0, None, None, "Offen", "2025-03-10", None, None)
+        add("zukünftig", 1.0, None, None, "Offen", "2025-03-12", None, None)
+        db_manager.set_state(ReminderScheduler.STATE_KEY, "2025-03-05")
+
+        reports = []
+        scheduler = ReminderScheduler(db_manager, lambda *report: reports.append(report))
+        scheduler.today = lambda: "2025-03-10"
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+        self.assertEqual(reports, [([("verpasst fällig", "2025-03-07"), ("heute fällig", "2025-03-10")],
+                                    [("verpasst erinnert", "2025-03-09")], True)])
+        self.assertEqual(db_manager.get_state(ReminderScheduler.STATE_KEY), "2025-03-10")
+        # Heute Gemeldetes nicht erneut, Zukünftiges erst an seinem Tag
+        self.assertEqual(scheduler.check(), 0)
+        scheduler.today = lambda: "2025-03-12"
+        self.assertEqual(scheduler.check(), 1)
+        self.assertEqual(reports[-1], ([("zukünftig", "2025-03-12")], [], False))
+
+
+class SearchTest(DatabaseTestCase):
+    def test_words_without_token_characters_are_ignored(self):
+        db_manager = self.open()
+        db_manager.add_invoice("Telekom Mobilfunk 03/2025", 25.0, None, None, "Offen", "2025-03-01", None, None)
+        self.assertEqual(len(db_manager.search_invoices("telekom -")), 1)
+        self.assertEqual(len(db_manager.search_invoices("tele – 03")), 1)
+        self.assertEqual(db_manager.search_invoices("- ..."), [])
+
+
+class CategoryFilterTest(DatabaseTestCase):
+    def test_keine_selects_invoices_without_category(self):
+        db_manager = self.open()
+        db_manager.add_category("Strom")
+        category_id = db_manager.get_categories()[0][0]
+        db_manager.add_invoice("Abschlag", 50.0, None, None, "Offen", "2025-01-01", None, category_id)
+        uncategorized_id = db_manager.add_invoice("Sonstiges", 5.0, None, None, "Offen", "2025-02-01", None, None)
+        self.assertEqual([invoice[0] for invoice in db_manager.get_invoices(category_filter="Keine")], [uncategorized_id])
+        self.assertEqual([invoice[0] for invoice in db_manager.get_invoices_page(category_filter="Keine")],
+                         [uncategorized_id])
+        self.assertEqual(len(db_manager.get_invoices(category_filter="Strom")), 1)
+
+
+class SpendingTotalsTest(DatabaseTestCase):
+    def test_category_totals_are_exact_cents(self):
+        db_manager = self.open()
+        db_manager.add_category("Strom")
+        category_id = db_manager.get_categories()[0][0]
+        invoice_ids = [db_manager.add_invoice("Abschlag", amount, None, None, "Offen", "2025-01-01", None, category_id)
+                       for amount in (0.1, 0.2, 23.19, 0.3)]
+        db_manager.delete_invoices(invoice_ids[:2])
+        db_manager.update_invoice_status(invoice_ids[3], "Bezahlt")
+        self.assertEqual(db_manager.get_total_amount_by_category(), [("Strom", 23.49)])
+
+
+class MultiInstanceTest(DatabaseTestCase):
+    def test_bulk_insert_does_not_reuse_archived_id(self):
+        first, second = self.open(), self.open()
+        first.add_invoice("alt", 10.0, None, None, "Bezahlt", "2015-03-01", None, None)
+        archived_id = first.add_invoice("alt", 20.0, None, None, "Bezahlt", "2016-03-01", None, None)
+        self.assertEqual(first.archive_paid_invoices(365, today=date(2025, 6, 30)), 2)
+
+        second.add_invoices_bulk([("neu", 5.0, None, None, "Offen", "2025-07-01", None, None, None, None)])
+        new_id = second.get_invoices()[0][0]
+        self.assertGreater(new_id, archived_id)
+
+        first.archive_paid_invoices(365, today=date(2025, 6, 30))
+        self.assertEqual([invoice[1] for invoice in first.get_invoices()], ["neu"])
+
+    def test_poll_reports_changes_of_other_instance(self):
+        first, second = self.open(), self.open()
+        changes = []
+        second.add_change_listener(lambda action, invoice_ids, rows: changes.append((action, invoice_ids, rows)))
+        self.assertFalse(second.poll_external_changes())
+
+        invoice_id = first.add_invoice("Miete", 800.0, None, None, "Offen", "2025-07-01", None, None)
+        first.update_invoice_status(invoice_id, "Bezahlt")
+        other_id = first.add_invoice("Strom", 60.0, None, None, "Offen", "2025-07-05", None, None)
+        first.delete_invoice(other_id)
+        version = second.data_version
+        self.assertTrue(second.poll_external_changes())
+        self.assertGreater(second.data_version, version)
+        self.assertEqual([(action, invoice_ids) for action, invoice_ids, _ in changes],
+                         [("insert", [invoice_id]), ("update", [invoice_id]), ("insert", [other_id]), ("delete", [other_id])])
+        # Die Zeilen werden erst beim Melden gelesen und zeigen den aktuellen Stand
+        self.assertEqual(changes[1][2][0][6], "Bezahlt")
+        self.assertFalse(second.poll_external_changes())
+
+    def test_poll_reloads_after_change_log_was_pruned(self):
+        first, second = self.open(), self.open()
+        first.CHANGE_LOG_KEEP = 2
+        changes = []
+        second.add_change_listener(lambda action, invoice_ids, rows: changes.append((action, invoice_ids)))
+        invoice_id = first.add_invoice("Miete", 800.0, None, None, "Offen", "2025-07-01", None, None)
+        for status in ("Erinnert", "Offen", "Bezahlt", "Offen"):
+            first.update_invoice_status(invoice_id, status)
+        self.assertTrue(second.poll_external_changes())
+        self.assertEqual(changes, [("reload", [])])
+        # Danach geht es wieder mit einzelnen Meldungen weiter
+        first.update_invoice_status(invoice_id, "Bezahlt")
+        second.poll_external_changes()
+        self.assertEqual(changes[-1], ("update", [invoice_id]))
+
+
+if __name__ == '__main__':
+    unittest.main()
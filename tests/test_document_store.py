@@ -0,0 +1,36 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_store import DocumentStore
+
+
+class DocumentStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = DocumentStore(os.path.join(self.directory, "documents"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, file_name, content):
+        path = os.path.join(self.directory, file_name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_same_content_with_other_extension_is_stored_once(self):
+        first_hash, first_path = self.store.put(self.write("scan.jpg", b"rechnung"))
+        second_hash, second_path = self.store.put(self.write("scan.jpeg", b"rechnung"))
+        self.assertEqual(first_hash, second_hash)
+        self.assertEqual(first_path, second_path)
+        self.assertEqual(self.store.find(first_hash), first_path)
+        self.assertIsNone(self.store.find("0" * 64))
+
+
+if __name__ == '__main__':
+    unittest.main()